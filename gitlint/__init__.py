@@ -16,13 +16,23 @@ git-lint: improving source code one step at a time
 
 Lints modified lines in your git repository branch.
 
+FILENAME can be a file, a directory or a glob pattern (e.g. 'src/**/*.py').
+Files matching ignore-regex are skipped. Files found in directories or by globs
+are also filtered by the ignore files of the VCS (e.g. .gitignore).
+
 It supports many filetypes, including:
     PHP, Python, Javascript, Ruby, CSS, SCSS, PNG, JPEG, RST, YAML, INI, Java,
     among others. See https://github.com/sk-/git-lint for the complete list.
 
 Usage:
-    git-lint [-f | --force] [--json] [--mode=MODE] [--no-cache] [--fix | --fix-all] [--fix-linexp=LINES] [FILENAME ...]
-    git-lint [-t | --tracked] [-f | --force] [--json] [--mode=MODE] [--no-cache] [--fix | --fix-all] [--fix-linexp=LINES]
+    git-lint merge-results JSON_FILE ...
+    git-lint cache stats [--cache-dir=DIR]
+    git-lint cache prune [--cache-dir=DIR] [--max-size=SIZE] [--max-age=DAYS]
+    git-lint cache warm [--cache-dir=DIR] [--jobs=N] [PATH ...]
+    git-lint cache timings [--cache-dir=DIR] [PATH ...]
+    git-lint [-f | --force] [--json | --jsonl | --format=FORMAT] [--mode=MODE] [--no-cache] [--cache-dir=DIR] [--fix | --fix-all] [--diff] [--fix-linexp=LINES] [--shard=K/N] [--shard-by=WEIGHT] [--timings=FILE] [--profile] [--trace=FILE] [--jobs=N] [--engine=ENGINE] [FILENAME ...]
+    git-lint [-t | --tracked] [-f | --force] [--json | --jsonl | --format=FORMAT] [--mode=MODE] [--no-cache] [--cache-dir=DIR] [--fix | --fix-all] [--diff] [--fix-linexp=LINES] [--shard=K/N] [--shard-by=WEIGHT] [--timings=FILE] [--profile] [--trace=FILE] [--jobs=N] [--engine=ENGINE]
+    git-lint --commits=RANGE [-f | --force] [--json | --jsonl | --format=FORMAT] [--no-cache] [--cache-dir=DIR] [--profile] [--trace=FILE] [--jobs=N] [--engine=ENGINE]
     git-lint -h | --version
 
 Options:
@@ -32,6 +42,18 @@ Options:
     -t --tracked        Lints only tracked files in the index.
     --json              Prints the result as a json string. Useful to use it in
                         conjunction with other tools.
+    --jsonl              Prints the result in the JSON Lines format: one json object per file, written
+                         as soon as the file is processed, and a final summary with the totals and
+                         the exit status.
+    --format=FORMAT      [text, json, jsonl, sarif, checkstyle] How the result is printed. Default is
+                         text. --json and --jsonl are shorthands for the json and jsonl formats.
+
+                         sarif: A SARIF 2.1.0 log, with a result per comment and the errors of the
+                         linters as notifications.
+
+                         checkstyle: The Checkstyle XML format, as read by many CI systems.
+
+                         All formats but json are written as the files are processed.
     --mode=MODE         [merge-base, local, last-commit] Default is merge-base.
  
                          merge-base: Checks modifications since the merge-base commit
@@ -41,7 +63,15 @@ Options:
                          committed).
                   
                          last-comit: Checks modifications since just prior to the last commit.
-    --no-cache           If set, do not make use of the lint results cache.
+    --no-cache           If set, do not make use of the lint results cache, nor of the results of
+                         the previous run for files that did not change.
+    --cache-dir=DIR      Where the output of the linters is cached. Defaults to the environment variable
+                         GITLINT_CACHE_DIR, or to ~/.git-lint/cache if it is not set. The entries of a
+                         cache in a given directory are keyed on the path relative to the repository
+                         and on the hash of the content, so it can be shared by checkouts at
+                         different paths, e.g. a volume mounted by parallel CI jobs. The fixed
+                         points of the fixers, the manifests of the last runs and the running times
+                         of the linters, see 'git-lint cache timings', are kept there too.
     --fix                If set, run code formatters ('fixers') before linting. Linting will be applied
                          to changes post-fixing. Formatters that support formatting specific line
                          ranges in a file will be passed modified line ranges corresponding to the mode.
@@ -49,17 +79,71 @@ Options:
                          modified line to format. For instance, if line 3 is modified and --fix-linexp=1
                          then lines 2-4 will be formatted. Defaults to 0. Must be a non-negative integer.
     --fix-all            Same as fix, but runs formatting on all lines for all formatters.
+    --diff               With --fix or --fix-all, leaves the files untouched: the fixers run on copies
+                         of them, the changes they make are shown as a unified diff and the fixed
+                         copies are linted. Exits with 1 if any file would change.
+    --commits=RANGE      Lints the changes introduced by each commit in RANGE (e.g. master..HEAD or
+                         HEAD~10..HEAD) with respect to its parent. Files are read directly from
+                         the repository, so the working copy is not used. Only supported for git.
+    --shard=K/N          Lints only the K-th of N shards of the files (1 <= K <= N), so that a run
+                         can be split across several machines. The split is deterministic. Use
+                         'git-lint merge-results' to combine the --json output of all the shards.
+    --shard-by=WEIGHT    [size, time] How to balance the shards. Default is size.
+
+                         size: Uses the size of the files.
+
+                         time: Uses the time the linters took on each file in previous runs, as
+                         given by --timings, which is required.
+    --timings=FILE       With --shard-by=time, the times of the files, as printed by
+                         'git-lint cache timings'. All shards must use the same file to agree on
+                         the split, so take it before starting them rather than while they update
+                         the cache.
+    --profile            Prints to stderr where the time was spent: per phase (vcs queries, fixers,
+                         linters, output filtering, cache), the slowest linters and files, the cache
+                         hit rate and the number of forks. With the json and jsonl formats, the timings of each file are
+                         also added to its result under the key 'profile'.
+    --jobs=N             Number of files processed in parallel. Defaults to the number of CPUs.
+    --engine=ENGINE      [threads, asyncio] How files are processed in parallel. Default is threads.
+
+                         threads: Each file is processed by one of N threads.
+
+                         asyncio: Linters run as asyncio subprocesses, all files are in flight at
+                         once and up to N programs run at the same time. VCS queries and fixers
+                         still run in N threads.
+    --max-size=SIZE      With cache prune, removes the least recently used entries until the cache
+                         is at most SIZE, e.g. 500M or 2G. The cache includes the fixed points of
+                         the fixers, the manifests and the running times of the linters.
+    --max-age=DAYS       With cache prune, removes the entries not used in the last DAYS days.
+    --trace=FILE         Writes to FILE a trace of the run in the Trace Event Format, with a span for
+                         every vcs query, cache lookup, fixer and linter run, tagged with the thread
+                         and the file. It can be loaded in chrome://tracing or ui.perfetto.dev.
+
+Commands:
+    merge-results        Merges the --json output of several shards, printing the combined json
+                         and exiting with the status the whole run would have had.
+    cache stats          Prints the number of entries, the size and the hit rate of the cache of each
+                         linter, and the number and size of the fixed points, manifests and
+                         timings. Hits and misses are accumulated over all the runs.
+    cache prune          Evicts entries from the cache, see --max-size and --max-age.
+    cache warm           Runs the linters on all the lines of the given files, or of all the files
+                         in the repository, filling the cache in parallel. Useful to build CI
+                         images or in nightly jobs, so that the first run of the day is fast.
+    cache timings        Prints as json the time the linters last took on the given files, or on
+                         all the files in the repository, for --timings.
 """
 
 from __future__ import unicode_literals
 
 import codecs
 import functools
+import glob
 import json
 import multiprocessing
 import os
 import os.path
 import re
+import shutil
+import subprocess
 import sys
 from concurrent import futures
 
@@ -67,10 +151,17 @@ import docopt
 import termcolor
 import yaml
 
+import gitlint.asyncio_engine as asyncio_engine
+import gitlint.cache as cache
 import gitlint.fixers as fixers
 import gitlint.git as git
 import gitlint.hg as hg
 import gitlint.linters as linters
+import gitlint.manifest as manifest
+import gitlint.profiler as profiler
+import gitlint.shards as shards
+import gitlint.utils as utils
+import gitlint.writers as writers
 from gitlint.version import __VERSION__
 
 ERROR = termcolor.colored('ERROR', 'red', attrs=('bold',))
@@ -78,11 +169,24 @@ SKIPPED = termcolor.colored('SKIPPED', 'yellow', attrs=('bold',))
 OK = termcolor.colored('OK', 'green', attrs=('bold',))
 
 
+ENGINES = ('threads', 'asyncio')
+
+FORMATS = ('text', 'json', 'jsonl', 'sarif', 'checkstyle')
+
+GLOB_CHARACTERS = re.compile(r'[*?[]')
+
+
+def is_glob(filename):
+    """Whether filename is a glob pattern instead of an existing path."""
+    return (GLOB_CHARACTERS.search(filename) is not None and
+            not os.path.exists(filename))
+
+
 def find_invalid_filenames(filenames, repository_root):
-    """Find files that does not exist, are not in the repo or are directories.
+    """Find files that does not exist or are not in the repo.
 
     Args:
-      filenames: list of filenames to check
+      filenames: list of filenames, directories or glob patterns to check
       repository_root: the absolute path of the repository's root.
 
     Returns: A list of errors.
@@ -92,16 +196,99 @@ def find_invalid_filenames(filenames, repository_root):
         if not os.path.abspath(filename).startswith(repository_root):
             errors.append((filename, 'Error: File %s does not belong to '
                            'repository %s' % (filename, repository_root)))
-        if not os.path.exists(filename):
+        if is_glob(filename):
+            if not glob.glob(filename, recursive=True):
+                errors.append((filename,
+                               'Error: No file matches %s' % (filename,)))
+        elif not os.path.exists(filename):
             errors.append((filename,
                            'Error: File %s does not exist' % (filename,)))
-        if os.path.isdir(filename):
-            errors.append((filename, 'Error: %s is a directory. Directories are'
-                           ' not yet supported' % (filename,)))
 
     return errors
 
 
+def _glob_base_directory(pattern):
+    """Returns the longest leading directory of pattern without wildcards."""
+    directory = os.path.dirname(pattern)
+    while GLOB_CHARACTERS.search(directory):
+        directory = os.path.dirname(directory)
+    return directory
+
+
+def expand_filenames(filenames, vcs, repository_root, ignore_matcher):
+    """Expands the directories and glob patterns in filenames.
+
+    Directories are walked in parallel (see utils.walk). Files matching
+    ignore_matcher are skipped, as well as the files found while walking a
+    directory or expanding a glob that are ignored by the VCS (e.g. via
+    .gitignore). Ignored directories are not walked at all.
+
+    Args:
+      filenames: list of filenames, directories or glob patterns.
+      vcs: the vcs module to use (git, hg).
+      repository_root: the absolute path of the repository's root.
+      ignore_matcher: utils.IgnoreMatcher: matcher for the ignored files.
+
+    Yields: the absolute path of each file, without duplicates. This is a
+      generator, so files can be processed while directories are being walked.
+    """
+    explicit = set()
+    paths = []
+    query_paths = []
+    for filename in filenames:
+        if is_glob(filename):
+            paths.extend(
+                os.path.abspath(path)
+                for path in sorted(glob.glob(filename, recursive=True)))
+            query_paths.append(
+                os.path.abspath(_glob_base_directory(filename)))
+        else:
+            path = os.path.abspath(filename)
+            paths.append(path)
+            if os.path.isdir(path):
+                query_paths.append(path)
+            else:
+                explicit.add(path)
+
+    ignored = set()
+    if query_paths:
+        ignored = vcs.ignored_files(repository_root, query_paths)
+
+    def is_ignored(path, is_dir=False):
+        # Directories get a trailing slash so that regexes like
+        # '.*snapshots/.*' prune the whole directory.
+        if ignore_matcher.match(path + '/' if is_dir else path):
+            return True
+        # Ignored directories are reported as a whole, so we need to check the
+        # ancestors too.
+        while path.startswith(repository_root) and path != repository_root:
+            if path in ignored:
+                return True
+            path = os.path.dirname(path)
+        return False
+
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            if path not in query_paths and is_ignored(path, True):
+                continue
+            candidates = utils.walk([path], is_ignored=is_ignored)
+        elif path in explicit:
+            if ignore_matcher.match(path):
+                continue
+            candidates = [path]
+        elif not is_ignored(path):
+            candidates = [path]
+        else:
+            continue
+
+        for candidate in candidates:
+            if candidate not in seen:
+                seen.add(candidate)
+                yield candidate
+
+
+@profiler.timed('config', 'load')
 def get_config(repo_root):
     """Gets the configuration file either from the repository or the default."""
     config = os.path.join(os.path.dirname(__file__), 'configs', 'config.yaml')
@@ -124,6 +311,26 @@ def get_config(repo_root):
     return yaml_config
 
 
+def get_ignore_matcher(config):
+    """Returns the utils.IgnoreMatcher for the ignore-regex of the config."""
+    return utils.IgnoreMatcher(config.get('ignore-regex', '').split())
+
+
+def remove_ignored_files(files, ignore_matcher):
+    """Removes the files matching ignore_matcher.
+
+    Args:
+      files: dict: mapping from filename to its extra data.
+      ignore_matcher: utils.IgnoreMatcher: matcher for the ignored files.
+
+    Returns: a dict with the files that are not ignored.
+    """
+    if not ignore_matcher:
+        return files
+
+    return {k: v for k, v in files.items() if not ignore_matcher.match(k)}
+
+
 def format_comment(comment_data):
     """Formats the data returned by the linters.
 
@@ -165,6 +372,149 @@ def format_comment(comment_data):
     return ''.join(format_pieces).format(**comment_data)
 
 
+def format_result(result):
+    """Formats the result of linting a file.
+
+    It also adds the field 'formatted_message' to each of the comments.
+
+    Args:
+      result: dict: the result of linting the file, as returned by
+        linters.lint.
+
+    Returns:
+      a list with the lines to display.
+    """
+    output_lines = []
+    if result.get('error'):
+        output_lines.extend('%s: %s' % (ERROR, reason)
+                            for reason in result.get('error'))
+    if result.get('skipped'):
+        output_lines.extend('%s: %s' % (SKIPPED, reason)
+                            for reason in result.get('skipped'))
+    if not result.get('comments', []):
+        if not output_lines:
+            output_lines.append(OK)
+    else:
+        for data in result['comments']:
+            formatted_message = format_comment(data)
+            output_lines.append(formatted_message)
+            data['formatted_message'] = formatted_message
+
+    return output_lines
+
+
+def get_exit_code(files_with_problems, linter_not_found):
+    """Returns the exit code of git-lint.
+
+    Args:
+      files_with_problems: int: number of files with comments.
+      linter_not_found: bool: whether some linter could not be executed.
+    """
+    if files_with_problems > 0:
+        return 1
+    if linter_not_found:
+        return 4
+    return 0
+
+
+def merge_results(json_filenames, stdout):
+    """Merges the --json output of several shards and writes it to stdout.
+
+    Returns: the exit code the whole run would have had.
+    """
+    merged = shards.merge_results(json_filenames)
+    files_with_problems = sum(
+        1 for result in merged.values() if result.get('comments'))
+    linter_not_found = any(result.get('error') for result in merged.values())
+
+    stdout.write(json.dumps(merged, ensure_ascii=False))
+
+    return get_exit_code(files_with_problems, linter_not_found)
+
+
+def get_jobs(arguments):
+    """Returns the number of files to process in parallel given by --jobs."""
+    if not arguments['--jobs']:
+        return multiprocessing.cpu_count()
+    jobs = int(arguments['--jobs'])
+    if jobs < 1:
+        raise ValueError('--jobs must be a positive integer, got: %s' %
+                         arguments['--jobs'])
+    return jobs
+
+
+def get_cache_dir(arguments):
+    """Returns the cache directory given by --cache-dir or GITLINT_CACHE_DIR.
+
+    Returns: string|None: the absolute path of the directory, or None if the
+      default one is to be used.
+    """
+    cache_dir = arguments['--cache-dir'] or os.environ.get('GITLINT_CACHE_DIR')
+    if not cache_dir:
+        return None
+    return os.path.abspath(cache_dir)
+
+
+def cache_command(arguments, stdout, stderr):
+    """Runs one of the 'git-lint cache' commands.
+
+    Returns: the exit code.
+    """
+    linesep = os.linesep
+    utils.configure_cache(get_cache_dir(arguments))
+    if arguments['stats']:
+        stdout.write('Cache: %s%s' % (utils.get_cache_dir(), linesep))
+        stdout.write(linesep.join(cache.format_stats(cache.get_stats())) +
+                     linesep)
+        return 0
+
+    if arguments['prune']:
+        max_size = None
+        if arguments['--max-size']:
+            max_size = cache.parse_size(arguments['--max-size'])
+        max_age = None
+        if arguments['--max-age']:
+            max_age = float(arguments['--max-age']) * 24 * 60 * 60
+        if max_size is None and max_age is None:
+            stderr.write('fatal: cache prune requires --max-size or --max-age'
+                         + linesep)
+            return 2
+        removed, freed = cache.prune(max_size, max_age)
+        stdout.write('Removed %d entries, %s freed%s' %
+                     (removed, cache.format_size(freed), linesep))
+        return 0
+
+    vcs, repository_root = get_vcs_root()
+    if vcs is None:
+        stderr.write('fatal: Not a git repository' + linesep)
+        return 128
+
+    utils.configure_cache(get_cache_dir(arguments), repository_root)
+    jobs = get_jobs(arguments)
+    filenames = arguments['PATH'] or [repository_root]
+    invalid_filenames = find_invalid_filenames(filenames, repository_root)
+    if invalid_filenames:
+        invalid_filenames.append(('', ''))
+        stderr.write(linesep.join(invalid[1] for invalid in invalid_filenames))
+        return 2
+
+    config = get_config(repository_root)
+    filenames = expand_filenames(filenames, vcs, repository_root,
+                                 get_ignore_matcher(config))
+    if arguments['timings']:
+        stdout.write(
+            json.dumps(shards.get_timings(filenames, repository_root),
+                       sort_keys=True) + linesep)
+        return 0
+
+    linter_config = linters.parse_yaml_config(
+        config.get('linters', {}), repository_root, True)
+    warmed = cache.warm(filenames, linter_config, jobs)
+    cache.save_lookups(utils.pop_cache_lookups())
+    stdout.write('Warmed the cache with %d files%s' % (warmed, linesep))
+    return 0
+
+
 def get_vcs_root():
     """Returns the vcs module and the root of the repo.
 
@@ -187,25 +537,139 @@ def get_vcs_modified_lines(vcs, force, filename, extra_file_data, commit):
 
 
 
-def process_file(vcs, commit, force, linter_config, fixer_config, fix, fix_all, file_data):
-    """Lint and optionally fix the file.
+def process_file(vcs, commit, force, linter_config, file_data,
+                 lint_manifest=None, fixed_lines=None, fixed_contents=None):
+    """Lint the file.
+
+    If lint_manifest is given, the result of the previous run is returned when
+    the file did not change, and the new result is recorded otherwise.
+
+    Args:
+      fixed_lines: dict[string: LineSet|None]|None: the modified lines of the
+        files that were fixed, see fix_files. For those files the VCS is not
+        queried again.
+      fixed_contents: dict[string: bytes]|None: the content to lint instead of
+        the one on disk, for the files fixed with --diff.
 
     Returns:
       The results from the linter.
     """
     filename, extra_data = file_data
 
-    if fix:
-        fixers.fix(filename, fixer_config, get_vcs_modified_lines(vcs, force, filename, extra_data, commit))
-    elif fix_all:
-        fixers.fix(filename, fixer_config)
-    
-    result = linters.lint(filename, get_vcs_modified_lines(vcs, force, filename, extra_data, commit), linter_config)
-    result = result[filename]
+    if lint_manifest is not None:
+        blob, result = lint_manifest.lookup(filename, extra_data)
+        if result is not None:
+            return filename, result
+
+    with profiler.file_context(filename), profiler.span('file', 'process'):
+        if fixed_lines is not None and filename in fixed_lines:
+            lines = fixed_lines[filename]
+        else:
+            lines = get_vcs_modified_lines(vcs, force, filename, extra_data,
+                                           commit)
+        content = None
+        if fixed_contents is not None:
+            content = fixed_contents.get(filename)
+        result = linters.lint(filename, lines, linter_config, content=content)
+        result = result[filename]
+
+    if lint_manifest is not None:
+        lint_manifest.record(filename, extra_data, blob, result)
 
     return filename, result
 
 
+def fix_files(executor, vcs, commit, force, fixer_config, fix_all,
+              files_data, cache_enabled=False, copies=None):
+    """Fixes all the files before any of them is linted.
+
+    Fixers are invoked on as many files at once as possible, and if
+    cache_enabled is set, not at all on the files they already left unchanged.
+    See fixers.fix_files.
+
+    If copies is given, with the copy of each file, the copies are fixed
+    instead of the files.
+
+    Returns:
+      A dict with the modified lines of each file after fixing.
+    """
+    def modified_lines(file_data):
+        filename, extra_data = file_data
+        return filename, get_vcs_modified_lines(vcs, force, filename,
+                                                extra_data, commit)
+
+    with profiler.span('fix', 'all'):
+        files_lines = list(executor.map(modified_lines, files_data))
+        if copies is None:
+            return fixers.fix_files(files_lines, fixer_config, executor,
+                                    fix_all=fix_all,
+                                    cache_enabled=cache_enabled)
+        fixed_lines = fixers.fix_files(
+            [(copies[filename], lines) for filename, lines in files_lines],
+            fixer_config,
+            executor,
+            fix_all=fix_all,
+            cache_enabled=cache_enabled)
+        return {
+            filename: fixed_lines[copies[filename]]
+            for filename, _ in files_lines
+        }
+
+
+def diff_fixes(executor, vcs, commit, force, fixer_config, fix_all,
+               files_data, repository_root, cache_enabled=False):
+    """Fixes copies of the files, leaving the working tree untouched.
+
+    Returns:
+      A tuple with the modified lines of each file after fixing, the fixed
+      content of the files that changed and their unified diff.
+    """
+    scratch_dir, copies = fixers.make_scratch_copies(
+        [filename for filename, _ in files_data], repository_root,
+        fixer_config)
+    try:
+        fixed_lines = fix_files(executor, vcs, commit, force, fixer_config,
+                                fix_all, files_data, cache_enabled, copies)
+        fixed_contents = {}
+        diffs = {}
+        for filename, _ in files_data:
+            before = fixers.read_content(filename)
+            after = fixers.read_content(copies[filename])
+            if before != after:
+                fixed_contents[filename] = after
+                diffs[filename] = fixers.get_diff(
+                    os.path.relpath(filename, repository_root), before, after)
+        return fixed_lines, fixed_contents, diffs
+    finally:
+        shutil.rmtree(scratch_dir, True)
+
+
+def process_commit_file(repository_root, force, linter_config, file_data):
+    """Lint the file as it was in the given commit.
+
+    Only the lines modified by the commit are reported, unless force is set.
+
+    Returns:
+      The results from the linter.
+    """
+    commit, filename, extra_data = file_data
+
+    with profiler.file_context(filename), profiler.span('file', 'process'):
+        try:
+            content = git.file_content(repository_root, filename, commit)
+        except subprocess.CalledProcessError:
+            return filename, {
+                'skipped': ['could not read the file at commit %s' % commit]
+            }
+
+        lines = None
+        if not force:
+            lines = git.modified_lines_in_commit(filename, extra_data, commit)
+        result = linters.lint(filename, lines, linter_config, content=content)
+
+    return filename, result[filename]
+
+
 def main(argv, stdout=sys.stdout, stderr=sys.stderr):
     """Main gitlint routine. To be called from scripts."""
     # Wrap sys stdout for python 2, so print can understand unicode.
@@ -220,17 +684,51 @@ def main(argv, stdout=sys.stdout, stderr=sys.stderr):
     arguments = docopt.docopt(
         __doc__, argv=argv[1:], version='git-lint v%s' % __VERSION__)
 
-    json_output = arguments['--json']
+    if arguments['merge-results']:
+        return merge_results(arguments['JSON_FILE'], stdout)
+
+    if arguments['cache']:
+        return cache_command(arguments, stdout, stderr)
+
+    if arguments['--diff'] and not (arguments['--fix'] or
+                                    arguments['--fix-all']):
+        stderr.write('fatal: --diff requires --fix or --fix-all' + linesep)
+        return 2
+
+    shard_by = arguments['--shard-by'] or 'size'
+    if shard_by == 'time' and not arguments['--timings']:
+        stderr.write('fatal: --shard-by=time requires --timings' + linesep)
+        return 2
+
+    output_format = arguments['--format'] or 'text'
+    if arguments['--json']:
+        output_format = 'json'
+    elif arguments['--jsonl']:
+        output_format = 'jsonl'
+    if output_format not in FORMATS:
+        raise ValueError('Invalid format %s. Valid formats are: %s.' %
+                         (output_format, ', '.join(FORMATS)))
+
+    json_output = output_format == 'json'
+    if arguments['--profile'] or arguments['--trace']:
+        profiler.enable()
 
     vcs, repository_root = get_vcs_root()
 
     if vcs is None:
         stderr.write('fatal: Not a git repository' + linesep)
         return 128
+    utils.configure_cache(get_cache_dir(arguments), repository_root)
 
     commit = None
+    commits = arguments['--commits']
     mode = arguments['--mode']
-    if not mode or mode == 'merge-base':
+    if commits:
+        if vcs is not git:
+            stderr.write('fatal: --commits is only supported for git' +
+                         linesep)
+            return 2
+    elif not mode or mode == 'merge-base':
         commit = vcs.merge_base_commit()
     elif mode == 'last-commit':
         commit = vcs.last_commit()
@@ -238,9 +736,23 @@ def main(argv, stdout=sys.stdout, stderr=sys.stderr):
         raise ValueError(
             'Invalid mode. Valid modes are: merge-base, local, or last-commit.')
 
+    shard = None
+    if arguments['--shard']:
+        shard = shards.parse_shard(arguments['--shard'])
+
+    jobs = get_jobs(arguments)
+    engine = arguments['--engine'] or 'threads'
+    if engine not in ENGINES:
+        raise ValueError('Invalid engine %s. Valid engines are: %s.' %
+                         (engine, ', '.join(ENGINES)))
+
     config = get_config(repository_root)
+    ignore_matcher = get_ignore_matcher(config)
+    exclude = ignore_matcher.exclude_globs(repository_root)
 
-    if arguments['FILENAME']:
+    if commits:
+        files_data = []
+    elif arguments['FILENAME']:
         invalid_filenames = find_invalid_filenames(arguments['FILENAME'],
                                                    repository_root)
         if invalid_filenames:
@@ -250,23 +762,35 @@ def main(argv, stdout=sys.stdout, stderr=sys.stderr):
             return 2
 
         changed_files = vcs.modified_files(
-            repository_root, tracked_only=arguments['--tracked'], commit=commit)
-        modified_files = {}
-        for filename in arguments['FILENAME']:
-            normalized_filename = os.path.abspath(filename)
-            modified_files[normalized_filename] = changed_files.get(
-                normalized_filename)
+            repository_root,
+            tracked_only=arguments['--tracked'],
+            commit=commit,
+            exclude=exclude)
+        files_data = ((filename, changed_files.get(filename))
+                      for filename in expand_filenames(
+                          arguments['FILENAME'], vcs, repository_root,
+                          ignore_matcher))
     else:
         modified_files = vcs.modified_files(
-            repository_root, tracked_only=arguments['--tracked'], commit=commit)
-        if config.get('ignore-regex'):
-            regex_list = [
-                '(%s)' % r for r in config.get('ignore-regex').split()
-            ]
-            regex = re.compile('|'.join(regex_list))
-            modified_files = {
-                k: v for k, v in modified_files.items() if not regex.match(k)
-            }
+            repository_root,
+            tracked_only=arguments['--tracked'],
+            commit=commit,
+            exclude=exclude)
+        modified_files = remove_ignored_files(modified_files, ignore_matcher)
+        files_data = [(filename, modified_files[filename])
+                      for filename in sorted(modified_files.keys())]
+
+    if shard:
+        files_data = dict(files_data)
+        timings = None
+        if arguments['--timings']:
+            timings = shards.load_timings(arguments['--timings'],
+                                          repository_root)
+        weights = shards.get_weights(
+            list(files_data.keys()), shard_by, timings)
+        files_data = [(filename, files_data[filename])
+                      for filename in shards.select_shard(
+                          files_data.keys(), shard[0], shard[1], weights)]
 
     linter_not_found = False
     files_with_problems = 0
@@ -274,56 +798,133 @@ def main(argv, stdout=sys.stdout, stderr=sys.stderr):
         config.get('linters', {}), repository_root, not arguments['--no-cache'])
     fixer_config = fixers.parse_yaml_config(config.get('fixers', {}), repository_root, arguments['--fix-linexp'])
     json_result = {}
-
-    with futures.ThreadPoolExecutor(max_workers=multiprocessing.cpu_count())\
-            as executor:
+    writer = None
+    if output_format in writers.WRITERS:
+        writer = writers.WRITERS[output_format](stdout, repository_root)
+        writer.start()
+
+    lint_manifest = None
+    if commits:
+        for commit_sha in git.commits_in_range(commits):
+            commit_files = remove_ignored_files(
+                git.modified_files_in_commit(
+                    repository_root, commit_sha, exclude=exclude),
+                ignore_matcher)
+            files_data.extend((commit_sha, filename, commit_files[filename])
+                              for filename in sorted(commit_files.keys()))
+        processfile = functools.partial(process_commit_file, repository_root,
+                                        arguments['--force'], linter_config)
+    else:
+        if not (arguments['--no-cache'] or arguments['--fix'] or
+                arguments['--fix-all']):
+            lint_manifest = manifest.load(
+                repository_root, mode or 'merge-base',
+                manifest.get_key(commit, vcs.last_commit(),
+                                 arguments['--force'], config,
+                                 linters.get_cache_keys(linter_config)))
         processfile = functools.partial(process_file, vcs, commit,
                                         arguments['--force'], linter_config,
-                                        fixer_config, arguments['--fix'], arguments['--fix-all'])
-        for filename, result in executor.map(
-                processfile, [(filename, modified_files[filename])
-                              for filename in sorted(modified_files.keys())]):
+                                        lint_manifest=lint_manifest)
+
+    diffs = {}
+    with futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        if not commits and arguments['--diff']:
+            files_data = list(files_data)
+            fixed_lines, fixed_contents, diffs = diff_fixes(
+                executor, vcs, commit, arguments['--force'], fixer_config,
+                arguments['--fix-all'], files_data, repository_root,
+                not arguments['--no-cache'])
+            processfile = functools.partial(processfile,
+                                            fixed_lines=fixed_lines,
+                                            fixed_contents=fixed_contents)
+        elif not commits and (arguments['--fix'] or arguments['--fix-all']):
+            files_data = list(files_data)
+            fixed_lines = fix_files(executor, vcs, commit,
+                                    arguments['--force'], fixer_config,
+                                    arguments['--fix-all'], files_data,
+                                    not arguments['--no-cache'])
+            processfile = functools.partial(processfile,
+                                            fixed_lines=fixed_lines)
+        # files_data may be a generator, e.g. when walking directories, so the
+        # files are submitted as they are found, a few ahead of the output.
+        if engine == 'asyncio':
+            async_engine = asyncio_engine.Engine(executor, jobs)
+            # The coroutines take the same arguments as their counterparts.
+            if commits:
+                async_process = async_engine.process_commit_file
+            else:
+                async_process = async_engine.process_file
+            results = async_engine.map(
+                functools.partial(async_process, *processfile.args,
+                                  **processfile.keywords), files_data)
+        else:
+            results = utils.map_in_order(
+                functools.partial(executor.submit, processfile), files_data,
+                2 * jobs)
+        current_commit = None
+        text_output = not json_output and writer is None
+        for file_data, (filename, result) in results:
 
             rel_filename = os.path.relpath(filename)
 
-            if not json_output:
+            file_results = json_result
+            if commits:
+                file_results = json_result.setdefault(file_data[0], {})
+                if text_output and file_data[0] != current_commit:
+                    stdout.write('Commit: %s%s' % (termcolor.colored(
+                        file_data[0], 'yellow'), linesep + linesep))
+                current_commit = file_data[0]
+
+            if text_output:
                 stdout.write('Processing file: %s%s' % (termcolor.colored(
                     rel_filename, attrs=('bold',)), linesep))
 
-            output_lines = []
+            if filename in diffs:
+                if text_output:
+                    stdout.write(diffs[filename] + linesep)
+                else:
+                    result['diff'] = diffs[filename]
+
+            output_lines = format_result(result)
             if result.get('error'):
-                output_lines.extend('%s: %s' % (ERROR, reason)
-                                    for reason in result.get('error'))
                 linter_not_found = True
-            if result.get('skipped'):
-                output_lines.extend('%s: %s' % (SKIPPED, reason)
-                                    for reason in result.get('skipped'))
-            if not result.get('comments', []):
-                if not output_lines:
-                    output_lines.append(OK)
-            else:
+            if result.get('comments'):
                 files_with_problems += 1
-                for data in result['comments']:
-                    formatted_message = format_comment(data)
-                    output_lines.append(formatted_message)
-                    data['formatted_message'] = formatted_message
 
-            if json_output:
-                json_result[filename] = result
+            if not text_output and arguments['--profile']:
+                result['profile'] = profiler.file_timings(filename)
+            if writer is not None:
+                writer.write_file(filename, result,
+                                  file_data[0] if commits else None)
+            elif json_output:
+                file_results[filename] = result
             else:
                 output = linesep.join(output_lines)
                 stdout.write(output)
                 stdout.write(linesep + linesep)
 
+    if lint_manifest is not None:
+        lint_manifest.save()
+    cache.save_lookups(utils.pop_cache_lookups())
+
+    exit_code = get_exit_code(files_with_problems, linter_not_found)
+    if diffs and exit_code == 0:
+        # Formatting is needed.
+        exit_code = 1
+
     if json_output:
         # Hack to convert to unicode, Python3 returns unicode, wheres Python2
         # returns str.
         stdout.write(
             json.dumps(json_result,
                        ensure_ascii=False).encode('utf-8').decode('utf-8'))
+    elif writer is not None:
+        writer.finish(files_with_problems, linter_not_found, exit_code)
 
-    if files_with_problems > 0:
-        return 1
-    if linter_not_found:
-        return 4
-    return 0
+    if arguments['--profile']:
+        stderr.write(linesep.join(profiler.report()) + linesep)
+    if arguments['--trace']:
+        profiler.write_trace(arguments['--trace'])
+    profiler.disable()
+
+    return exit_code
@@ -0,0 +1,262 @@
+# Copyright 2013-2014 Sebastian Kreft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Engine running the lint pipeline on an asyncio event loop.
+
+Linters are run with asyncio subprocesses, so they do not block a thread each
+while they run, and all the files can be in flight at once. The number of
+programs running at the same time is bounded by a semaphore.
+
+VCS queries, streamed linters, pseudo-linters, the cache, scratch copies and
+the filtering of the output are blocking, so they run in a thread pool. Fixers
+run before, in a separate phase, see gitlint.fix_files.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import os.path
+import subprocess
+import threading
+
+import gitlint.git as git
+import gitlint.linters as linters
+import gitlint.profiler as profiler
+import gitlint.utils as utils
+
+# pylint: disable=protected-access
+
+
+class Engine(object):
+    """Runs the lint pipeline on an event loop in a background thread.
+
+    Args:
+      executor: concurrent.futures.Executor: where blocking calls are run.
+      jobs: int: the maximum number of programs running at the same time.
+    """
+
+    def __init__(self, executor, jobs):
+        self.executor = executor
+        self.jobs = jobs
+        self._loop = None
+        self._semaphore = None
+
+    def map(self, function, iterable):
+        """Like utils.map_in_order, but function returns a coroutine.
+
+        Items are scheduled as they are consumed, keeping twice as many as jobs
+        scheduled so that the programs are always busy.
+
+        Yields: tuple(item, result): each item with its result.
+        """
+        self._loop = asyncio.new_event_loop()
+        thread = threading.Thread(
+            target=self._loop.run_forever, name='asyncio-engine')
+        thread.daemon = True
+        thread.start()
+        try:
+            asyncio.run_coroutine_threadsafe(self._start(),
+                                             self._loop).result()
+            yield from utils.map_in_order(
+                lambda item: asyncio.run_coroutine_threadsafe(
+                    function(item), self._loop), iterable, 2 * self.jobs)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            thread.join()
+            self._loop.close()
+
+    async def _start(self):
+        # The semaphore has to be created by the loop using it.
+        self._semaphore = asyncio.Semaphore(self.jobs)
+
+    async def call(self, function, *args, **kwargs):
+        """Runs the blocking function in the executor.
+
+        The context is propagated, so that profiler spans are attributed to
+        the file being processed.
+        """
+        context = contextvars.copy_context()
+        return await self._loop.run_in_executor(
+            self.executor,
+            functools.partial(context.run, function, *args, **kwargs))
+
+    async def process_file(self, vcs, commit, force, linter_config,
+                           file_data, lint_manifest=None, fixed_lines=None,
+                           fixed_contents=None):
+        """Same as gitlint.process_file."""
+        filename, extra_data = file_data
+
+        if lint_manifest is not None:
+            blob, result = await self.call(lint_manifest.lookup, filename,
+                                           extra_data)
+            if result is not None:
+                return filename, result
+
+        with profiler.file_context(filename), profiler.span('file', 'process'):
+            if fixed_lines is not None and filename in fixed_lines:
+                lines = fixed_lines[filename]
+            else:
+                lines = await self._modified_lines(vcs, force, filename,
+                                                   extra_data, commit)
+            content = None
+            if fixed_contents is not None:
+                content = fixed_contents.get(filename)
+            result = await self.lint(filename, lines, linter_config,
+                                     content=content)
+            result = result[filename]
+
+        if lint_manifest is not None:
+            lint_manifest.record(filename, extra_data, blob, result)
+
+        return filename, result
+
+    async def process_commit_file(self, repository_root, force, linter_config,
+                                  file_data):
+        """Same as gitlint.process_commit_file."""
+        commit, filename, extra_data = file_data
+
+        with profiler.file_context(filename), profiler.span('file', 'process'):
+            try:
+                content = await self.call(git.file_content, repository_root,
+                                          filename, commit)
+            except subprocess.CalledProcessError:
+                return filename, {
+                    'skipped': ['could not read the file at commit %s' % commit]
+                }
+
+            lines = None
+            if not force:
+                lines = await self.call(git.modified_lines_in_commit, filename,
+                                        extra_data, commit)
+            result = await self.lint(filename, lines, linter_config,
+                                     content=content)
+
+        return filename, result[filename]
+
+    async def _modified_lines(self, vcs, force, filename, extra_data, commit):
+        if force:
+            return None
+        return await self.call(
+            vcs.modified_lines, filename, extra_data, commit=commit)
+
+    async def lint(self, filename, lines, config, content=None):
+        """Same as linters.lint, but running all the linters concurrently."""
+        _, ext = os.path.splitext(filename)
+        if ext not in config:
+            return linters._no_linter_result(filename)
+
+        kwargs = {}
+        if content is not None:
+            kwargs['content'] = content
+        linter_outputs = await asyncio.gather(*[
+            self._lint_with(linter, filename, lines, **kwargs)
+            for linter in config[ext]
+        ])
+        return linters._merge_outputs(filename, linter_outputs)
+
+    def _lint_with(self, linter, filename, lines, **kwargs):
+        if (linter.func is linters.lint_command and
+                not linter.keywords.get('stream')):
+            keywords = dict(linter.keywords, **kwargs)
+            return self.lint_command(*(linter.args + (filename, lines)),
+                                     **keywords)
+        return self.call(linter, filename, lines, **kwargs)
+
+    async def lint_command(self, name, program, arguments, filter_regex,
+                           cache_enabled, filename, lines,
+                           stdin_arguments=None, content=None, stream=False,
+                           limits=None, region_arguments=None,
+                           cache_key=None):
+        """Same as linters.lint_command, but the program runs on the loop."""
+        # pylint: disable=unused-argument
+        arguments, regions = linters.get_region_arguments(
+            arguments, region_arguments, lines)
+        with profiler.span('lint', name):
+            try:
+                output = await self.run(
+                    name,
+                    program,
+                    arguments,
+                    cache_enabled,
+                    filename,
+                    stdin_arguments=stdin_arguments,
+                    content=content,
+                    limits=limits,
+                    regions=regions,
+                    cache_key=cache_key)
+            except utils.LimitExceeded as error:
+                return {filename: {'error': ['%s: %s' % (name, error)]}}
+            if isinstance(output, dict):
+                # The program could not be executed.
+                return output
+            return await self.call(_filter_output, name, output,
+                                   filter_regex, filename, lines)
+
+    async def run(self, name, program, arguments, cache_enabled, filename,
+                  stdin_arguments=None, content=None, limits=None,
+                  regions=None, cache_key=None):
+        """Same as utils.run, but the program runs on the loop."""
+        program_run = utils._ProgramRun(name, program, arguments,
+                                        cache_enabled, filename,
+                                        stdin_arguments, content, regions,
+                                        cache_key)
+        output = await self.call(program_run.get_cached_output)
+        if output is not None:
+            return output
+
+        await self.call(program_run.prepare)
+        try:
+            stdin_content = await self.call(program_run.get_stdin_content)
+            # Only the time the program runs is recorded, not the time it
+            # waits for its turn.
+            async with self._semaphore:
+                with profiler.span('run', name):
+                    program_run.start()
+                    output = await _communicate(program_run.call_arguments,
+                                                stdin_content, limits)
+        except (IOError, OSError):
+            return program_run.execution_error()
+        finally:
+            await self.call(program_run.cleanup)
+        return await self.call(program_run.finish, output)
+
+
+def _filter_output(name, output, filter_regex, filename, lines):
+    with profiler.span('filter', name):
+        return linters._filter_output(
+            output.split(os.linesep), filter_regex, filename, lines)
+
+
+async def _communicate(call_arguments, stdin_content, limits):
+    """Runs the program, returning its output and enforcing limits."""
+    process = await asyncio.create_subprocess_exec(
+        *call_arguments,
+        stdin=subprocess.PIPE if stdin_content is not None else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        start_new_session=limits is not None)
+    if limits is not None:
+        utils._apply_limits(process.pid, limits)
+
+    timeout = limits.timeout if limits is not None else None
+    try:
+        output, _ = await asyncio.wait_for(
+            process.communicate(stdin_content), timeout)
+    except asyncio.TimeoutError:
+        utils._kill_process_group(process)
+        await process.wait()
+        utils._check_limits(call_arguments, process.returncode, limits, True)
+    if limits is not None:
+        utils._check_limits(call_arguments, process.returncode, limits, False)
+    return output
@@ -0,0 +1,253 @@
+# Copyright 2013-2014 Sebastian Kreft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Management of the cache of the output of the linters.
+
+The cache has a directory per linter, see utils.get_cache_dir. Besides, the
+fixed points of the fixers, the manifests of the last runs and the running
+times of the linters are kept in the home folder. They are managed together
+with the output of the linters, under the names in STATE_NAMES. The
+modification time of an entry is the time it was last used, so entries can be
+evicted in least recently used order. The number of hits and misses of each
+linter is accumulated across runs in a separate file.
+"""
+
+import collections
+import functools
+import io
+import json
+import os
+import os.path
+import re
+import time
+from concurrent import futures
+
+import gitlint.fixers as fixers
+import gitlint.linters as linters
+import gitlint.manifest as manifest
+import gitlint.utils as utils
+
+# pylint: disable=protected-access
+
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024**2, 'G': 1024**3}
+
+Entry = collections.namedtuple('Entry', ('name', 'filename', 'size', 'mtime'))
+
+# The names of the entries that are not the output of a linter.
+STATE_NAMES = ('(fixed points)', '(manifests)', '(timings)')
+
+
+def parse_size(size):
+    """Parses a size in bytes, with an optional suffix K, M or G.
+
+    Raises:
+      ValueError: if size is not valid.
+    """
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([KMG]?)B?\s*$', size,
+                     re.IGNORECASE)
+    if not match:
+        raise ValueError('Invalid size %s. Valid sizes are like 500M.' % size)
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def format_size(size):
+    """Formats a number of bytes to be read by humans, e.g. 1.5 MB."""
+    for unit in ('G', 'M', 'K'):
+        if size >= SIZE_UNITS[unit]:
+            return '%.1f %sB' % (float(size) / SIZE_UNITS[unit], unit)
+    return '%d B' % size
+
+
+def _get_lookups_filename():
+    home_folder = os.path.expanduser('~')
+    return os.path.join(home_folder, '.git-lint', 'cache-lookups.json')
+
+
+def load_lookups():
+    """Returns the hits and misses of each linter accumulated so far.
+
+    Returns: dict: a dict with the keys 'hits' and 'misses' by linter name.
+    """
+    try:
+        with io.open(_get_lookups_filename(), encoding='utf-8') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def save_lookups(lookups):
+    """Adds the hits and misses of a run to the ones accumulated so far.
+
+    The file is replaced atomically, but concurrent runs may lose some counts,
+    which is fine for statistics.
+
+    Args:
+      lookups: dict: as returned by utils.pop_cache_lookups.
+    """
+    if not lookups:
+        return
+    accumulated = load_lookups()
+    for name, counts in lookups.items():
+        totals = accumulated.setdefault(name, {'hits': 0, 'misses': 0})
+        for key in ('hits', 'misses'):
+            totals[key] = totals.get(key, 0) + counts.get(key, 0)
+
+    utils.write_file_atomically(_get_lookups_filename(),
+                                json.dumps(accumulated, ensure_ascii=False))
+
+
+def _get_state_directories():
+    """Returns the directory of each of STATE_NAMES."""
+    return [
+        fixers._get_fixed_points_dir(),
+        manifest._get_manifests_dir(),
+        utils._get_timings_dir()
+    ]
+
+
+def _get_directories():
+    """Returns the name and directory of each part of the cache."""
+    directories = []
+    cache_dir = utils.get_cache_dir()
+    if os.path.isdir(cache_dir):
+        # The fixed points and timings of a shared cache are also kept
+        # there, in dot directories, see utils._get_timings_dir.
+        directories.extend((name, os.path.join(cache_dir, name))
+                           for name in sorted(os.listdir(cache_dir))
+                           if not name.startswith('.'))
+    directories.extend(zip(STATE_NAMES, _get_state_directories()))
+    return directories
+
+
+def get_entries():
+    """Yields an Entry for each file in the cache, see STATE_NAMES."""
+    for name, directory in _get_directories():
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                filename = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(filename)
+                except OSError:
+                    # Removed by a concurrent run.
+                    continue
+                yield Entry(name, filename, stat.st_size, stat.st_mtime)
+
+
+def get_stats():
+    """Returns the statistics of the cache of each linter.
+
+    Returns: dict: by linter name, or one of STATE_NAMES, a dict with the
+      number of entries, their total size in bytes and the number of hits and
+      misses.
+    """
+    stats = collections.defaultdict(lambda: {
+        'entries': 0,
+        'size': 0,
+        'hits': 0,
+        'misses': 0
+    })
+    for entry in get_entries():
+        stats[entry.name]['entries'] += 1
+        stats[entry.name]['size'] += entry.size
+    for name, counts in load_lookups().items():
+        stats[name]['hits'] += counts.get('hits', 0)
+        stats[name]['misses'] += counts.get('misses', 0)
+    return dict(stats)
+
+
+def format_stats(stats):
+    """Returns the lines of a table with the statistics of get_stats."""
+    row = '%-20s %10s %10s %10s %10s %9s'
+    lines = [row % ('Linter', 'Entries', 'Size', 'Hits', 'Misses', 'Hit rate')]
+    totals = collections.Counter()
+    for name in sorted(stats) + [None]:
+        if name is None:
+            name, data = 'Total', totals
+        else:
+            data = stats[name]
+            totals.update(data)
+        lookups = data['hits'] + data['misses']
+        hit_rate = '-'
+        if lookups:
+            hit_rate = '%.1f%%' % (100.0 * data['hits'] / lookups)
+        lines.append(row % (name, data['entries'], format_size(data['size']),
+                            data['hits'], data['misses'], hit_rate))
+    return lines
+
+
+def _remove_empty_directories(directory):
+    for dirpath, _, _ in sorted(os.walk(directory), reverse=True):
+        if dirpath == directory:
+            continue
+        try:
+            os.rmdir(dirpath)
+        except OSError:
+            # Not empty.
+            pass
+
+
+def prune(max_size=None, max_age=None, now=None):
+    """Removes the least recently used entries of the cache.
+
+    Args:
+      max_size: int|None: the size in bytes the cache must not exceed.
+      max_age: float|None: entries not used in this many seconds are removed.
+      now: float|None: the current time, mostly for testing.
+
+    Returns: a tuple with the number of entries removed and their total size.
+    """
+    if now is None:
+        now = time.time()
+    entries = sorted(get_entries(), key=lambda entry: entry.mtime)
+    total_size = sum(entry.size for entry in entries)
+
+    removed = 0
+    freed = 0
+    for entry in entries:
+        too_old = max_age is not None and now - entry.mtime > max_age
+        too_big = max_size is not None and total_size - freed > max_size
+        if not too_old and not too_big:
+            # Entries are sorted by last use, so the rest are kept too.
+            break
+        try:
+            os.remove(entry.filename)
+        except OSError:
+            continue
+        removed += 1
+        freed += entry.size
+
+    if removed:
+        for directory in [utils.get_cache_dir()] + _get_state_directories():
+            _remove_empty_directories(directory)
+    return removed, freed
+
+
+def _warm_file(linter_config, filename):
+    linters.lint(filename, None, linter_config)
+    return filename
+
+
+def warm(filenames, linter_config, jobs):
+    """Fills the cache with the output of the linters on all lines of files.
+
+    Args:
+      filenames: iterable[string]: the absolute paths of the files.
+      linter_config: dict: the configuration of the linters, parsed with the
+        cache enabled.
+      jobs: int: the number of files processed in parallel.
+
+    Returns: int: the number of files processed.
+    """
+    with futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        return sum(1 for _ in executor.map(
+            functools.partial(_warm_file, linter_config), filenames))
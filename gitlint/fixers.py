@@ -2,13 +2,67 @@
 
 import collections
 import copy
+import difflib
+import functools
+import hashlib
+import io
 import os
+import shutil
+import tempfile
+import threading
 
+from gitlint import lineset
+from gitlint import profiler
 from gitlint import utils
 
+try:
+    import isort
+    from isort import exceptions as isort_exceptions
+except ImportError:  # pragma: no cover
+    isort = None
+    isort_exceptions = None
+
+try:
+    import yapf
+    from yapf.yapflib import errors as yapf_errors
+    from yapf.yapflib import yapf_api
+except ImportError:  # pragma: no cover
+    yapf = None
+    yapf_errors = None
+    yapf_api = None
+
+# yapf sets the style globally while formatting, so files are formatted one at
+# a time.
+_yapf_lock = threading.Lock()
+
 
 DEFAULT_FIX_LINE_EXPANSION = 0
 
+# Maximum number of files given to a single invocation of a fixer.
+MAX_FILES_PER_BATCH = 100
+
+
+class Fixer(
+        collections.namedtuple('Fixer', ('name', 'function',
+                                         'dynamic_arguments', 'cache_key',
+                                         'uses_lines', 'config_files'))):
+    """A fixer of the configuration, run on a file as fixer(filename, lines).
+
+    Attributes:
+      name: string: the name of the fixer.
+      function: callable(filename, lines): formats the file.
+      dynamic_arguments: list[string]: the arguments restricting the command
+        of the fixer to the modified lines.
+      cache_key: string|None: the hash of its configuration and version, see
+        get_fixer_key. Fixers without a cache_key are never cached.
+      uses_lines: bool: whether its output depends on the modified lines.
+      config_files: list[string]: the files it reads its settings from.
+    """
+    __slots__ = ()
+
+    def __call__(self, filename, lines=None):
+        return self.function(filename, lines)
+
 
 def missing_requirements_command(missing_programs, installation_string,
                                  filename, _):
@@ -22,7 +76,12 @@ def missing_requirements_command(missing_programs, installation_string,
 
 
 def get_modified_lines_range_tuples(modified_lines, fix_line_exp):
-    """Returns a list of (modified line range start, modified line range end) tuples."""
+    """Returns a list of (modified line range start, modified line range end) tuples.
+
+    Args:
+        modified_lines: LineSet|iterable[int]: the modified lines.
+        fix_line_exp: the number of lines to add above and below each range.
+    """
     if fix_line_exp is None:
         fix_line_exp = DEFAULT_FIX_LINE_EXPANSION
     else:
@@ -32,34 +91,147 @@ def get_modified_lines_range_tuples(modified_lines, fix_line_exp):
             raise ValueError('Fix line expansion must be a non-negative integer')
         if fix_line_exp < 0:
             raise ValueError('Fix line expansion must be a non-negative integer')
-    sorted_lines = sorted(modified_lines)
-    modified_lines_ranges = []
-    range_start = -1
-    range_end = -1
-    sorted_lines_len = len(sorted_lines)
-    for ix, line in enumerate(sorted_lines):
-        if range_start == -1:
-            range_start = max(1, line - fix_line_exp)            
-        elif line - fix_line_exp > range_end + 1:
-            modified_lines_ranges.append((range_start, range_end))
-            range_start = max(1, line - fix_line_exp)
-        range_end = line + fix_line_exp
-        if ix == (sorted_lines_len - 1):
-            modified_lines_ranges.append((range_start, range_end))   
-    return modified_lines_ranges
-  
-
-def fix_command(name, program, arguments, dynamic_arguments, fix_line_exp, filename, lines=None):
-    """Executes a fix program."""
-    all_arguments = copy.deepcopy(arguments)
+    return lineset.LineSet.from_lines(modified_lines).expand(
+        fix_line_exp).ranges()
+
+
+def expand_range_arguments(dynamic_arguments, ranges):
+    """Expands the arguments using {MODIFIED_LINES_RANGE_REPEATED_ARG}.
+
+    Each of those arguments is repeated once per range, with the variable
+    replaced by 'start-end'. Other arguments are ignored.
+    """
+    expanded_arguments = []
     for arg in dynamic_arguments:
-        if '{MODIFIED_LINES_RANGE_REPEATED_ARG}' in arg and lines:
-          pattern = arg.replace('{MODIFIED_LINES_RANGE_REPEATED_ARG}', '%s-%s')
-          all_arguments.extend(
-              [pattern % (start, end) for start, end in get_modified_lines_range_tuples(lines, fix_line_exp)])
-    utils.run(name, program, all_arguments, False, filename)
+        if '{MODIFIED_LINES_RANGE_REPEATED_ARG}' in arg:
+            pattern = arg.replace('{MODIFIED_LINES_RANGE_REPEATED_ARG}',
+                                  '%s-%s')
+            expanded_arguments.extend(
+                [pattern % (start, end) for start, end in ranges])
+    return expanded_arguments
+
+
+def fix_command_batch(name, program, arguments, filenames):
+    """Executes a fix program once on several files."""
+    with profiler.span('fix', name):
+        utils.run_batch(name, program, arguments, filenames)
+
+
+def fix_command(name, program, arguments, dynamic_arguments, fix_line_exp,
+                filename, lines=None):
+    """Executes a fix program."""
+    with profiler.span('fix', name):
+        all_arguments = copy.deepcopy(arguments)
+        if lines:
+            all_arguments.extend(
+                expand_range_arguments(
+                    dynamic_arguments,
+                    get_modified_lines_range_tuples(lines, fix_line_exp)))
+        utils.run(name, program, all_arguments, False, filename)
+
+
+def isort_fix(name, fix_line_exp, filename, lines=None):
+    """Sorts the imports of a file, calling isort in-process.
+
+    isort always sorts the whole file, as its CLI does. The settings are
+    looked up from the directory of the file, as the CLI does too.
+    """
+    # pylint: disable=unused-argument
+    with profiler.span('fix', name):
+        try:
+            config = _get_isort_config(
+                os.path.dirname(os.path.abspath(filename)))
+            isort.file(filename, config=config)
+        except isort_exceptions.ISortError:
+            # Same as the CLI, whose errors are ignored.
+            pass
+
 
+@functools.lru_cache(maxsize=None)
+def _get_isort_config(directory):
+    return isort.Config(settings_path=directory, quiet=True)
 
+
+def yapf_fix(name, style, fix_line_exp, filename, lines=None):
+    """Formats a file, calling yapf in-process.
+
+    As with the CLI and its --lines argument, only the ranges of modified
+    lines are formatted, or the whole file if lines is empty or None.
+    """
+    with profiler.span('fix', name):
+        ranges = None
+        if lines:
+            ranges = get_modified_lines_range_tuples(lines, fix_line_exp)
+        try:
+            with _yapf_lock:
+                yapf_api.FormatFile(
+                    filename, style_config=style, lines=ranges, in_place=True)
+        except yapf_errors.YapfError:
+            # Same as the CLI, whose errors are ignored.
+            pass
+
+
+def _get_in_process_fixer(name, data, repo_home, fix_line_exp):
+    """Returns the in-process fixer configured in data, if it is available.
+
+    Args:
+        name: string: the name of the fixer.
+        data: dict: the configuration of the fixer. Its 'in_process' entry
+          has the module to call, and for yapf, the style to use.
+        repo_home: string: the root of the repository.
+        fix_line_exp: the lines to format around each modified line.
+
+    Returns: the fixer, or None if it has to run through its command, as the
+      module is not installed or not supported.
+    """
+    in_process = data.get('in_process') or {}
+    module = in_process.get('module')
+    if module == 'isort' and isort is not None:
+        return utils.Partial(isort_fix, name, fix_line_exp)
+    if module == 'yapf' and yapf_api is not None:
+        style = in_process.get('style')
+        if style is not None:
+            style = utils.replace_variables([style], repo_home,
+                                            data.get('config'))[0]
+        return utils.Partial(yapf_fix, name, style, fix_line_exp)
+    return None
+
+
+def _get_command_fixer(name, data, command, requirements, repo_home,
+                       fix_line_exp):
+    """Returns the fixer running the command configured in data."""
+    not_found_programs = utils.programs_not_in_path([command] + requirements)
+    if not_found_programs:
+        return utils.Partial(missing_requirements_command, not_found_programs,
+                             data['installation'])
+    arguments = utils.replace_variables(data.get('arguments', []), repo_home,
+                                        data.get('config'))
+    return utils.Partial(fix_command, name, command, arguments,
+                         data.get('dynamic_arguments', []), fix_line_exp)
+
+
+def _get_cache_key(function, name, data, repo_home, fix_line_exp):
+    """Returns how the fixed points of a fixer are cached.
+
+    Returns: a tuple with the cache_key and uses_lines of the Fixer running
+      function.
+    """
+    if function.func is fix_command:
+        version = utils.get_program_version(function.args[1])
+        uses_lines = bool(data.get('dynamic_arguments'))
+    elif function.func is isort_fix:
+        version = isort.__version__
+        uses_lines = False
+    elif function.func is yapf_fix:
+        version = yapf.__version__
+        uses_lines = True
+    else:
+        return None, True
+    cache_key = get_fixer_key(name, data, repo_home, fix_line_exp, version)
+    return cache_key, uses_lines
+
+
+@profiler.timed('config', 'parse_fixers')
 def parse_yaml_config(yaml_config, repo_home, fix_line_exp):
     """Converts a dictionary (parsed Yaml) to the internal representation."""
     config = collections.defaultdict(list)
@@ -68,17 +240,20 @@ def parse_yaml_config(yaml_config, repo_home, fix_line_exp):
         command = utils.replace_variables([data['command']], repo_home)[0]
         requirements = utils.replace_variables(
             data.get('requirements', []), repo_home)
-    
-        not_found_programs = utils.programs_not_in_path([command] +
-                                                        requirements)
-        if not_found_programs:
-            fixer_command = utils.Partial(missing_requirements_command,
-                                          not_found_programs,
-                                          data['installation'])
-        else:
-            arguments = utils.replace_variables(data.get('arguments', []), repo_home, data.get('config'))
-            dynamic_arguments = data.get('dynamic_arguments', [])
-            fixer_command = utils.Partial(fix_command, name, command, arguments, dynamic_arguments, fix_line_exp)
+
+        function = _get_in_process_fixer(name, data, repo_home,
+                                         fix_line_exp)
+        if function is None:
+            function = _get_command_fixer(name, data, command, requirements,
+                                          repo_home, fix_line_exp)
+        cache_key, uses_lines = _get_cache_key(function, name, data,
+                                               repo_home, fix_line_exp)
+        fixer_command = Fixer(
+            name, function, data.get('dynamic_arguments', []), cache_key,
+            uses_lines, [
+                os.path.join(repo_home, config_file)
+                for config_file in data.get('config_files', [])
+            ])
         for extension in data['extensions']:
             config[extension].append(fixer_command)
 
@@ -92,9 +267,258 @@ def fix(filename, config, lines=None):
         filename: string: filename to fix.
         config: dict[string: fixer]: mapping from extension to a fixer
           function.
-        lines: list[int]|None: list of lines that we want to format. If None,
+        lines: LineSet|list[int]|None: lines that we want to format. If None,
           then all lines will be formatted.
     """
     _, ext = os.path.splitext(filename)
     for fixer in config.get(ext, []):
         fixer(filename, lines)
+
+
+def fix_files(files_lines, config, executor, fix_all=False,
+              cache_enabled=False):
+    """Fixes formatting issues in many files, batching the fixer invocations.
+
+    The fixers of an extension run in order, each of them on all the files
+    before the next one starts. A fixer invocation gets as many files as
+    possible: only those fixers restricted to the modified lines of a file
+    (through their dynamic arguments) run once per file.
+
+    The modified lines are then remapped through a diff of the content before
+    and after fixing, instead of being computed again by the VCS.
+
+    Args:
+        files_lines: list[tuple(string, LineSet|None)]: the files to fix with
+          their modified lines.
+        config: dict[string: fixer]: mapping from extension to a fixer
+          function.
+        executor: futures.Executor: where the fixers are run.
+        fix_all: bool: whether to format all the lines instead of only the
+          modified ones.
+        cache_enabled: bool: whether to skip the fixers on the files they
+          already left unchanged, see is_fixed_point.
+
+    Returns: dict[string: LineSet|None]: the modified lines of each file after
+      fixing.
+    """
+    files_lines = list(files_lines)
+    contents = dict(
+        zip([filename for filename, _ in files_lines],
+            executor.map(read_content,
+                         [filename for filename, _ in files_lines])))
+
+    files_by_extension = collections.OrderedDict()
+    for filename, lines in files_lines:
+        _, ext = os.path.splitext(filename)
+        files_by_extension.setdefault(ext, []).append(
+            (filename, None if fix_all else lines))
+
+    for ext, ext_files_lines in files_by_extension.items():
+        for fixer in config.get(ext, []):
+            _fix_step(fixer, ext_files_lines, executor, cache_enabled)
+
+    return {
+        filename: lineset.remap(lines, contents[filename],
+                                read_content(filename))
+        for filename, lines in files_lines
+    }
+
+
+def _fix_step(fixer, files_lines, executor, cache_enabled):
+    """Runs a fixer on the files, skipping those known to be fixed."""
+    states = list(
+        executor.map(_get_file_state,
+                     [filename for filename, _ in files_lines]))
+    batch = []
+    tasks = []
+    fixed_files = []
+    for (filename, lines), (content, stat) in zip(files_lines, states):
+        key = None
+        if cache_enabled and content is not None:
+            key = get_fixed_point_key(fixer, content, lines)
+        if key is not None:
+            if is_fixed_point(fixer, key):
+                profiler.count('fixer_cache_hits')
+                continue
+            profiler.count('fixer_cache_misses')
+        fixed_files.append((filename, content, stat, key))
+        if _can_batch(fixer, lines):
+            batch.append(filename)
+        else:
+            tasks.append(executor.submit(fixer, filename, lines))
+    for index in range(0, len(batch), MAX_FILES_PER_BATCH):
+        tasks.append(
+            executor.submit(fix_command_batch, *fixer.function.args[:3],
+                            filenames=batch[index:index +
+                                            MAX_FILES_PER_BATCH]))
+    for task in tasks:
+        task.result()
+
+    for filename, content, stat, key in fixed_files:
+        if content is None or read_content(filename) != content:
+            continue
+        # Some fixers rewrite the file even when nothing changed. Keeping the
+        # modification time avoids invalidating the caches keyed on it.
+        new_stat = os.stat(filename)
+        if new_stat.st_mtime_ns != stat.st_mtime_ns:
+            os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        if key is not None:
+            save_fixed_point(fixer, key)
+
+
+def _can_batch(fixer, lines):
+    """Returns whether fixer can run on the file together with others."""
+    if getattr(fixer.function, 'func', None) is not fix_command:
+        return False
+    return not (lines and fixer.dynamic_arguments)
+
+
+def make_scratch_copies(filenames, root, config):
+    """Copies files to a scratch directory, to fix them there.
+
+    The directory is in memory (/dev/shm) when possible. The layout of the
+    files under root is kept, and the config_files of the fixers are copied
+    too, so fixers looking up their settings from the location of the file,
+    as isort does, find them.
+
+    Args:
+        filenames: list[string]: the absolute paths of the files, under root.
+        root: string: the root of the repository.
+        config: dict[string: fixer]: mapping from extension to a fixer
+          function.
+
+    Returns: a tuple with the scratch directory, to be removed by the caller,
+      and a dict with the copy of each file.
+    """
+    scratch_parent = None
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        scratch_parent = '/dev/shm'
+    scratch_dir = tempfile.mkdtemp(prefix='git-lint-', dir=scratch_parent)
+
+    config_files = set()
+    for ext_fixers in config.values():
+        for fixer in ext_fixers:
+            config_files.update(fixer.config_files)
+
+    copies = {}
+    for filename in list(config_files) + list(filenames):
+        if not os.path.isfile(filename):
+            continue
+        copy_filename = os.path.join(scratch_dir,
+                                     os.path.relpath(filename, root))
+        if not os.path.isdir(os.path.dirname(copy_filename)):
+            os.makedirs(os.path.dirname(copy_filename))
+        shutil.copy2(filename, copy_filename)
+        copies[filename] = copy_filename
+
+    return scratch_dir, {
+        filename: copies.get(filename,
+                             os.path.join(scratch_dir,
+                                          os.path.relpath(filename, root)))
+        for filename in filenames
+    }
+
+
+def get_diff(filename, before, after):
+    """Returns the unified diff between two contents of filename.
+
+    Args:
+        filename: string: the path shown in the diff, e.g. relative to the
+          root of the repository.
+        before: bytes: the original content.
+        after: bytes: the fixed content.
+
+    Returns: string: the diff, empty if the contents are the same.
+    """
+    if before == after:
+        return ''
+    return ''.join(
+        difflib.unified_diff(
+            before.decode('utf-8', 'replace').splitlines(True),
+            after.decode('utf-8', 'replace').splitlines(True),
+            'a/' + filename, 'b/' + filename))
+
+
+def _get_file_state(filename):
+    """Returns the content and the stat of filename, or Nones if missing."""
+    try:
+        stat = os.stat(filename)
+        with io.open(filename, 'rb') as f:
+            return f.read(), stat
+    except (IOError, OSError):
+        return None, None
+
+
+def _get_fixed_points_dir():
+    """Returns the directory where the fixed points of the fixers are kept.
+
+    As the timings, they are kept with a shared cache, see
+    utils._get_timings_dir.
+    """
+    if utils.is_cache_shared():
+        return os.path.join(utils.get_cache_dir(), '.fixed')
+    home_folder = os.path.expanduser('~')
+    return os.path.join(home_folder, '.git-lint', 'fixed')
+
+
+def get_fixer_key(name, data, repo_home, fix_line_exp, version=None):
+    """Returns a hash of the configuration of a fixer.
+
+    See utils.get_config_key, so a change to the files the fixer reads its
+    settings from invalidates the fixed points.
+
+    Args:
+        name: string: the name of the fixer.
+        data: dict: the configuration of the fixer.
+        repo_home: string: the root of the repository.
+        fix_line_exp: the lines to format around each modified line.
+        version: string|None: the version of the fixer, if known.
+    """
+    return utils.get_config_key(name, data, repo_home, fix_line_exp, version)
+
+
+def get_fixed_point_key(fixer, content, lines):
+    """Returns the key of the fixed point of fixer over content, if any.
+
+    Returns: string|None: a hash of the fixer configuration, the content and
+      the lines the fixer is restricted to, or None if the fixer can't be
+      cached.
+    """
+    if fixer.cache_key is None:
+        return None
+    ranges = None
+    if lines and fixer.uses_lines:
+        ranges = lineset.LineSet.from_lines(lines).ranges()
+    key = '%s:%s:%s' % (fixer.cache_key, hashlib.sha1(content).hexdigest(), ranges)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _get_fixed_point_filename(fixer, key):
+    return os.path.join(_get_fixed_points_dir(), fixer.name, key)
+
+
+def is_fixed_point(fixer, key):
+    """Returns whether the fixer left the content with this key unchanged.
+
+    The modification time of the fixed point is updated when found, so that
+    cache prune evicts the least recently used ones.
+    """
+    try:
+        os.utime(_get_fixed_point_filename(fixer, key))
+    except OSError:
+        return False
+    return True
+
+
+def save_fixed_point(fixer, key):
+    """Records that the fixer left the content with this key unchanged."""
+    utils.write_file_atomically(_get_fixed_point_filename(fixer, key), b'')
+
+
+def read_content(filename):
+    """Returns the content of filename, or b'' if it can't be read."""
+    try:
+        with io.open(filename, 'rb') as f:
+            return f.read()
+    except (IOError, OSError):
+        return b''
@@ -16,9 +16,12 @@
 import os.path
 import subprocess
 
+import gitlint.lineset as lineset
+import gitlint.profiler as profiler
 import gitlint.utils as utils
 
 
+@profiler.timed('vcs', counter='vcs_queries')
 def repository_root():
     """Returns the root of the repository as an absolute path."""
     try:
@@ -31,6 +34,7 @@ def repository_root():
         return None
 
 
+@profiler.timed('vcs', counter='vcs_queries')
 def last_commit():
     """Returns the SHA1 of the last commit."""
     try:
@@ -42,6 +46,7 @@ def last_commit():
         return None
 
 
+@profiler.timed('vcs', counter='vcs_queries')
 def merge_base_commit():
     """Returns the SHA1 of the merge-base of this branch with master."""
     try:
@@ -60,7 +65,15 @@ def _remove_filename_quotes(filename):
     return filename
 
 
-def modified_files(root, tracked_only=False, commit=None):
+def _exclude_pathspecs(exclude):
+    """Returns the pathspecs excluding the given glob patterns."""
+    if not exclude:
+        return []
+    return ['--'] + [':(top,exclude)%s' % pattern for pattern in exclude]
+
+
+@profiler.timed('vcs', counter='vcs_queries')
+def modified_files(root, tracked_only=False, commit=None, exclude=None):
     """Returns a list of files that has been modified since the given commit.
 
     Args:
@@ -68,6 +81,8 @@ def modified_files(root, tracked_only=False, commit=None):
       tracked_only: exclude untracked files when True.
       commit: SHA1 of the commit. If None, it will get the modified files in the
         working copy.
+      exclude: list of glob patterns, relative to root, of paths to leave out.
+        They are passed to git, so excluded directories are not even listed.
 
     Returns: a dictionary with the modified files as keys, and additional
       information as value. In this case it adds the status returned by
@@ -76,7 +91,8 @@ def modified_files(root, tracked_only=False, commit=None):
     assert os.path.isabs(root), "Root has to be absolute, got: %s" % root
 
     if commit:
-        modified_file_to_mode = _modified_files_from_prior_commits(root, commit)
+        modified_file_to_mode = _modified_files_from_prior_commits(
+            root, commit, exclude)
     else:
         modified_file_to_mode = {}
 
@@ -84,7 +100,7 @@ def modified_files(root, tracked_only=False, commit=None):
     status_lines = subprocess.check_output([
         'git', 'status', '--porcelain', '--untracked-files=all',
         '--ignore-submodules=all'
-    ]).decode('utf-8').split(os.linesep)
+    ] + _exclude_pathspecs(exclude)).decode('utf-8').split(os.linesep)
 
     modes = ['M ', ' M', 'A ', 'AM', 'MM']
     if not tracked_only:
@@ -103,12 +119,13 @@ def modified_files(root, tracked_only=False, commit=None):
     return modified_file_to_mode
 
 
-def _modified_files_from_prior_commits(root, commit):
+def _modified_files_from_prior_commits(root, commit, exclude=None):
     last = last_commit()
     cmds = ['git', 'diff-tree', '-r', '--root', '--no-commit-id', '--name-status']
     if last != commit:
        cmds.append(commit)
     cmds.append(last)
+    cmds.extend(_exclude_pathspecs(exclude))
 
     # Convert to unicode and split
     status_lines = subprocess.check_output(cmds).decode('utf-8').split(os.linesep)
@@ -124,6 +141,7 @@ def _modified_files_from_prior_commits(root, commit):
                  mode + ' ') for filename, mode in modified_file_status)
 
 
+@profiler.timed('vcs', counter='vcs_queries')
 def modified_lines(filename, extra_data, commit=None):
     """Returns the lines that have been modifed for this file.
 
@@ -136,11 +154,11 @@ def modified_lines(filename, extra_data, commit=None):
         respect to the currently checked out revision), otherwise, we could miss
         some lines.
 
-    Returns: a list of lines that were modified, or None in case all lines are
-      new.
+    Returns: a LineSet with the lines that were modified, or None in case all
+      lines are new.
     """
     if extra_data is None:
-        return []
+        return lineset.LineSet()
     if extra_data not in ('M ', ' M', 'MM'):
         return None
 
@@ -161,4 +179,128 @@ def modified_lines(filename, extra_data, commit=None):
     modified_line_numbers = utils.filter_lines(
         blame_lines, br'(%s) (?P<line>\d+) (\d+)' % b'|'.join(commits), groups=('line', ))
 
-    return list(map(int, modified_line_numbers))
+    return lineset.LineSet.from_lines(map(int, modified_line_numbers))
+
+
+@profiler.timed('vcs', counter='vcs_queries')
+def commits_in_range(commit_range):
+    """Returns the SHA1 of the commits in the given range, oldest first.
+
+    Args:
+      commit_range: a range understood by git rev-list (e.g. master..HEAD or
+        HEAD~10..HEAD). If it is not a range, but just a revision, then only
+        that commit is returned.
+
+    Returns: a list with the SHA1 of the commits.
+    """
+    if '..' in commit_range:
+        command = ['git', 'rev-list', '--reverse', commit_range]
+    else:
+        command = ['git', 'rev-parse', '%s^{commit}' % commit_range]
+
+    # Convert to unicode and split
+    output = subprocess.check_output(command).decode('utf-8').strip()
+    return [commit for commit in output.split(os.linesep) if commit]
+
+
+@profiler.timed('vcs', counter='vcs_queries')
+def modified_files_in_commit(root, commit, exclude=None):
+    """Returns the files that were added or modified by the given commit.
+
+    Args:
+      root: the root of the repository, it has to be an absolute path.
+      commit: SHA1 of the commit.
+      exclude: list of glob patterns, relative to root, of paths to leave out.
+
+    Returns: a dictionary with the modified files as keys, and the status
+      returned by git diff-tree as value. The status has the same format as
+      the one returned by modified_files.
+    """
+    assert os.path.isabs(root), "Root has to be absolute, got: %s" % root
+
+    # Convert to unicode and split
+    status_lines = subprocess.check_output([
+        'git', 'diff-tree', '-r', '--root', '--no-commit-id', '--name-status',
+        commit
+    ] + _exclude_pathspecs(exclude)).decode('utf-8').split(os.linesep)
+
+    modified_file_status = utils.filter_lines(
+        status_lines,
+        r'(?P<mode>A|M)\s(?P<filename>.+)',
+        groups=('filename', 'mode'))
+
+    return dict((os.path.join(root, _remove_filename_quotes(filename)),
+                 mode + ' ') for filename, mode in modified_file_status)
+
+
+@profiler.timed('vcs', counter='vcs_queries')
+def modified_lines_in_commit(filename, extra_data, commit):
+    """Returns the lines that were modified for this file by the given commit.
+
+    Contrary to modified_lines, it does not need the commit to be checked out,
+    as the information is read directly from the object database.
+
+    Args:
+      filename: the absolute path of the file to check.
+      extra_data: is the extra_data returned by modified_files_in_commit.
+      commit: SHA1 of the commit.
+
+    Returns: a LineSet with the lines that were modified, or None in case all
+      lines are new.
+    """
+    if extra_data != 'M ':
+        return None
+
+    # Split as bytes, as the output may have some non unicode characters.
+    diff_lines = subprocess.check_output([
+        'git', 'diff', '--no-color', '--no-ext-diff', '-U0',
+        '%s^' % commit, commit, '--', filename
+    ]).split(os.linesep.encode('utf-8'))
+    diff_line_numbers = utils.filter_lines(
+        diff_lines,
+        br'^@@ -\d+(,\d+)? \+(?P<start_line>\d+)(,(?P<lines>\d+))? @@',
+        groups=('start_line', 'lines'))
+    modified_ranges = []
+    for start_line, lines in diff_line_numbers:
+        start_line = int(start_line)
+        lines = 1 if lines is None else int(lines)
+        modified_ranges.append((start_line, start_line + lines - 1))
+
+    return lineset.LineSet(modified_ranges)
+
+
+@profiler.timed('vcs', counter='vcs_queries')
+def file_content(root, filename, commit):
+    """Returns the content of the file at the given commit, as bytes."""
+    relative_filename = os.path.relpath(filename, root)
+    return subprocess.check_output(
+        ['git', 'cat-file', 'blob',
+         '%s:%s' % (commit, relative_filename)])
+
+
+@profiler.timed('vcs', counter='vcs_queries')
+def ignored_files(root, paths):
+    """Returns the files under the given paths that are ignored by git.
+
+    Ignored directories are returned as a whole, without listing their content,
+    so that large ignored trees (e.g. node_modules) are cheap to report.
+
+    Args:
+      root: the root of the repository, it has to be an absolute path.
+      paths: list of paths to restrict the query to.
+
+    Returns: a set with the absolute paths of the ignored files and
+      directories.
+    """
+    assert os.path.isabs(root), "Root has to be absolute, got: %s" % root
+
+    output = subprocess.check_output(
+        [
+            'git', 'ls-files', '-z', '--others', '--ignored',
+            '--exclude-standard', '--directory', '--'
+        ] + list(paths),
+        cwd=root).decode('utf-8')
+
+    return set(
+        os.path.join(root, filename.rstrip('/'))
+        for filename in output.split('\0') if filename)
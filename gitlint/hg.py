@@ -14,11 +14,15 @@
 """Functions to get information from mercurial."""
 
 import os.path
+import re
 import subprocess
 
+import gitlint.lineset as lineset
+import gitlint.profiler as profiler
 import gitlint.utils as utils
 
 
+@profiler.timed('vcs', counter='vcs_queries')
 def repository_root():
     """Returns the root of the repository as an absolute path."""
     try:
@@ -30,6 +34,7 @@ def repository_root():
         return None
 
 
+@profiler.timed('vcs', counter='vcs_queries')
 def last_commit():
     """Returns the SHA1 of the last commit."""
     try:
@@ -42,12 +47,27 @@ def last_commit():
         return None
 
 
+@profiler.timed('vcs', counter='vcs_queries')
 def merge_base_commit():
     """Returns the SHA1 of the merge-base of this branch with master."""
     raise NotImplementedError
 
 
-def modified_files(root, tracked_only=False, commit=None):
+def _exclude_arguments(exclude):
+    """Returns the arguments excluding the given glob patterns.
+
+    The patterns follow git semantics, where '*' also matches '/', so they are
+    converted to regular expressions, which mercurial anchors at the root.
+    """
+    arguments = []
+    for pattern in exclude or []:
+        regex = '.*'.join(re.escape(piece) for piece in pattern.split('*'))
+        arguments.extend(['-X', 're:%s' % regex])
+    return arguments
+
+
+@profiler.timed('vcs', counter='vcs_queries')
+def modified_files(root, tracked_only=False, commit=None, exclude=None):
     """Returns a list of files that has been modified since the last commit.
 
     Args:
@@ -55,6 +75,8 @@ def modified_files(root, tracked_only=False, commit=None):
       tracked_only: exclude untracked files when True.
       commit: SHA1 of the commit. If None, it will get the modified files in the
         working copy.
+      exclude: list of glob patterns, relative to root, of paths to leave out.
+        They are passed to mercurial, so excluded directories are not walked.
 
     Returns: a dictionary with the modified files as keys, and additional
       information as value. In this case it adds the status returned by
@@ -65,6 +87,7 @@ def modified_files(root, tracked_only=False, commit=None):
     command = ['hg', 'status']
     if commit:
         command.append('--change=%s' % commit)
+    command.extend(_exclude_arguments(exclude))
 
     # Convert to unicode and split
     status_lines = subprocess.check_output(command).decode('utf-8').split(
@@ -84,6 +107,7 @@ def modified_files(root, tracked_only=False, commit=None):
                 for filename, mode in modified_file_status)
 
 
+@profiler.timed('vcs', counter='vcs_queries')
 def modified_lines(filename, extra_data, commit=None):
     """Returns the lines that have been modifed for this file.
 
@@ -96,11 +120,11 @@ def modified_lines(filename, extra_data, commit=None):
         respect to the currently checked out revision), otherwise, we could miss
         some lines.
 
-    Returns: a list of lines that were modified, or None in case all lines are
-      new.
+    Returns: a LineSet with the lines that were modified, or None in case all
+      lines are new.
     """
     if extra_data is None:
-        return []
+        return lineset.LineSet()
     if extra_data != 'M':
         return None
 
@@ -116,10 +140,31 @@ def modified_lines(filename, extra_data, commit=None):
         diff_lines,
         br'@@ -\d+,\d+ \+(?P<start_line>\d+),(?P<lines>\d+) @@',
         groups=('start_line', 'lines'))
-    modified_line_numbers = []
+    modified_ranges = []
     for start_line, lines in diff_line_numbers:
         start_line = int(start_line)
         lines = int(lines)
-        modified_line_numbers.extend(range(start_line, start_line + lines))
+        modified_ranges.append((start_line, start_line + lines - 1))
+
+    return lineset.LineSet(modified_ranges)
+
+
+@profiler.timed('vcs', counter='vcs_queries')
+def ignored_files(root, paths):
+    """Returns the files under the given paths that are ignored by mercurial.
+
+    Args:
+      root: the root of the repository, it has to be an absolute path.
+      paths: list of paths to restrict the query to.
+
+    Returns: a set with the absolute paths of the ignored files.
+    """
+    assert os.path.isabs(root), "Root has to be absolute, got: %s" % root
+
+    output = subprocess.check_output(
+        ['hg', 'status', '--ignored', '--no-status', '--print0'] + list(paths),
+        cwd=root).decode('utf-8')
 
-    return modified_line_numbers
+    return set(
+        os.path.join(root, filename) for filename in output.split('\0')
+        if filename)
@@ -0,0 +1,147 @@
+# Copyright 2013-2014 Sebastian Kreft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compact representation of a set of line numbers."""
+
+import array
+import bisect
+import difflib
+
+
+class LineSet(object):
+    """An immutable set of line numbers, stored as disjoint ranges.
+
+    The starts and ends of the ranges are kept in two sorted arrays, so a file
+    rewritten from scratch takes a couple of integers instead of one per line,
+    and membership is a binary search.
+
+    Args:
+      ranges: iterable[tuple(int, int)]: inclusive ranges of lines, in any
+        order. Overlapping and adjacent ranges are merged, empty ones (with
+        start > end) are ignored.
+    """
+
+    __slots__ = ('_starts', '_ends')
+
+    def __init__(self, ranges=()):
+        self._starts = array.array('I')
+        self._ends = array.array('I')
+        for start, end in sorted(ranges):
+            if start > end:
+                continue
+            if self._ends and start <= self._ends[-1] + 1:
+                self._ends[-1] = max(self._ends[-1], end)
+            else:
+                self._starts.append(start)
+                self._ends.append(end)
+
+    @classmethod
+    def from_lines(cls, lines):
+        """Returns the LineSet with the given line numbers.
+
+        Args:
+          lines: iterable[int]|LineSet: the lines, in any order. A LineSet is
+            returned as is.
+        """
+        if isinstance(lines, LineSet):
+            return lines
+        return cls((line, line) for line in lines)
+
+    def ranges(self):
+        """Returns the list of (start, end) inclusive ranges, sorted."""
+        return list(zip(self._starts, self._ends))
+
+    def expand(self, lines):
+        """Returns a LineSet with lines more lines above and below each range.
+
+        Lines are never expanded before the first one.
+        """
+        if not lines:
+            return self
+        return LineSet((max(1, start - lines), end + lines)
+                       for start, end in self.ranges())
+
+    def intersection(self, other):
+        """Returns the LineSet of the lines in both self and other."""
+        other = LineSet.from_lines(other)
+        ranges = []
+        for start, end in self.ranges():
+            # Only the ranges of other overlapping [start, end] are visited.
+            index = max(bisect.bisect_right(other._starts, start) - 1, 0)
+            while index < len(other._starts) and other._starts[index] <= end:
+                overlap = (max(start, other._starts[index]),
+                           min(end, other._ends[index]))
+                if overlap[0] <= overlap[1]:
+                    ranges.append(overlap)
+                index += 1
+        return LineSet(ranges)
+
+    def __contains__(self, line):
+        index = bisect.bisect_right(self._starts, line) - 1
+        return index >= 0 and line <= self._ends[index]
+
+    def __iter__(self):
+        for start, end in zip(self._starts, self._ends):
+            for line in range(start, end + 1):
+                yield line
+
+    def __len__(self):
+        return sum(end - start + 1
+                   for start, end in zip(self._starts, self._ends))
+
+    def __bool__(self):
+        return bool(self._starts)
+
+    def __eq__(self, other):
+        if not isinstance(other, LineSet):
+            return NotImplemented
+        return self._starts == other._starts and self._ends == other._ends
+
+    def __hash__(self):
+        return hash((tuple(self._starts), tuple(self._ends)))
+
+    def __repr__(self):
+        return 'LineSet(%r)' % self.ranges()
+
+
+def remap(lines, before, after):
+    """Maps lines of before to the lines of after, e.g. after fixing a file.
+
+    The lines that did not change keep being modified or not, while the ones
+    inserted or replaced are modified, as the VCS would report them. This
+    avoids asking the VCS again, which for git means a full blame.
+
+    Args:
+      lines: LineSet|None: the modified lines of before. None means that all
+        the lines are modified.
+      before: bytes: the content the lines refer to.
+      after: bytes: the new content.
+
+    Returns: LineSet|None: the modified lines of after.
+    """
+    if lines is None or before == after:
+        return lines
+
+    ranges = []
+    matcher = difflib.SequenceMatcher(
+        None, before.splitlines(), after.splitlines(), autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            offset = j1 - i1
+            # Lines are 1-based, while opcodes are 0-based and half-open.
+            equal_lines = LineSet([(i1 + 1, i2)]).intersection(lines)
+            for start, end in equal_lines.ranges():
+                ranges.append((start + offset, end + offset))
+        elif tag in ('replace', 'insert'):
+            ranges.append((j1 + 1, j2))
+    return LineSet(ranges)
@@ -18,12 +18,16 @@ import os
 import os.path
 import re
 
+import gitlint.fixers as fixers
+import gitlint.lineset as lineset
+import gitlint.profiler as profiler
 import gitlint.utils as utils
 
 
 def missing_requirements_command(missing_programs, installation_string,
-                                 filename, unused_lines):
+                                 filename, unused_lines, content=None):
     """Pseudo-command to be used when requirements are missing."""
+    # pylint: disable=unused-argument
     verb = 'is'
     if len(missing_programs) > 1:
         verb = 'are'
@@ -39,7 +43,9 @@ def missing_requirements_command(missing_programs, installation_string,
 
 # TODO(skreft): add test case for result already in cache.
 def lint_command(name, program, arguments, filter_regex, cache_enabled,
-                 filename, lines):
+                 filename, lines, stdin_arguments=None, content=None,
+                 stream=False, limits=None, region_arguments=None,
+                 cache_key=None):
     """Executes a lint program and filter the output.
 
     Executes the lint tool 'program' with arguments 'arguments' over the file
@@ -53,19 +59,99 @@ def lint_command(name, program, arguments, filter_regex, cache_enabled,
       filter_regex: string: regular expression to filter lines.
       cache_enabled: bool: whether using cached results is enabled.
       filename: string: filename to lint.
-      lines: list[int]|None: list of lines that we want to capture. If None,
+      lines: LineSet|list[int]|None: lines that we want to capture. If None,
         then all lines will be captured.
+      stdin_arguments: list[string]|None: if not None, the file is fed to the
+        program through stdin. See utils.run.
+      content: bytes|None: content to lint instead of the file on disk.
+      stream: bool: whether to filter the output while it is being read, so
+        that it is never held in memory as a whole. See utils.run_lines.
+      limits: utils.Limits|None: the timeout, memory and niceness limits of
+        the program. If exceeded, the program is killed and an error is
+        reported for the file.
+      region_arguments: list[string]|None: arguments restricting the analysis
+        of the program to the modified lines. See get_region_arguments.
+      cache_key: string|None: the hash of the configuration and version of
+        the program, see utils.get_config_key.
 
     Returns: dict: a dict with the extracted info from the message.
     """
-    output = utils.run(name, program, arguments, cache_enabled, filename)
-    output_lines = output.split(os.linesep)
+    run = utils.run_lines if stream else utils.run
+    arguments, regions = get_region_arguments(arguments, region_arguments,
+                                              lines)
+    with profiler.span('lint', name):
+        try:
+            output = run(
+                name,
+                program,
+                arguments,
+                cache_enabled,
+                filename,
+                stdin_arguments=stdin_arguments,
+                content=content,
+                limits=limits,
+                regions=regions,
+                cache_key=cache_key)
+            if isinstance(output, dict):
+                # The program could not be executed.
+                return output
+            if not stream:
+                output = output.split(os.linesep)
+            # When streaming, this also includes the time the program runs.
+            with profiler.span('filter', name):
+                return _filter_output(output, filter_regex, filename, lines)
+        except utils.LimitExceeded as error:
+            return {filename: {'error': ['%s: %s' % (name, error)]}}
 
-    if lines is None:
+
+def get_region_arguments(arguments, region_arguments, lines):
+    """Appends the region arguments for lines to arguments.
+
+    Region arguments use the variable {MODIFIED_LINES_RANGE_REPEATED_ARG}, as
+    the dynamic arguments of the fixers. Each of them is repeated once per
+    range of consecutive modified lines, as in '--lines=10-12'.
+
+    Args:
+      arguments: list[string]: the arguments of the program.
+      region_arguments: list[string]|None: the region arguments of the program.
+      lines: LineSet|list[int]|None: the modified lines. If None, the whole
+        file is analysed and no region argument is added.
+
+    Returns: a tuple with the arguments and the ranges they refer to, which are
+      None if the program analyses the whole file.
+    """
+    if not region_arguments or lines is None:
+        return arguments, None
+    regions = fixers.get_modified_lines_range_tuples(lines, None)
+    return (arguments + fixers.expand_range_arguments(region_arguments,
+                                                      regions), regions)
+
+
+def _filter_output(output_lines, filter_regex, filename, lines):
+    """Extracts the comments from the output of a lint program.
+
+    Args:
+      output_lines: iterable[string]: the lines of the output of the program.
+      filter_regex: string: regular expression to filter lines.
+      filename: string: the linted file.
+      lines: LineSet|list[int]|None: lines that we want to capture. If None,
+        then all lines will be captured.
+
+    Returns: dict: a dict with the extracted info from the message.
+    """
+    # When {lines} is only used as the line group, any line is matched and
+    # the modified ones are picked by membership, which is much cheaper than
+    # matching an alternation of all of them.
+    check_lines = (lines is not None and
+                   filter_regex.count('{lines}') == 1 and
+                   '(?P<line>{lines})' in filter_regex)
+    if lines is None or check_lines:
         lines_regex = r'\d+'
     else:
         lines_regex = '|'.join(map(str, lines))
     lines_regex = '(%s)' % lines_regex
+    if check_lines:
+        lines = lineset.LineSet.from_lines(lines)
 
     groups = ('line', 'column', 'message', 'severity', 'message_id')
     filtered_lines = utils.filter_lines(
@@ -78,6 +164,8 @@ def lint_command(name, program, arguments, filter_regex, cache_enabled,
         comment = dict(p for p in zip(groups, data) if p[1] is not None)
         if 'line' in comment:
             comment['line'] = int(comment['line'])
+            if check_lines and comment['line'] not in lines:
+                continue
         if 'column' in comment:
             comment['column'] = int(comment['column'])
         if 'severity' in comment:
@@ -88,6 +176,7 @@ def lint_command(name, program, arguments, filter_regex, cache_enabled,
 
 
 # TODO(skreft): validate data['filter'], ie check that only has valid fields.
+@profiler.timed('config', 'parse_linters')
 def parse_yaml_config(yaml_config, repo_home, cache_enabled):
     """Converts a dictionary (parsed Yaml) to the internal representation."""
     config = collections.defaultdict(list)
@@ -104,24 +193,65 @@ def parse_yaml_config(yaml_config, repo_home, cache_enabled):
                                            not_found_programs,
                                            data['installation'])
         else:
-            linter_command = utils.Partial(lint_command, name, command,
-                                           arguments, data['filter'],
-                                           cache_enabled)
+            stdin_arguments = None
+            if data.get('stdin'):
+                # These are formatted at runtime, when the filename is known.
+                stdin_arguments = data.get('stdin_arguments', [])
+            limits = utils.Limits(
+                timeout=data.get('timeout'),
+                max_memory=data.get('max_memory'),
+                nice=data.get('nice'))
+            if not any(limits):
+                limits = None
+            region_arguments = data.get('region_arguments') or None
+            linter_command = utils.Partial(
+                lint_command,
+                name,
+                command,
+                arguments,
+                data['filter'],
+                cache_enabled,
+                stdin_arguments=stdin_arguments,
+                stream=bool(data.get('stream')),
+                limits=limits,
+                region_arguments=region_arguments,
+                cache_key=utils.get_config_key(
+                    name, data, repo_home, utils.get_program_version(command)))
         for extension in data['extensions']:
             config[extension].append(linter_command)
 
     return config
 
 
-def lint(filename, lines, config):
+def get_cache_keys(config):
+    """Returns the cache_key of each linter in config, by name.
+
+    Args:
+      config: dict: the configuration returned by parse_yaml_config.
+
+    Returns: dict: the hash of the configuration, config files and version of
+      each linter that can be run. See utils.get_config_key.
+    """
+    keys = {}
+    for linter_commands in config.values():
+        for linter_command in linter_commands:
+            if linter_command.func is lint_command:
+                keys[linter_command.args[0]] = (
+                    linter_command.keywords['cache_key'])
+    return keys
+
+
+def lint(filename, lines, config, content=None):
     """Lints a file.
 
     Args:
         filename: string: filename to lint.
-        lines: list[int]|None: list of lines that we want to capture. If None,
+        lines: LineSet|list[int]|None: lines that we want to capture. If None,
           then all lines will be captured.
         config: dict[string: linter]: mapping from extension to a linter
           function.
+        content: bytes|None: content to lint instead of the file on disk, e.g.
+          the file as it was in a given commit.
 
     Returns: dict: if there were errors running the command then the field
       'error' will have the reasons in a list. if the lint process was skipped,
@@ -129,25 +259,40 @@ def lint(filename, lines, config):
       'comments' will have the messages.
     """
     _, ext = os.path.splitext(filename)
-    if ext in config:
-        output = collections.defaultdict(list)
-        for linter in config[ext]:
-            linter_output = linter(filename, lines)
-            for category, values in linter_output[filename].items():
-                output[category].extend(values)
-
-        if 'comments' in output:
-            output['comments'] = sorted(
-                output['comments'],
-                key=lambda x: (x.get('line', -1), x.get('column', -1)))
-
-        return {filename: dict(output)}
-    else:
-        return {
-            filename: {
-                'skipped': [
-                    'no linter is defined or enabled for files'
-                    ' with extension "%s"' % ext
-                ]
-            }
+    if ext not in config:
+        return _no_linter_result(filename)
+
+    linter_outputs = []
+    for linter in config[ext]:
+        if content is None:
+            linter_outputs.append(linter(filename, lines))
+        else:
+            linter_outputs.append(linter(filename, lines, content=content))
+    return _merge_outputs(filename, linter_outputs)
+
+
+def _no_linter_result(filename):
+    _, ext = os.path.splitext(filename)
+    return {
+        filename: {
+            'skipped': [
+                'no linter is defined or enabled for files'
+                ' with extension "%s"' % ext
+            ]
         }
+    }
+
+
+def _merge_outputs(filename, linter_outputs):
+    """Merges the outputs of all the linters run on filename."""
+    output = collections.defaultdict(list)
+    for linter_output in linter_outputs:
+        for category, values in linter_output[filename].items():
+            output[category].extend(values)
+
+    if 'comments' in output:
+        output['comments'] = sorted(
+            output['comments'],
+            key=lambda x: (x.get('line', -1), x.get('column', -1)))
+
+    return {filename: dict(output)}
@@ -0,0 +1,168 @@
+# Copyright 2013-2014 Sebastian Kreft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Manifest of the state of the last run, to skip unchanged files.
+
+There is one manifest per repository and mode. For each file it records the
+hash of its content, its status in the VCS and the final result. A file whose content and status did not change gets the same result,
+as long as the manifest key is the same. The key covers everything else the
+result depends on: the base commit, HEAD, --force, the configuration, the
+files the linters read their settings from, the versions of the linters and
+the version of git-lint.
+"""
+
+import copy
+import hashlib
+import io
+import json
+import os
+import os.path
+import threading
+
+import gitlint.utils as utils
+from gitlint.version import __VERSION__
+
+
+def _get_manifests_dir():
+    """Returns the directory where the manifests are kept.
+
+    As the timings, they are kept with a shared cache, see
+    utils._get_timings_dir. Each checkout still has its own manifests.
+    """
+    if utils.is_cache_shared():
+        return os.path.join(utils.get_cache_dir(), '.manifests')
+    home_folder = os.path.expanduser('~')
+    return os.path.join(home_folder, '.git-lint', 'manifests')
+
+
+def get_filename(repository_root, mode):
+    """Returns the location of the manifest of repository_root for mode."""
+    repository_hash = hashlib.sha1(
+        repository_root.encode('utf-8')).hexdigest()
+    return os.path.join(_get_manifests_dir(), repository_hash,
+                        '%s.json' % mode)
+
+
+def get_key(base_commit, head_commit, force, config, linter_keys=None):
+    """Returns the key of a manifest.
+
+    Args:
+      base_commit: string|None: the commit the changes are computed against.
+      head_commit: string|None: the commit checked out.
+      force: bool: whether all the lines are reported.
+      config: dict: the parsed configuration.
+      linter_keys: dict|None: the hash of the config files and version of each
+        linter, see linters.get_cache_keys.
+
+    Returns: string: a hash of all the arguments and the version of git-lint.
+    """
+    data = json.dumps([
+        __VERSION__, base_commit, head_commit, force, config, linter_keys
+    ],
+                      sort_keys=True,
+                      default=str)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def blob_hash(filename):
+    """Returns the git blob hash of filename, or None if it can't be read.
+
+    It is the same hash as the one of 'git hash-object', but computed without
+    forking a process.
+    """
+    try:
+        with io.open(filename, 'rb') as f:
+            content = f.read()
+    except (IOError, OSError):
+        return None
+    header = ('blob %d\0' % len(content)).encode('utf-8')
+    return hashlib.sha1(header + content).hexdigest()
+
+
+class Manifest(object):
+    """The state of the last run of a repository and mode.
+
+    It is safe to use from several threads.
+
+    Args:
+      filename: string: where the manifest is stored.
+      key: string: see get_key.
+      entries: dict: the entries of the previous run, by filename.
+    """
+
+    def __init__(self, filename, key, entries=None):
+        self.filename = filename
+        self.key = key
+        self.entries = entries or {}
+        self._lock = threading.Lock()
+
+    def lookup(self, filename, extra_data):
+        """Returns the hash of filename and its previous result, if any.
+
+        Args:
+          filename: string: the absolute path of the file.
+          extra_data: the extra_data returned by modified_files for filename.
+
+        Returns: a tuple with the blob hash of filename and the recorded
+          result, which is None if the file changed.
+        """
+        blob = blob_hash(filename)
+        with self._lock:
+            entry = self.entries.get(filename)
+        if (blob is None or entry is None or entry['blob'] != blob or
+                entry['extra_data'] != extra_data):
+            return blob, None
+        # The caller may modify the result, e.g. to format the comments.
+        return blob, copy.deepcopy(entry['result'])
+
+    def record(self, filename, extra_data, blob, result):
+        """Records the result of filename.
+
+        Results with errors or skipped linters are not recorded, as they may
+        change without any change to the file, e.g. by installing a linter. The
+        modified lines are not recorded either: they follow from the content,
+        the status and the base commit, which are all checked by lookup.
+        """
+        if blob is None or result.get('error') or result.get('skipped'):
+            return
+        with self._lock:
+            self.entries[filename] = {
+                'blob': blob,
+                'extra_data': extra_data,
+                'result': copy.deepcopy(result),
+            }
+
+    def save(self):
+        """Writes the manifest atomically, so readers never see it partial."""
+        with self._lock:
+            data = json.dumps({'key': self.key, 'entries': self.entries},
+                              ensure_ascii=False)
+        utils.write_file_atomically(self.filename, data)
+
+
+def load(repository_root, mode, key):
+    """Loads the manifest of repository_root for mode.
+
+    Returns: Manifest: with the entries of the previous run if it had the same
+      key, or empty otherwise.
+    """
+    filename = get_filename(repository_root, mode)
+    try:
+        with io.open(filename, encoding='utf-8') as f:
+            data = json.load(f)
+    except (IOError, OSError, ValueError):
+        return Manifest(filename, key)
+
+    if data.get('key') != key:
+        return Manifest(filename, key)
+    return Manifest(filename, key, data.get('entries'))
@@ -0,0 +1,281 @@
+# Copyright 2013-2014 Sebastian Kreft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Functions to measure where the time of a run is spent.
+
+Recording is disabled by default, in which case spans and counters are no-ops.
+Spans are tagged with the thread and with the file being processed, as set by
+file_context. They can be exported in the Trace Event Format, which is
+understood by chrome://tracing and other trace viewers.
+"""
+
+import collections
+import contextlib
+import contextvars
+import functools
+import io
+import json
+import os
+import os.path
+import threading
+import time
+
+Span = collections.namedtuple(
+    'Span', ('category', 'name', 'filename', 'thread', 'start', 'duration'))
+
+_lock = threading.Lock()
+# A context variable, unlike a thread local, is also isolated between the
+# asyncio tasks running on the same thread.
+_filename = contextvars.ContextVar('filename', default=None)
+_state = {'enabled': False, 'start': None}
+_spans = []
+# The total seconds of the spans of each file, by 'category:name', so that the
+# timings of a file are found without going through all the spans.
+_file_timings = collections.defaultdict(
+    lambda: collections.defaultdict(float))
+_counters = collections.Counter()
+
+
+def enable():
+    """Starts recording spans and counters, discarding previous ones."""
+    reset()
+    _state['enabled'] = True
+    _state['start'] = time.time()
+
+
+def disable():
+    """Stops recording spans and counters."""
+    _state['enabled'] = False
+
+
+def is_enabled():
+    """Whether spans and counters are being recorded."""
+    return _state['enabled']
+
+
+def reset():
+    """Discards all the recorded spans and counters."""
+    with _lock:
+        del _spans[:]
+        _file_timings.clear()
+        _counters.clear()
+
+
+def get_spans():
+    """Returns a copy of the recorded spans."""
+    with _lock:
+        return list(_spans)
+
+
+def get_counters():
+    """Returns a copy of the recorded counters."""
+    with _lock:
+        return collections.Counter(_counters)
+
+
+def count(counter, value=1):
+    """Increments counter by value."""
+    if not _state['enabled']:
+        return
+    with _lock:
+        _counters[counter] += value
+
+
+def current_filename():
+    """Returns the file being processed by this thread or task, if any."""
+    return _filename.get()
+
+
+@contextlib.contextmanager
+def file_context(filename):
+    """Tags the spans recorded by this thread or task in this context."""
+    token = _filename.set(filename)
+    try:
+        yield
+    finally:
+        _filename.reset(token)
+
+
+@contextlib.contextmanager
+def span(category, name):
+    """Records the time spent in this context.
+
+    Args:
+      category: string: the kind of work, e.g. 'vcs', 'lint' or 'cache'.
+      name: string: what is being done, e.g. the name of the linter.
+    """
+    if not _state['enabled']:
+        yield
+        return
+
+    start = time.time()
+    try:
+        yield
+    finally:
+        duration = time.time() - start
+        recorded = Span(category, name, current_filename(),
+                        threading.current_thread().name, start, duration)
+        with _lock:
+            _spans.append(recorded)
+            if recorded.filename is not None:
+                _file_timings[recorded.filename]['%s:%s' % (
+                    category, name)] += duration
+
+
+def timed(category, name=None, counter=None):
+    """Decorator recording a span for each call of the decorated function.
+
+    Args:
+      category: string: the kind of work.
+      name: string|None: the name of the span. Defaults to the function name.
+      counter: string|None: if set, counter is incremented on each call.
+    """
+
+    def decorator(function):
+        span_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if counter:
+                count(counter)
+            with span(category, span_name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def file_timings(filename):
+    """Returns the time spent on filename, by category and name.
+
+    Returns: dict: a mapping from 'category:name' to the total seconds.
+    """
+    with _lock:
+        return dict(_file_timings.get(filename, {}))
+
+
+def _totals(spans, key):
+    totals = collections.defaultdict(float)
+    calls = collections.Counter()
+    for recorded in spans:
+        totals[key(recorded)] += recorded.duration
+        calls[key(recorded)] += 1
+    return sorted(
+        ((total, name, calls[name]) for name, total in totals.items()),
+        key=lambda item: (-item[0], item[1]))
+
+
+def report(top=10):
+    """Returns a human readable summary of the recorded spans and counters.
+
+    Args:
+      top: int: how many of the slowest linters and files to include.
+
+    Returns: a list with the lines of the report.
+    """
+    spans = get_spans()
+    counters = get_counters()
+    lines = ['Profile:']
+    if _state['start'] is not None:
+        lines.append('  Total time: %.3fs' % (time.time() - _state['start']))
+
+    lines.append('  Time per phase (phases may be nested):')
+    for total, category, calls in _totals(spans, lambda s: s.category):
+        lines.append('    %s: %.3fs in %d calls' % (category, total, calls))
+
+    lines.append('  Slowest linters:')
+    lint_spans = [s for s in spans if s.category == 'lint']
+    for total, name, calls in _totals(lint_spans, lambda s: s.name)[:top]:
+        lines.append('    %s: %.3fs in %d runs' % (name, total, calls))
+
+    lines.append('  Slowest files:')
+    file_spans = [s for s in spans if s.category == 'file']
+    for total, filename, _ in _totals(file_spans,
+                                      lambda s: s.filename)[:top]:
+        lines.append('    %s: %.3fs' % (os.path.relpath(filename), total))
+
+    hits = counters['cache_hits']
+    misses = counters['cache_misses']
+    if hits + misses:
+        lines.append('  Cache: %d hits, %d misses (%.0f%% hit rate)' %
+                     (hits, misses, 100.0 * hits / (hits + misses)))
+    else:
+        lines.append('  Cache: not used')
+    fixer_hits = counters['fixer_cache_hits']
+    fixer_misses = counters['fixer_cache_misses']
+    if fixer_hits + fixer_misses:
+        lines.append('  Fixer cache: %d hits, %d misses' %
+                     (fixer_hits, fixer_misses))
+    lines.append('  Forks: %d linter and fixer runs, %d vcs queries' %
+                 (counters['program_runs'], counters['vcs_queries']))
+
+    return lines
+
+
+def trace_events():
+    """Returns the recorded spans in the Trace Event Format.
+
+    Each span becomes a complete event ('X'), with timestamps in microseconds
+    since the profiler was enabled. Each thread gets its own track, named
+    after the thread.
+
+    Returns: list[dict]: the trace events.
+    """
+    spans = get_spans()
+    origin = _state['start']
+    if origin is None:
+        origin = min([s.start for s in spans] or [0])
+
+    pid = os.getpid()
+    thread_ids = {}
+    events = []
+    for recorded in sorted(spans, key=lambda s: s.start):
+        tid = thread_ids.setdefault(recorded.thread, len(thread_ids) + 1)
+        args = {}
+        if recorded.filename is not None:
+            args['file'] = recorded.filename
+        events.append({
+            'name': recorded.name,
+            'cat': recorded.category,
+            'ph': 'X',
+            'ts': int((recorded.start - origin) * 1e6),
+            'dur': int(recorded.duration * 1e6),
+            'pid': pid,
+            'tid': tid,
+            'args': args,
+        })
+
+    for thread, tid in thread_ids.items():
+        events.append({
+            'name': 'thread_name',
+            'ph': 'M',
+            'pid': pid,
+            'tid': tid,
+            'args': {
+                'name': thread
+            },
+        })
+
+    return events
+
+
+def write_trace(filename):
+    """Writes the recorded spans to filename in the Trace Event Format."""
+    trace = {
+        'traceEvents': trace_events(),
+        'displayTimeUnit': 'ms',
+        'otherData': dict(get_counters()),
+    }
+    with io.open(filename, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(trace, ensure_ascii=False))
@@ -0,0 +1,153 @@
+# Copyright 2013-2014 Sebastian Kreft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Functions to split a lint run across several machines."""
+
+import heapq
+import io
+import json
+import os.path
+
+import gitlint.utils as utils
+
+WEIGHTS = ('size', 'time')
+
+
+def parse_shard(shard):
+    """Parses a shard specification of the form K/N.
+
+    Args:
+      shard: string: the shard specification, where 1 <= K <= N.
+
+    Returns: a tuple (K, N).
+    """
+    try:
+        index, count = [int(value) for value in shard.split('/')]
+    except ValueError:
+        raise ValueError('Shard must be of the form K/N, got: %s' % shard)
+    if not 1 <= index <= count:
+        raise ValueError('Shard K/N must satisfy 1 <= K <= N, got: %s' % shard)
+    return index, count
+
+
+def _size(filename):
+    try:
+        return os.path.getsize(filename)
+    except OSError:
+        return 0
+
+
+def get_weights(filenames, weight='size', timings=None):
+    """Returns the estimated cost of linting each of the files.
+
+    Args:
+      filenames: list[string]: the files to lint.
+      weight: string: either 'size', to use the size of the files, or 'time',
+        to use the time the linters took in previous runs. Files without a
+        recorded time get the average time.
+      timings: dict[string, float]|None: the times of the files, required
+        with 'time', see load_timings. The cache is not read directly, as
+        other shards may be updating it: all shards must use the same
+        snapshot to agree on the split.
+
+    Returns: dict: a mapping from filename to its weight.
+    """
+    if weight not in WEIGHTS:
+        raise ValueError('Invalid shard weight. Valid weights are: %s.' %
+                         ', '.join(WEIGHTS))
+
+    if weight == 'size':
+        return dict((filename, _size(filename)) for filename in filenames)
+
+    if timings is None:
+        raise ValueError('Shard weight time requires a snapshot of the timings')
+    known = [timings[filename] for filename in filenames
+             if filename in timings]
+    default = sum(known) / len(known) if known else 1.0
+    return dict((filename, timings.get(filename, default))
+                for filename in filenames)
+
+
+def get_timings(filenames, repository_root):
+    """Returns the times recorded in the cache for the files.
+
+    Args:
+      filenames: list[string]: the files to look up.
+      repository_root: string: the root of the repository.
+
+    Returns: dict: a mapping from the path of each file relative to
+      repository_root to its time in seconds. Files without a recorded time
+      are left out.
+    """
+    timings = {}
+    for filename in filenames:
+        seconds = utils.get_run_time_from_cache(filename)
+        if seconds is not None:
+            timings[os.path.relpath(filename, repository_root)] = seconds
+    return timings
+
+
+def load_timings(json_filename, repository_root):
+    """Loads the timings written by get_timings, as the argument of get_weights.
+
+    Args:
+      json_filename: string: the file with the json output of get_timings.
+      repository_root: string: the root of the repository.
+
+    Returns: dict: a mapping from the absolute path of each file to its time.
+    """
+    with io.open(json_filename, encoding='utf-8') as f:
+        timings = json.load(f)
+    return dict((os.path.join(repository_root, filename), seconds)
+                for filename, seconds in timings.items())
+
+
+def select_shard(filenames, index, count, weights):
+    """Returns the files assigned to the shard index out of count.
+
+    The assignment is deterministic, so that every shard computes the same
+    split. Files are assigned greedily, heaviest first, to the shard with the
+    lowest load.
+
+    Args:
+      filenames: list[string]: all the files to lint.
+      index: int: the shard to return, starting at 1.
+      count: int: the total number of shards.
+      weights: dict[string, float]: the weight of each of the files.
+
+    Returns: the sorted list of files of the shard.
+    """
+    loads = [(0, shard) for shard in range(count)]
+    selected = []
+    for filename in sorted(filenames, key=lambda f: (-weights[f], f)):
+        load, shard = heapq.heappop(loads)
+        if shard == index - 1:
+            selected.append(filename)
+        heapq.heappush(loads, (load + weights[filename], shard))
+
+    return sorted(selected)
+
+
+def merge_results(json_filenames):
+    """Merges the results written with --json by each of the shards.
+
+    Args:
+      json_filenames: list[string]: the files with the output of each shard.
+
+    Returns: dict: the merged mapping from filename to its result.
+    """
+    merged = {}
+    for json_filename in json_filenames:
+        with io.open(json_filename, encoding='utf-8') as f:
+            merged.update(json.load(f))
+    return merged
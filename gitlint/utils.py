@@ -13,15 +13,70 @@
 # limitations under the License.
 """Common function used across modules."""
 
+import collections
 import functools
+import hashlib
 import io
+import json
+import multiprocessing
 import os
+import pathlib
 import re
+import shutil
+import signal
 import string
 import subprocess
+import tempfile
+import threading
+import time
+from concurrent import futures
 
-# This can be just pathlib when 2.7 and 3.4 support is dropped.
-import pathlib2 as pathlib
+import gitlint.profiler as profiler
+from gitlint.version import __VERSION__
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    # Not available on Windows. Only Linux has resource.prlimit, so
+    # max_memory is not enforced elsewhere.
+    resource = None
+
+# Limits for running a program: timeout in seconds, max_memory in megabytes of
+# address space and nice increment. Any of them may be None.
+Limits = collections.namedtuple('Limits', ('timeout', 'max_memory', 'nice'))
+
+
+def _get_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# The mode of the files written, as if they were created with open.
+# tempfile.mkstemp creates them readable only by their owner, which would make
+# the entries of a shared cache unreadable by other users. The umask can only
+# be read by changing it, which is done once, before other threads start.
+_FILE_MODE = 0o666 & ~_get_umask()
+
+# Where the cache is and the root of the repository, see configure_cache.
+_cache_state = {'dir': None, 'repository_root': None}
+
+# Header of the cache entries, with the length in bytes and the sha1 of the
+# body. The length has a fixed width, so the header can be written last.
+_CACHE_HEADER = b'git-lint-cache %020d %s\n'
+_CACHE_HEADER_REGEX = re.compile(br'^git-lint-cache (\d{20}) ([0-9a-f]{40})\n$')
+
+# Replaces the root of the repository in the output stored in a shared cache.
+_REPOSITORY_ROOT_MARKER = '{GIT_LINT_REPOSITORY_ROOT}'
+
+# Number of cache hits and misses of each program since the last call to
+# pop_cache_lookups.
+_cache_lookups_lock = threading.Lock()
+_cache_lookups = collections.defaultdict(collections.Counter)
+
+
+class LimitExceeded(Exception):
+    """A program was killed for exceeding its Limits."""
 
 
 class Partial(functools.partial):
@@ -38,6 +93,82 @@ class Partial(functools.partial):
             (self.func.__name__, self.args, self.keywords))  # pragma: no cover
 
 
+# Tokens of a regular expression that can be translated into a glob: ".*", an
+# escaped character, a literal character, or anything else (not translatable).
+_REGEX_GLOB_TOKENS = re.compile(r'(\.\*)|\\(.)|([^.^$*+?{}\[\]\\|()])|(.)',
+                                re.DOTALL)
+
+
+class IgnoreMatcher(object):
+    """Precompiled matcher for the regexes in ignore-regex.
+
+    The regexes are matched against absolute paths. Those made only of literal
+    characters and '.*' can also be expressed as glob patterns, which lets the
+    VCS queries exclude the ignored paths instead of listing them.
+    """
+
+    def __init__(self, regexes):
+        self.regexes = list(regexes)
+        self._regex = None
+        if self.regexes:
+            self._regex = re.compile('|'.join(
+                '(%s)' % regex for regex in self.regexes))
+
+    def __bool__(self):
+        return self._regex is not None
+
+    def match(self, path):
+        """Whether the path matches any of the regexes."""
+        return self._regex is not None and self._regex.match(path) is not None
+
+    def exclude_globs(self, root):
+        """Returns the regexes which can be expressed as glob patterns.
+
+        The patterns are relative to root, and '*' also matches '/', as in the
+        default pathspec semantics of git. A path matching any of them is
+        guaranteed to be matched by match, but not the other way around.
+
+        Args:
+          root: the absolute path of the repository's root.
+
+        Returns: a list of glob patterns.
+        """
+        globs = []
+        for regex in self.regexes:
+            pattern = _regex_to_glob(regex, root)
+            if pattern is not None:
+                globs.append(pattern)
+        return globs
+
+
+def _regex_to_glob(regex, root):
+    """Translates regex, anchored at the start of the path, into a glob."""
+    pieces = []
+    for match in _REGEX_GLOB_TOKENS.finditer(regex):
+        any_string, escaped, literal, _ = match.groups()
+        if any_string:
+            pieces.append('*')
+        elif escaped is not None and not escaped.isalnum():
+            pieces.append(escaped)
+        elif literal is not None:
+            pieces.append(literal)
+        else:
+            return None
+
+    pattern = ''.join(pieces)
+    if any(char in pattern.replace('*', '') for char in '?[]'):
+        return None
+    if not pattern.startswith('*'):
+        prefix = root.rstrip('/') + '/'
+        if not pattern.startswith(prefix):
+            return None
+        pattern = pattern[len(prefix):]
+    if not pattern.endswith('*'):
+        # Regexes are not anchored at the end.
+        pattern += '*'
+    return pattern
+
+
 def replace_variables(data, repo_home, config_file=None):
     """Replace the format variables in all items of data."""
     default_path = os.path.join(os.path.dirname(__file__), 'configs')
@@ -73,6 +204,104 @@ def filter_lines(lines, filter_regex, groups=None):
                 yield tuple(matched_groups.get(group) for group in groups)
 
 
+# Directories holding VCS metadata, which are never walked.
+_VCS_DIRECTORIES = ('.git', '.hg')
+
+
+def _nothing_ignored(unused_path, unused_is_dir):
+    """Default predicate for walk, which does not ignore anything."""
+    return False
+
+
+def _scan_directory(directory, is_ignored):
+    """Returns the sorted files and subdirectories of directory.
+
+    Symbolic links to directories are not followed, and the entries for which
+    is_ignored returns True are left out.
+    """
+    files = []
+    directories = []
+    for entry in os.scandir(directory):
+        if entry.is_dir(follow_symlinks=False):
+            if (entry.name not in _VCS_DIRECTORIES and
+                    not is_ignored(entry.path, True)):
+                directories.append(entry.path)
+        elif entry.is_file() and not is_ignored(entry.path, False):
+            files.append(entry.path)
+
+    return sorted(files), sorted(directories)
+
+
+def walk(directories, is_ignored=None, max_workers=None):
+    """Yields the files contained in the given directories, recursively.
+
+    Directories are scanned in parallel with os.scandir, but the files are
+    yielded in a deterministic order: the files of a directory, sorted by name,
+    come before those of its subdirectories. As this is a generator, files can
+    be consumed while the rest of the tree is still being scanned.
+
+    Args:
+      directories: list[string]: directories to walk.
+      is_ignored: function(string, bool): bool|None: predicate receiving a path
+        and whether it is a directory. Ignored directories are not walked.
+      max_workers: int|None: number of threads used for scanning. Defaults to
+        the number of cpus.
+
+    Yields: string: the path of each of the files.
+    """
+    if is_ignored is None:
+        is_ignored = _nothing_ignored
+    if max_workers is None:
+        max_workers = multiprocessing.cpu_count()
+
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Directories are submitted as soon as they are found, so that scans
+        # run ahead of the consumer. The stack is kept in reverse order so that
+        # directories are visited in sorted order.
+        pending = [
+            executor.submit(_scan_directory, directory, is_ignored)
+            for directory in reversed(directories)
+        ]
+        while pending:
+            files, subdirectories = pending.pop().result()
+            pending.extend(
+                executor.submit(_scan_directory, subdirectory, is_ignored)
+                for subdirectory in reversed(subdirectories))
+            for filename in files:
+                yield filename
+
+
+def map_in_order(submit, iterable, max_pending):
+    """Yields each item of iterable with the result of processing it, in order.
+
+    Unlike Executor.map, which consumes the whole iterable before yielding the
+    first result, at most max_pending items are submitted ahead of the
+    consumer. Items produced lazily (e.g. by walk) are thus processed as they
+    are found, and memory does not grow with the number of items.
+
+    Args:
+      submit: function(item): Future: starts processing item, e.g.
+        Executor.submit.
+      iterable: iterable: the items to process.
+      max_pending: int: the maximum number of items being processed.
+
+    Yields: tuple(item, result): each item with its result.
+    """
+    pending = collections.deque()
+    try:
+        for item in iterable:
+            pending.append((item, submit(item)))
+            if len(pending) >= max_pending:
+                item, future = pending.popleft()
+                yield item, future.result()
+        while pending:
+            item, future = pending.popleft()
+            yield item, future.result()
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
 # TODO(skreft): add test
 def which(program):
     """Returns a list of paths where the program is found."""
@@ -94,59 +323,422 @@ def programs_not_in_path(programs):
     return [program for program in programs if not which(program)]
 
 
-def _open_for_write(filename):
-    """Opens filename for writing, creating the directories if needed."""
+def get_program_version(program):
+    """Returns the location and mtime of program, which change on upgrades."""
+    for location in which(program):
+        try:
+            return '%s@%s' % (location, os.path.getmtime(location))
+        except OSError:
+            pass
+    return program
+
+
+def get_config_key(name, data, repo_home, *extra):
+    """Returns a hash of the configuration of a linter or a fixer.
+
+    Besides the configuration in data, it covers the content of the files
+    the program reads its settings from: its 'config' file, the files given as
+    arguments and those listed in 'config_files' (relative to the root of the
+    repository), so a change to any of them changes the key.
+
+    Args:
+      name: string: the name of the linter or fixer.
+      data: dict: its configuration.
+      repo_home: string: the root of the repository.
+      extra: anything else the key depends on, e.g. the version of the program.
+    """
+    arguments = replace_variables(
+        data.get('arguments', []), repo_home, data.get('config'))
+    candidates = [argument.split('=')[-1] for argument in arguments]
+    if data.get('config'):
+        candidates.extend(
+            replace_variables(
+                ['{REPO_HOME_FALLBACK_DEFAULT_CONFIGS}/' + data['config']],
+                repo_home, data['config']))
+    candidates.extend(
+        os.path.join(repo_home, config_file)
+        for config_file in data.get('config_files', []))
+
+    files = {}
+    for candidate in candidates:
+        try:
+            with io.open(candidate, 'rb') as f:
+                files[candidate] = hashlib.sha1(f.read()).hexdigest()
+        except (IOError, OSError):
+            # Not a file.
+            pass
+
+    key = json.dumps([__VERSION__, name, data, list(extra), files],
+                     sort_keys=True,
+                     default=str)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _open_temporary_for_write(filename, mode='w'):
+    """Opens a new temporary file next to filename for writing.
+
+    The temporary file is meant to be renamed to filename once it is complete,
+    so that readers never see a partially written file. Its path is available
+    as the attribute name of the returned file. Its mode is the same as if it
+    had been created with open.
+    """
     dirname = os.path.dirname(filename)
     pathlib.Path(dirname).mkdir(parents=True, exist_ok=True)
+    handle, temporary_filename = tempfile.mkstemp(
+        dir=dirname, prefix='.%s.' % os.path.basename(filename))
+    os.close(handle)
+    os.chmod(temporary_filename, _FILE_MODE)
+
+    return io.open(temporary_filename, mode)
+
+
+def write_file_atomically(filename, content):
+    """Writes content to filename, so that readers never see it partial.
+
+    The content is written to a temporary file, which then replaces filename.
+    The directories are created if needed.
+
+    Args:
+      filename: string: the file to write.
+      content: bytes|string: the content, encoded as utf-8 if a string.
+    """
+    if not isinstance(content, bytes):
+        content = content.encode('utf-8')
+    with _open_temporary_for_write(filename, 'wb') as f:
+        f.write(content)
+    os.replace(f.name, filename)
+
+
+def _get_timings_dir():
+    """Returns the directory where the running times of programs are kept.
+
+    In a shared cache they are kept with it, so that all the checkouts, e.g.
+    the shards of a run, see the same ones. The name starts with a dot, so it
+    can't be taken for the directory of a program.
+    """
+    if is_cache_shared():
+        return os.path.join(get_cache_dir(), '.timings')
+    home_folder = os.path.expanduser('~')
+    return os.path.join(home_folder, '.git-lint', 'timings')
+
+
+def save_run_time_in_cache(name, filename, seconds):
+    """Saves how long it took to run the program name on filename."""
+    timing_filename = os.path.join(_get_timings_dir(), name,
+                                   _get_cache_path(filename))
+    write_file_atomically(timing_filename, '%f' % seconds)
+
+
+def get_run_time_from_cache(filename):
+    """Returns the total time the programs took to run on filename.
+
+    Args:
+      filename: string: path of the file.
+
+    Returns: the sum in seconds of the last running time of each of the
+      programs, or None if no timing was recorded for the file. Unreadable
+      times are ignored.
+    """
+    timings_dir = _get_timings_dir()
+    if not os.path.isdir(timings_dir):
+        return None
+
+    total = None
+    for name in os.listdir(timings_dir):
+        timing_filename = os.path.join(timings_dir, name,
+                                       _get_cache_path(filename))
+        try:
+            with io.open(timing_filename) as f:
+                seconds = float(f.read())
+        except (IOError, OSError, ValueError):
+            continue
+        total = (total or 0) + seconds
+    return total
+
+
+def configure_cache(cache_dir=None, repository_root=None):
+    """Sets where the output of the programs is cached.
+
+    By default the cache is in the home folder and its entries are keyed on
+    the absolute path of the file, and valid while newer than it. A cache in
+    cache_dir is meant to be shared, e.g. by CI jobs with checkouts at
+    different paths, so its entries are keyed on the path relative to
+    repository_root and on the hash of the content instead. The root of the
+    repository is also replaced in the output stored, and restored when read.
+
+    Args:
+      cache_dir: string|None: the directory of the cache, or None for the
+        default one.
+      repository_root: string|None: the root of the repository being linted.
+    """
+    _cache_state['dir'] = cache_dir
+    _cache_state['repository_root'] = repository_root
 
-    return io.open(filename, 'w')
 
+def is_cache_shared():
+    """Whether the cache is in a directory shared by several checkouts."""
+    return _cache_state['dir'] is not None
 
-def _get_cache_filename(name, filename):
-    """Returns the cache location for filename and program name."""
-    filename = os.path.abspath(filename)[1:]
+
+def _get_cache_path(filename):
+    """Returns the path of filename within each directory of the cache.
+
+    It is the absolute path, or the path relative to the repository in a
+    shared cache, so that all the checkouts use the same one.
+    """
+    filename = os.path.abspath(filename)
+    repository_root = _cache_state['repository_root']
+    if (is_cache_shared() and repository_root and
+            filename.startswith(repository_root + os.sep)):
+        return os.path.relpath(filename, repository_root)
+    return filename[1:]
+
+
+def get_cache_dir():
+    """Returns the directory where the output of the programs is cached."""
+    if _cache_state['dir'] is not None:
+        return _cache_state['dir']
     home_folder = os.path.expanduser('~')
-    base_cache_dir = os.path.join(home_folder, '.git-lint', 'cache')
+    return os.path.join(home_folder, '.git-lint', 'cache')
+
+
+def _output_to_cache(output):
+    repository_root = _cache_state['repository_root']
+    if not is_cache_shared() or not repository_root:
+        return output
+    return output.replace(repository_root + os.sep,
+                          _REPOSITORY_ROOT_MARKER + os.sep)
+
+
+def _output_from_cache(output):
+    repository_root = _cache_state['repository_root']
+    if not is_cache_shared() or not repository_root:
+        return output
+    return output.replace(_REPOSITORY_ROOT_MARKER + os.sep,
+                          repository_root + os.sep)
+
+
+def _record_cache_lookup(name, hit):
+    with _cache_lookups_lock:
+        _cache_lookups[name]['hits' if hit else 'misses'] += 1
+
+
+def pop_cache_lookups():
+    """Returns and resets the number of cache hits and misses of each program.
+
+    Returns: dict: a Counter with the keys 'hits' and 'misses' by program name.
+    """
+    with _cache_lookups_lock:
+        lookups = dict(_cache_lookups)
+        _cache_lookups.clear()
+    return lookups
+
+
+def _get_cache_filename(name, filename, content=None, regions=None,
+                        cache_key=None):
+    """Returns the cache location for filename and program name.
+
+    If content is given, the location is also keyed on its hash, so the entry
+    does not depend on the state of the file on disk. If regions is given, the
+    location is also keyed on them, as the output depends on the lines the
+    program was asked to analyse. In a shared cache (see configure_cache) the
+    location is always keyed on the content, on the path relative to the
+    repository and on cache_key, if given, as the checkouts sharing it may
+    configure or install the program differently.
+    """
+    if is_cache_shared() and content is None:
+        try:
+            with io.open(filename, 'rb') as f:
+                content = f.read()
+        except (IOError, OSError):
+            pass
+    cache_filename = os.path.join(get_cache_dir(), name,
+                                  _get_cache_path(filename))
+    if content is not None:
+        cache_filename += '@' + hashlib.sha1(content).hexdigest()
+    if regions is not None:
+        regions_string = ','.join('%d-%d' % region for region in regions)
+        cache_filename += '#' + hashlib.sha1(
+            regions_string.encode('utf-8')).hexdigest()
+    if is_cache_shared() and cache_key is not None:
+        cache_filename += '%' + cache_key
+    return cache_filename
+
 
-    return os.path.join(base_cache_dir, name, filename)
+def _encode_cache_entry(output):
+    """Returns the bytes of the cache entry with output, header included."""
+    body = output.encode('utf-8')
+    return _CACHE_HEADER % (len(body),
+                            hashlib.sha1(body).hexdigest().encode('ascii')) + body
 
 
-def get_output_from_cache(name, filename):
+def _read_cache_entry(cache_filename):
+    """Returns the output stored in cache_filename, or None if it is invalid.
+
+    An entry is invalid if it can't be read, or if its body does not match the
+    length and checksum of its header, e.g. when written by an older version.
+    """
+    try:
+        with io.open(cache_filename, 'rb') as f:
+            header = f.readline()
+            body = f.read()
+    except (IOError, OSError):
+        return None
+    match = _CACHE_HEADER_REGEX.match(header)
+    if (not match or int(match.group(1)) != len(body) or
+            hashlib.sha1(body).hexdigest() != match.group(2).decode('ascii')):
+        return None
+    return body.decode('utf-8')
+
+
+def _check_cache_entry(cache_filename):
+    """Same as _read_cache_entry, but only says whether the entry is valid.
+
+    The body is read in chunks, so it is never held in memory as a whole.
+    """
+    try:
+        with io.open(cache_filename, 'rb') as f:
+            match = _CACHE_HEADER_REGEX.match(f.readline())
+            if not match:
+                return False
+            checksum = hashlib.sha1()
+            length = 0
+            for chunk in iter(functools.partial(f.read, 1 << 16), b''):
+                checksum.update(chunk)
+                length += len(chunk)
+    except (IOError, OSError):
+        return False
+    return (int(match.group(1)) == length and
+            checksum.hexdigest() == match.group(2).decode('ascii'))
+
+
+class _CacheEntryWriter(object):
+    """Writes a cache entry incrementally, see _encode_cache_entry.
+
+    The entry is written to a temporary file, with room for the header, which
+    is only known at the end. It replaces the previous entry atomically on
+    commit, so that other threads or runs sharing the cache never see a
+    partial entry.
+    """
+
+    def __init__(self, cache_filename):
+        self.cache_filename = cache_filename
+        self._file = _open_temporary_for_write(cache_filename, 'wb')
+        self._file.write(_CACHE_HEADER % (0, b'0' * 40))
+        self._checksum = hashlib.sha1()
+        self._length = 0
+
+    def write(self, output):
+        data = output.encode('utf-8')
+        self._checksum.update(data)
+        self._length += len(data)
+        self._file.write(data)
+
+    def commit(self):
+        self._file.seek(0)
+        self._file.write(
+            _CACHE_HEADER %
+            (self._length, self._checksum.hexdigest().encode('ascii')))
+        self._file.close()
+        os.replace(self._file.name, self.cache_filename)
+
+    def discard(self):
+        self._file.close()
+        os.remove(self._file.name)
+
+
+def _is_cache_entry_current(cache_filename, filename, content):
+    return (os.path.exists(cache_filename) and
+            (content is not None or is_cache_shared() or
+             os.path.getmtime(filename) < os.path.getmtime(cache_filename)))
+
+
+def _record_cache_use(name, cache_filename, hit):
+    """Records a lookup of the cache of name.
+
+    The modification time of a hit is set to now, so it is the time of its
+    last use, which is what 'git-lint cache prune' evicts by. An entry newer
+    than the file is still newer after this.
+    """
+    if hit:
+        try:
+            os.utime(cache_filename, None)
+        except OSError:
+            pass
+    _record_cache_lookup(name, hit)
+
+
+def get_output_from_cache(name, filename, content=None, regions=None,
+                          cache_key=None):
     """Returns the output from the cache if still valid.
 
     It checks that the cache file is defined and that its modification time is
-    after the modification time of the original file.
+    after the modification time of the original file. When content is given,
+    the entry is keyed on its hash, so it is valid as long as it exists. The
+    entry must also be complete, see _read_cache_entry.
 
     Args:
       name: string: name of the program.
       filename: string: path of the filename for which we are retrieving the
         output.
+      content: bytes|None: content that was linted instead of the file on disk.
+      regions: list[tuple(int, int)]|None: the line ranges the program was
+        restricted to.
+      cache_key: string|None: the hash of the configuration and version of
+        the program, see get_config_key.
 
     Returns: a string with the output, if it is still valid, or None otherwise.
     """
-    cache_filename = _get_cache_filename(name, filename)
-    if (os.path.exists(cache_filename) and
-            os.path.getmtime(filename) < os.path.getmtime(cache_filename)):
-        with io.open(cache_filename) as f:
-            return f.read()
+    cache_filename = _get_cache_filename(name, filename, content, regions,
+                                         cache_key)
+    output = None
+    if _is_cache_entry_current(cache_filename, filename, content):
+        output = _read_cache_entry(cache_filename)
+    _record_cache_use(name, cache_filename, output is not None)
+    if output is None:
+        return None
+    return _output_from_cache(output)
+
+
+def _get_valid_cache_filename(name, filename, content=None, regions=None,
+                              cache_key=None):
+    """Returns the cache location for filename if it holds a valid entry.
 
+    See get_output_from_cache for when an entry is valid.
+    """
+    cache_filename = _get_cache_filename(name, filename, content, regions,
+                                         cache_key)
+    valid = (_is_cache_entry_current(cache_filename, filename, content) and
+             _check_cache_entry(cache_filename))
+    _record_cache_use(name, cache_filename, valid)
+    if valid:
+        return cache_filename
     return None
 
 
-def save_output_in_cache(name, filename, output):
+def save_output_in_cache(name, filename, output, content=None,
+                         regions=None, cache_key=None):
     """Saves output in the cache location.
 
     Args:
       name: string: name of the program.
       filename: string: path of the filename for which we are saving the output.
       output: string: full output (not yet filetered) of the program.
+      content: bytes|None: content that was linted instead of the file on disk.
+      regions: list[tuple(int, int)]|None: the line ranges the program was
+        restricted to.
+      cache_key: string|None: see get_output_from_cache.
     """
-    cache_filename = _get_cache_filename(name, filename)
-    with _open_for_write(cache_filename) as f:
-        f.write(output)
+    cache_filename = _get_cache_filename(name, filename, content, regions,
+                                         cache_key)
+    # Other threads or runs sharing the cache never see a partial entry.
+    write_file_atomically(cache_filename,
+                          _encode_cache_entry(_output_to_cache(output)))
 
 
-def run(name, program, arguments, cache_enabled, filename):
+def run(name, program, arguments, cache_enabled, filename,
+        stdin_arguments=None, content=None, limits=None, regions=None,
+        cache_key=None):
     """Runs a program on a file using the given arguments.
 
     Args:
@@ -155,30 +747,436 @@ def run(name, program, arguments, cache_enabled, filename):
       arguments: list[string]: extra arguments for the program.
       cache_enabled: bool: whether using cached results is enabled.
       filename: string: filename to execute the program on.
+      stdin_arguments: list[string]|None: if not None, the content is fed
+        through the standard input instead of passing the filename, and these
+        arguments are appended instead. Each of them may contain the variable
+        {filename}, which is useful to give the program a filename hint.
+      content: bytes|None: content to lint instead of the one on disk (e.g. the
+        file at a given commit). Programs not reading from stdin are given a
+        temporary copy with the same basename, and any mention of it in the
+        output is replaced by filename.
+      limits: Limits|None: limits enforced on the program. The program runs in
+        its own process group, which is killed as a whole on timeout. The
+        memory limit is only enforced on Linux.
+      regions: list[tuple(int, int)]|None: the line ranges the arguments
+        restrict the program to. They are part of the key of the cache entry.
+      cache_key: string|None: the hash of the configuration and version of the
+        program, see get_config_key. Part of the key of the entries in a
+        shared cache.
 
     Returns:
       The output from the program.
+
+    Raises:
+      LimitExceeded: if the program timed out or was killed by a signal.
+    """
+    program_run = _ProgramRun(name, program, arguments, cache_enabled,
+                              filename, stdin_arguments, content, regions,
+                              cache_key)
+    output = program_run.get_cached_output()
+    if output is not None:
+        return output
+
+    program_run.prepare()
+    try:
+        with profiler.span('run', name):
+            stdin_content = program_run.get_stdin_content()
+            program_run.start()
+            if limits is not None:
+                output = _check_output_with_limits(program_run.call_arguments,
+                                                   stdin_content, limits)
+            else:
+                output = subprocess.check_output(program_run.call_arguments,
+                                                 input=stdin_content,
+                                                 stderr=subprocess.STDOUT)
+    except subprocess.CalledProcessError as error:
+        output = error.output
+    except (IOError, OSError):
+        return program_run.execution_error()
+    finally:
+        program_run.cleanup()
+    return program_run.finish(output)
+
+
+def run_batch(name, program, arguments, filenames):
+    """Runs a program once on several files, e.g. a fixer.
+
+    Same as run, but the output is not cached, as it is for all the files.
+
+    Args:
+      name: string: the name of the program.
+      program: string: program.
+      arguments: list[string]: extra arguments for the program.
+      filenames: list[string]: the files, appended to the arguments.
+
+    Returns:
+      The output from the program, or a dict with the error of each file if it
+      could not be executed.
+    """
+    profiler.count('program_runs')
+    call_arguments = [program] + arguments + list(filenames)
+    try:
+        with profiler.span('run', name):
+            output = subprocess.check_output(call_arguments,
+                                             stderr=subprocess.STDOUT)
+    except subprocess.CalledProcessError as error:
+        output = error.output
+    except (IOError, OSError):
+        errors = {}
+        for filename in filenames:
+            errors.update(_execution_error(filename, call_arguments))
+        return errors
+    return output.decode('utf-8')
+
+
+class _ProgramRun(object):
+    """The steps of running a program on a file, besides running it.
+
+    They are shared by run and the asyncio engine, which only differ in how
+    the program is executed: the lookup and the update of the cache, the
+    arguments, the input and the decoding of the output.
+
+    Args:
+      See run.
+    """
+
+    def __init__(self, name, program, arguments, cache_enabled, filename,
+                 stdin_arguments=None, content=None, regions=None,
+                 cache_key=None):
+        self.name = name
+        self.program = program
+        self.arguments = arguments
+        self.cache_enabled = cache_enabled
+        self.filename = filename
+        self.stdin_arguments = stdin_arguments
+        self.content = content
+        self.regions = regions
+        self.cache_key = cache_key
+        self.call_arguments = None
+        self.target = None
+        self.scratch_dir = None
+        self.start_time = None
+
+    def get_cached_output(self):
+        """Returns the output from the cache, or None if it must be run."""
+        if not self.cache_enabled:
+            return None
+        with profiler.span('cache', self.name):
+            output = get_output_from_cache(self.name, self.filename,
+                                           self.content, self.regions,
+                                           self.cache_key)
+        profiler.count('cache_misses' if output is None else 'cache_hits')
+        return output
+
+    def prepare(self):
+        """Computes the call arguments, creating a scratch copy if needed."""
+        self.call_arguments, self.target, self.scratch_dir = (
+            _get_call_arguments(self.program, self.arguments, self.filename,
+                                self.stdin_arguments, self.content))
+
+    def start(self):
+        """Marks the start of the program, whose running time is cached."""
+        profiler.count('program_runs')
+        self.start_time = time.time()
+
+    def get_stdin_content(self):
+        """Returns what to feed through the standard input, if anything.
+
+        Raises:
+          IOError: if the file could not be read.
+        """
+        if self.stdin_arguments is None:
+            return None
+        if self.content is not None:
+            return self.content
+        with io.open(self.filename, 'rb') as f:
+            return f.read()
+
+    def execution_error(self):
+        """Returns the result for a program that could not be executed."""
+        return _execution_error(self.filename, self.call_arguments)
+
+    def cleanup(self):
+        """Removes the scratch copy, if any."""
+        if self.scratch_dir is not None:
+            shutil.rmtree(self.scratch_dir, True)
+
+    def finish(self, output):
+        """Decodes the output of the program and saves it in the cache.
+
+        Args:
+          output: bytes: the output of the program.
+
+        Returns: string: the output, mentioning filename instead of the
+          scratch copy.
+        """
+        output = output.decode('utf-8')
+        if self.target != self.filename:
+            output = output.replace(self.target, self.filename)
+        if self.cache_enabled:
+            with profiler.span('cache', self.name):
+                save_output_in_cache(self.name, self.filename, output,
+                                     self.content, self.regions,
+                                     self.cache_key)
+            if self.content is None:
+                save_run_time_in_cache(self.name, self.filename,
+                                       time.time() - self.start_time)
+        return output
+
+
+def _get_call_arguments(program, arguments, filename, stdin_arguments,
+                        content):
+    """Returns the command line to run program on filename.
+
+    Returns: a tuple with the command line, the path given to the program and
+      the scratch directory holding it, if content had to be written to disk.
+    """
+    if stdin_arguments is not None:
+        call_arguments = [program] + arguments + [
+            argument.format(filename=filename) for argument in stdin_arguments
+        ]
+        return call_arguments, filename, None
+
+    if content is None:
+        return [program] + arguments + [filename], filename, None
+
+    scratch_dir = tempfile.mkdtemp(prefix='gitlint')
+    target = os.path.join(scratch_dir, os.path.basename(filename))
+    with io.open(target, 'wb') as f:
+        f.write(content)
+    return [program] + arguments + [target], target, scratch_dir
+
+
+def _execution_error(filename, call_arguments):
+    return {
+        filename: {
+            'error': [('Could not execute "%s".%sMake sure all ' +
+                       'required programs are installed') %
+                      (' '.join(call_arguments), os.linesep)]
+        }
+    }
+
+
+def run_lines(name, program, arguments, cache_enabled, filename,
+              stdin_arguments=None, content=None, limits=None, regions=None,
+              cache_key=None):
+    """Runs a program on a file, streaming its output line by line.
+
+    Same as run, but the output is never held in memory as a whole, which
+    matters for programs printing hundreds of megabytes. The cache entry is
+    written while the output is read, and it only replaces the previous entry
+    once the program has finished.
+
+    Args:
+      See run.
+
+    Returns:
+      An iterator over the lines of the output, without the line separators,
+      or a dict with the error if the program could not be executed. The
+      iterator must be consumed, as the program is already running. It raises
+      LimitExceeded if the program timed out or was killed by a signal.
     """
-    output = None
     if cache_enabled:
-        output = get_output_from_cache(name, filename)
+        with profiler.span('cache', name):
+            cache_filename = _get_valid_cache_filename(
+                name, filename, content, regions, cache_key)
+        profiler.count('cache_misses'
+                       if cache_filename is None else 'cache_hits')
+        if cache_filename is not None:
+            return _read_lines(cache_filename)
 
-    if output is None:
-        call_arguments = [program] + arguments + [filename]
+    profiler.count('program_runs')
+    call_arguments, target, scratch_dir = _get_call_arguments(
+        program, arguments, filename, stdin_arguments, content)
+    stdin_content = None
+    if stdin_arguments is not None:
+        stdin_content = content
+        if stdin_content is None:
+            try:
+                with io.open(filename, 'rb') as f:
+                    stdin_content = f.read()
+            except (IOError, OSError):
+                return _execution_error(filename, call_arguments)
+
+    try:
+        process = _popen(call_arguments, stdin_content is not None, limits)
+    except (IOError, OSError):
+        if scratch_dir is not None:
+            shutil.rmtree(scratch_dir, True)
+        return _execution_error(filename, call_arguments)
+
+    cache_filename = None
+    if cache_enabled:
+        cache_filename = _get_cache_filename(name, filename, content,
+                                             regions, cache_key)
+    return _stream_output(name, process, filename, target, scratch_dir,
+                          stdin_content, cache_filename, content is None,
+                          limits)
+
+
+def _read_lines(cache_filename):
+    with io.open(cache_filename, encoding='utf-8') as f:
+        # Skips the header.
+        f.readline()
+        for line in f:
+            yield _output_from_cache(line.rstrip('\r\n'))
+
+
+def _feed(pipe, content):
+    """Writes content to pipe and closes it, ignoring closed pipes."""
+    try:
+        pipe.write(content)
+    except (IOError, OSError):
+        # The program exited without reading all of its input.
+        pass
+    finally:
         try:
-            output = subprocess.check_output(
-                call_arguments, stderr=subprocess.STDOUT)
-        except subprocess.CalledProcessError as error:
-            output = error.output
-        except OSError:
-            return {
-                filename: {
-                    'error': [('Could not execute "%s".%sMake sure all ' +
-                               'required programs are installed') %
-                              (' '.join(call_arguments), os.linesep)]
-                }
-            }
-        output = output.decode('utf-8')
-        if cache_enabled:
-            save_output_in_cache(name, filename, output)
+            pipe.close()
+        except (IOError, OSError):
+            pass
+
+
+def _stream_output(name, process, filename, target, scratch_dir,
+                   stdin_content, cache_filename, save_run_time, limits):
+    """Yields the output lines of process, saving them in the cache."""
+    start_time = time.time()
+    timer = None
+    timed_out = threading.Event()
+    if limits is not None and limits.timeout is not None:
+        timer = threading.Timer(limits.timeout, _time_out,
+                                [process, timed_out])
+        timer.daemon = True
+        timer.start()
+    feeder = None
+    if stdin_content is not None:
+        # Feeding stdin from another thread avoids a deadlock when the program
+        # fills the stdout pipe before reading all of its input.
+        feeder = threading.Thread(
+            target=_feed, args=(process.stdin, stdin_content))
+        feeder.daemon = True
+        feeder.start()
+
+    cache_file = None
+    if cache_filename is not None:
+        cache_file = _CacheEntryWriter(cache_filename)
+
+    completed = False
+    try:
+        with profiler.span('run', name):
+            for raw_line in iter(process.stdout.readline, b''):
+                line = raw_line.decode('utf-8')
+                if target != filename:
+                    line = line.replace(target, filename)
+                if cache_file is not None:
+                    cache_file.write(_output_to_cache(line))
+                yield line.rstrip('\r\n')
+            process.wait()
+        if timer is not None:
+            timer.cancel()
+        if limits is not None:
+            _check_limits(process.args, process.returncode, limits,
+                          timed_out.is_set())
+        completed = True
+    finally:
+        if timer is not None:
+            timer.cancel()
+        process.stdout.close()
+        if process.poll() is None:
+            if limits is not None:
+                _kill_process_group(process)
+            else:
+                process.kill()
+            process.wait()
+        if feeder is not None:
+            feeder.join()
+        if scratch_dir is not None:
+            shutil.rmtree(scratch_dir, True)
+        if cache_file is not None:
+            if completed:
+                cache_file.commit()
+            else:
+                cache_file.discard()
+
+    if cache_file is not None and save_run_time:
+        save_run_time_in_cache(name, filename, time.time() - start_time)
+
+
+def _popen(call_arguments, with_stdin, limits):
+    """Starts the program, enforcing limits if not None."""
+    process = subprocess.Popen(
+        call_arguments,
+        stdin=subprocess.PIPE if with_stdin else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        start_new_session=limits is not None)
+    if limits is not None:
+        _apply_limits(process.pid, limits)
+    return process
+
+
+def _apply_limits(pid, limits):
+    """Applies the limits to the started process pid.
+
+    They are applied from the parent once the program started, because running
+    code in the child between fork and exec (i.e. preexec_fn) is not safe when
+    there are threads. The program may run for a moment without them.
+    """
+    try:
+        if limits.nice:
+            os.setpriority(os.PRIO_PROCESS, pid,
+                           os.getpriority(os.PRIO_PROCESS, 0) + limits.nice)
+        if limits.max_memory and hasattr(resource, 'prlimit'):
+            max_bytes = int(limits.max_memory * 1024 * 1024)
+            resource.prlimit(pid, resource.RLIMIT_AS, (max_bytes, max_bytes))
+    except ProcessLookupError:
+        # The program already exited.
+        pass
+
+
+def _kill_process_group(process):
+    """Kills process and all of its children."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        # The process already exited.
+        pass
+
+
+def _time_out(process, timed_out):
+    timed_out.set()
+    _kill_process_group(process)
+
+
+def _check_limits(call_arguments, returncode, limits, timed_out):
+    """Raises LimitExceeded if the finished program violated its limits."""
+    program = os.path.basename(call_arguments[0])
+    if timed_out:
+        raise LimitExceeded('%s did not finish in %s seconds and was killed' %
+                            (program, limits.timeout))
+    if returncode < 0:
+        message = '%s was killed by signal %d' % (program, -returncode)
+        if limits.max_memory:
+            message += ', it may have exceeded max_memory (%s MB)' % (
+                limits.max_memory,)
+        raise LimitExceeded(message)
+
+
+def _check_output_with_limits(call_arguments, content, limits):
+    """Like subprocess.check_output given an input, but enforcing limits.
+
+    Raises:
+      LimitExceeded: if the program timed out or was killed by a signal.
+    """
+    process = _popen(call_arguments, content is not None, limits)
+    try:
+        output, _ = process.communicate(content, timeout=limits.timeout)
+    except subprocess.TimeoutExpired:
+        _kill_process_group(process)
+        process.communicate()
+        _check_limits(call_arguments, process.returncode, limits, True)
+    _check_limits(call_arguments, process.returncode, limits, False)
+    if process.returncode:
+        raise subprocess.CalledProcessError(
+            process.returncode, call_arguments, output)
     return output
+
@@ -0,0 +1,243 @@
+# Copyright 2013-2014 Sebastian Kreft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Writers that stream the results of a run as they are produced.
+
+Each result is written as soon as its file is processed and nothing is kept
+afterwards, so memory does not grow with the size of the run and consumers can
+process the results incrementally.
+"""
+
+import json
+import os.path
+import xml.sax.saxutils
+
+from gitlint.version import __VERSION__
+
+TOOL_NAME = 'git-lint'
+TOOL_URI = 'https://github.com/sk-/git-lint'
+
+
+def _quoteattr(value):
+    # Newlines would be normalized to spaces by the XML parsers.
+    return xml.sax.saxutils.quoteattr('%s' % value, {'\n': '&#10;'})
+
+
+def get_level(comment):
+    """Returns the level of a comment: 'error', 'warning' or 'note'.
+
+    Each linter has its own severities, e.g. pylint reports 'Convention' and
+    'Refactor' and others just 'E' or 'W'. Comments without severity are
+    warnings.
+    """
+    severity = comment.get('severity', '').lower()
+    if severity in ('error', 'fatal', 'e', 'f'):
+        return 'error'
+    if severity in ('', 'warning', 'warn', 'w'):
+        return 'warning'
+    return 'note'
+
+
+class Writer(object):
+    """Base class of the writers.
+
+    The result of each file is passed to write_file(filename, result, commit)
+    once it is ready, where filename is the absolute path of the file, result
+    is the dict returned by process_file and commit the commit the result
+    belongs to, if any. finish is called at the end of the run.
+
+    Args:
+      stdout: the stream to write to.
+      repository_root: string: the root of the repository being linted.
+    """
+
+    def __init__(self, stdout, repository_root):
+        self.stdout = stdout
+        self.repository_root = repository_root
+
+    def start(self):
+        """Writes whatever comes before the first result."""
+
+    def finish(self, files_with_problems, linter_not_found, exit_code):
+        """Writes whatever comes after the last result."""
+
+
+class JsonLinesWriter(Writer):
+    """Writes the results in the JSON Lines format, one object per line.
+
+    There is a record per file, with the keys of its result plus 'type' set to
+    'file', 'filename' and, when linting commits, 'commit'. The last record has
+    'type' set to 'summary' and the totals of the run.
+    """
+
+    def __init__(self, stdout, repository_root):
+        super(JsonLinesWriter, self).__init__(stdout, repository_root)
+        self.files = 0
+        self.comments = 0
+
+    def _write_record(self, record):
+        self.stdout.write(json.dumps(record, ensure_ascii=False))
+        self.stdout.write('\n')
+        self.stdout.flush()
+
+    def write_file(self, filename, result, commit=None):
+        self.files += 1
+        self.comments += len(result.get('comments', []))
+        record = {'type': 'file', 'filename': filename}
+        if commit is not None:
+            record['commit'] = commit
+        record.update(result)
+        self._write_record(record)
+
+    def finish(self, files_with_problems, linter_not_found, exit_code):
+        self._write_record({
+            'type': 'summary',
+            'files': self.files,
+            'files_with_problems': files_with_problems,
+            'comments': self.comments,
+            'linter_not_found': linter_not_found,
+            'exit_code': exit_code,
+        })
+
+
+class SarifWriter(Writer):
+    """Writes the results as a SARIF 2.1.0 log with a single run.
+
+    The log is written piece by piece: the header first, then each comment as
+    a result, with the file relative to the root of the repository, and the
+    errors of the linters as notifications at the end.
+    """
+
+    def __init__(self, stdout, repository_root):
+        super(SarifWriter, self).__init__(stdout, repository_root)
+        self._first_result = True
+        self._notifications = []
+
+    def start(self):
+        driver = {
+            'name': TOOL_NAME,
+            'version': __VERSION__,
+            'informationUri': TOOL_URI,
+        }
+        root_uri = 'file://%s/' % self.repository_root.rstrip('/')
+        self.stdout.write(
+            '{"$schema": "https://json.schemastore.org/sarif-2.1.0.json", '
+            '"version": "2.1.0", "runs": [{"tool": {"driver": %s}, '
+            '"originalUriBaseIds": {"SRCROOT": {"uri": %s}}, "results": [' %
+            (json.dumps(driver, ensure_ascii=False),
+             json.dumps(root_uri, ensure_ascii=False)))
+
+    def write_file(self, filename, result, commit=None):
+        uri = os.path.relpath(filename, self.repository_root).replace(
+            os.sep, '/')
+        for comment in result.get('comments', []):
+            # SARIF lines and columns start at 1, but some linters report 0,
+            # e.g. for the whole file.
+            region = {}
+            if comment.get('line', 0) >= 1:
+                region['startLine'] = comment['line']
+                if comment.get('column', 0) >= 1:
+                    region['startColumn'] = comment['column']
+            location = {
+                'artifactLocation': {
+                    'uri': uri,
+                    'uriBaseId': 'SRCROOT'
+                }
+            }
+            if region:
+                location['region'] = region
+            sarif_result = {
+                'level': get_level(comment),
+                'message': {
+                    'text': comment.get('message', '')
+                },
+                'locations': [{
+                    'physicalLocation': location
+                }],
+            }
+            if 'message_id' in comment:
+                sarif_result['ruleId'] = comment['message_id']
+            if commit is not None:
+                sarif_result['properties'] = {'commit': commit}
+            if not self._first_result:
+                self.stdout.write(', ')
+            self._first_result = False
+            self.stdout.write(json.dumps(sarif_result, ensure_ascii=False))
+        # The notifications go after all the results, so the errors, which
+        # are few, are kept until then.
+        for error in result.get('error', []):
+            self._notifications.append({
+                'level': 'error',
+                'message': {
+                    'text': '%s: %s' % (uri, error)
+                },
+            })
+        self.stdout.flush()
+
+    def finish(self, files_with_problems, linter_not_found, exit_code):
+        invocation = {
+            'executionSuccessful': not linter_not_found,
+            'exitCode': exit_code,
+            'toolExecutionNotifications': self._notifications,
+        }
+        self.stdout.write('], "invocations": [%s]}]}\n' %
+                          json.dumps(invocation, ensure_ascii=False))
+        self.stdout.flush()
+
+
+class CheckstyleWriter(Writer):
+    """Writes the results in the Checkstyle XML format.
+
+    Each file is written as a <file> element with one <error> per comment,
+    including the errors of the linters, which have no line.
+    """
+
+    def start(self):
+        self.stdout.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                          '<checkstyle version="4.3">\n')
+
+    def _write_error(self, attributes):
+        self.stdout.write('    <error')
+        for name, value in attributes:
+            self.stdout.write(' %s=%s' % (name, _quoteattr(value)))
+        self.stdout.write('/>\n')
+
+    def write_file(self, filename, result, commit=None):
+        self.stdout.write('  <file name=%s>\n' % _quoteattr(filename))
+        for comment in result.get('comments', []):
+            attributes = [(name, comment[name])
+                          for name in ('line', 'column')
+                          if name in comment]
+            level = get_level(comment)
+            attributes.append(('severity',
+                               'info' if level == 'note' else level))
+            attributes.append(('message', comment.get('message', '')))
+            attributes.append(
+                ('source', comment.get('message_id', TOOL_NAME)))
+            self._write_error(attributes)
+        for error in result.get('error', []):
+            self._write_error([('severity', 'error'), ('message', error),
+                               ('source', TOOL_NAME)])
+        self.stdout.write('  </file>\n')
+        self.stdout.flush()
+
+    def finish(self, files_with_problems, linter_not_found, exit_code):
+        self.stdout.write('</checkstyle>\n')
+        self.stdout.flush()
+
+
+WRITERS = {
+    'jsonl': JsonLinesWriter,
+    'sarif': SarifWriter,
+    'checkstyle': CheckstyleWriter,
+}
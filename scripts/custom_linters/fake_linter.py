@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# Copyright 2013-2014 Sebastian Kreft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Fake linter with a controlled output, latency and memory usage.
+
+It is meant for tests and benchmarks, so that they do not depend on real
+linters being installed. See fake_linter.yaml for a matching configuration.
+
+MESSAGES messages are printed, one per line starting at line 1 and wrapping
+around after LINES lines, using FORMAT. FORMAT is a python format string that
+can use the variables {filename}, {line}, {column} and {message}. If FILENAME
+is not given, the file is read from stdin and its name is taken from the
+option --stdin-filename.
+
+Usage:
+    fake_linter.py [--messages=MESSAGES] [--lines=LINES] [--format=FORMAT] [--delay=SECONDS] [--memory=MEGABYTES] [--exit-code=CODE] [--stdin-filename=NAME] [FILENAME]
+
+Options:
+    --messages=MESSAGES    Number of messages to print. Default is 10.
+    --lines=LINES          Number of lines over which the messages are spread, at
+                           least 1. Default is MESSAGES.
+    --format=FORMAT        Format of each message.
+                           Default is '{filename}:{line}:{column}: {message}'.
+    --delay=SECONDS        Seconds to sleep before printing. Default is 0.
+    --memory=MEGABYTES     Megabytes to allocate before printing. Default is 0.
+    --exit-code=CODE       Exit status. Default is 1 if there are messages, 0
+                           otherwise, like most linters.
+    --stdin-filename=NAME  Name of the file read from stdin. Default is '-'.
+"""
+
+import sys
+import time
+
+import docopt
+
+DEFAULT_FORMAT = '{filename}:{line}:{column}: {message}'
+
+
+def lint(arguments):
+    """Prints the fake messages, returning the exit status."""
+    messages = int(arguments['--messages'] or 10)
+    lines = int(arguments['--lines'] or messages or 1)
+    if lines < 1:
+        raise ValueError('--lines must be a positive integer, got: %s' %
+                         arguments['--lines'])
+    output_format = arguments['--format'] or DEFAULT_FORMAT
+    filename = arguments['FILENAME']
+    if filename is None:
+        sys.stdin.read()
+        filename = arguments['--stdin-filename'] or '-'
+
+    # Touch every page, so that the memory is actually used.
+    memory = bytearray(int(float(arguments['--memory'] or 0) * 1024 * 1024))
+    for index in range(0, len(memory), 4096):
+        memory[index] = 1
+
+    time.sleep(float(arguments['--delay'] or 0))
+
+    for index in range(messages):
+        print(output_format.format(
+            filename=filename,
+            line=index % lines + 1,
+            column=index // lines + 1,
+            message='fake message %d' % (index + 1)))
+
+    if arguments['--exit-code'] is not None:
+        return int(arguments['--exit-code'])
+    return 1 if messages else 0
+
+
+if __name__ == '__main__':
+    sys.exit(lint(docopt.docopt(__doc__)))
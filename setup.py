@@ -43,6 +43,7 @@ setup(
         'scripts/git-lint',
         'scripts/pre-commit.git-lint.sh',
         'scripts/pre-commit.hg-lint.sh',
+        'scripts/custom_linters/fake_linter.py',
         'scripts/custom_linters/ini_linter.py',
         'scripts/custom_linters/jpegtran-linter.sh',
         'scripts/custom_linters/optipng-linter.sh',
@@ -52,7 +53,6 @@ setup(
     install_requires=[
         'docopt',
         'pyyaml',
-        'pathlib2',
         'termcolor',
         'yapf',
         'isort',
@@ -62,8 +62,8 @@ setup(
     ],
     tests_require=TEST_REQUIRES,
     setup_requires=['nose>=1.3'],
+    python_requires='>=3.7',
     extras_require={
-        ':python_version == "2.7"': ['futures'],
         'test': TEST_REQUIRES,
         'dev': ['pycodestyle', 'pylint', 'yapf'],
     },
@@ -73,12 +73,10 @@ setup(
         'Intended Audience :: Developers',
         'License :: OSI Approved :: Apache Software License',
         'Operating System :: Unix',
-        'Programming Language :: Python :: 2',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
         'Topic :: Software Development :: Version Control',
     ],
 )
@@ -0,0 +1,307 @@
+# Copyright 2013-2014 Sebastian Kreft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Benchmarks git-lint on a synthetic repository.
+
+A git or mercurial repository is created in a temporary directory with FILES
+python files of LINES lines each, with the history spread over COMMITS commits.
+Then LINES_MODIFIED lines of every file are modified in the working copy, and
+git-lint is run on them with --mode=local, using the fake linter of
+scripts/custom_linters, which sleeps LATENCY seconds, allocates MEMORY
+megabytes and reports MESSAGES problems per file.
+
+For each of the values of JOBS, git-lint is run REPEAT times and the best and
+median end to end times are reported, together with the time spent per phase,
+as recorded by --profile and summed over the worker threads.
+
+Usage:
+    benchmark.py [--vcs=VCS] [--files=FILES] [--lines=LINES] [--commits=COMMITS] [--modified-lines=LINES_MODIFIED] [--messages=MESSAGES] [--latency=LATENCY] [--memory=MEMORY] [--jobs=JOBS] [--engine=ENGINE] [--repeat=REPEAT] [--cache] [--output=FILE] [--baseline=FILE]
+    benchmark.py -h
+
+Options:
+    -h                              Show the usage patterns.
+    --vcs=VCS                       [git, hg] The repository type. Default is git.
+    --files=FILES                   Number of files in the repository. Default is 100.
+    --lines=LINES                   Number of lines of each file. Default is 200.
+    --commits=COMMITS               Number of commits in the history. Default is 10.
+    --modified-lines=LINES_MODIFIED Number of modified lines in each file. Default is 10.
+    --messages=MESSAGES             Number of problems reported by the fake linter for each
+                                    file. Default is 50.
+    --latency=LATENCY               Seconds the fake linter sleeps on each file. Default is 0.05.
+    --memory=MEMORY                 Megabytes the fake linter allocates on each file. Default
+                                    is 0.
+    --jobs=JOBS                     Comma separated list of worker counts to measure. Default
+                                    is 1,2,4,8.
+    --engine=ENGINE                 [threads, asyncio] The engine git-lint uses. Default is
+                                    threads.
+    --repeat=REPEAT                 Number of runs for each worker count. Default is 3.
+    --cache                         Do not pass --no-cache to git-lint, so that all but the
+                                    first run hit the cache.
+    --output=FILE                   Writes the results as json to FILE.
+    --baseline=FILE                 Compares the results with those of a previous --output.
+
+Example:
+    python -m test.benchmark.benchmark --files=200 --jobs=1,4
+"""
+
+from __future__ import print_function, unicode_literals
+
+import collections
+import io
+import json
+import os
+import os.path
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import docopt
+
+import gitlint
+import gitlint.profiler as profiler
+
+FAKE_LINTER = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir,
+    'scripts', 'custom_linters', 'fake_linter.py')
+
+CONFIG = r'''
+linters:
+  fake-linter:
+    extensions:
+      - .py
+    command: %(command)s
+    arguments:
+      - %(fake_linter)s
+      - --messages=%(messages)d
+      - --lines=%(lines)d
+      - --delay=%(latency)r
+      - --memory=%(memory)r
+    filter: >-
+      ^{filename}:(?P<line>{lines}):(?P<column>\d+): (?P<message>.*)$
+    installation: Nothing to install.
+'''
+
+
+def execute(*args, **kwargs):
+    """Executes a command and prints the output in case of error."""
+    kwargs['stderr'] = subprocess.STDOUT
+    try:
+        subprocess.check_output(*args, **kwargs)
+    except subprocess.CalledProcessError as error:
+        print(error.output)
+        raise
+
+
+def _environment():
+    # NO_VERIFY=1 is required as a pre-commit hook could be installed.
+    environ = dict(os.environ)
+    environ['NO_VERIFY'] = '1'
+    environ['GIT_AUTHOR_NAME'] = environ['GIT_COMMITTER_NAME'] = 'benchmark'
+    environ['GIT_AUTHOR_EMAIL'] = environ['GIT_COMMITTER_EMAIL'] = 'benchmark'
+    return environ
+
+
+def init_repo(vcs):
+    """Initializes a repository in the current directory."""
+    execute([vcs, 'init'])
+
+
+def commit(vcs, message):
+    """Commits all the changes of the working copy."""
+    if vcs == 'git':
+        execute(['git', 'add', '--all'])
+        execute(['git', 'commit', '-m', message, '--no-verify'],
+                env=_environment())
+    else:
+        execute(['hg', 'commit', '--addremove', '-u', 'benchmark', '-m',
+                 message],
+                env=_environment())
+
+
+def write_file(filename, lines):
+    with io.open(filename, 'w', encoding='utf-8') as f:
+        f.write(''.join('%s\n' % line for line in lines))
+
+
+def modify_lines(filename, count, tag):
+    """Rewrites count lines of filename, evenly spread over the file."""
+    with io.open(filename, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    step = max(1, len(lines) // max(1, count))
+    for index in range(0, min(count * step, len(lines)), step):
+        lines[index] = 'value_%d = %r' % (index, tag)
+    write_file(filename, lines)
+
+
+def create_repo(directory, arguments):
+    """Creates the synthetic repository in directory.
+
+    Returns: the path of the repository.
+    """
+    repo = os.path.join(directory, 'repo')
+    os.mkdir(repo)
+    os.chdir(repo)
+    init_repo(arguments['vcs'])
+    with io.open('.gitlint.yaml', 'w', encoding='utf-8') as f:
+        f.write(CONFIG % {
+            'command': sys.executable,
+            'fake_linter': os.path.abspath(FAKE_LINTER),
+            'messages': arguments['messages'],
+            'lines': arguments['lines'],
+            'latency': arguments['latency'],
+            'memory': arguments['memory'],
+        })
+
+    filenames = [
+        os.path.join('src', 'package%d' % (i % 10), 'module%d.py' % i)
+        for i in range(arguments['files'])
+    ]
+    for filename in filenames:
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        write_file(filename, ['value_%d = 0' % line
+                              for line in range(arguments['lines'])])
+    commit(arguments['vcs'], 'Initial commit')
+
+    # The rest of the history modifies a slice of the files in each commit.
+    for number in range(1, arguments['commits']):
+        for filename in filenames[number::arguments['commits']]:
+            modify_lines(filename, arguments['modified_lines'],
+                         'commit %d' % number)
+        commit(arguments['vcs'], 'Commit %d' % number)
+
+    for filename in filenames:
+        modify_lines(filename, arguments['modified_lines'], 'local')
+
+    return repo
+
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def run_gitlint(jobs, cache, engine):
+    """Runs git-lint in the current directory.
+
+    Returns: a tuple with the wall time and the seconds spent on each phase.
+    """
+    argv = ['git-lint', '--mode=local', '--json', '--profile',
+            '--jobs=%d' % jobs, '--engine=%s' % engine]
+    if not cache:
+        argv.append('--no-cache')
+
+    start = time.time()
+    gitlint.main(argv, stdout=io.StringIO(), stderr=io.StringIO())
+    elapsed = time.time() - start
+
+    phases = collections.defaultdict(float)
+    for span in profiler.get_spans():
+        phases[span.category] += span.duration
+    return elapsed, dict(phases)
+
+
+def benchmark(jobs_list, repeat, cache, engine):
+    """Runs git-lint repeat times for each worker count.
+
+    Returns: dict: a mapping from the worker count to its results.
+    """
+    results = {}
+    for jobs in jobs_list:
+        runs = [run_gitlint(jobs, cache, engine) for _ in range(repeat)]
+        times = [elapsed for elapsed, _ in runs]
+        best_phases = min(runs, key=lambda run: run[0])[1]
+        results[str(jobs)] = {
+            'best': min(times),
+            'median': _median(times),
+            'phases': best_phases,
+        }
+    return results
+
+
+def format_results(results, baseline=None):
+    """Returns the lines of the report of the benchmark."""
+    lines = []
+    sequential = results.get('1', {}).get('best')
+    for jobs in sorted(results, key=int):
+        result = results[jobs]
+        line = 'jobs=%s: best %.3fs, median %.3fs' % (jobs, result['best'],
+                                                     result['median'])
+        if sequential:
+            line += ', speedup %.2fx' % (sequential / result['best'])
+        if baseline and jobs in baseline:
+            line += ', %+.1f%% vs baseline' % (
+                100.0 * (result['best'] - baseline[jobs]['best']) /
+                baseline[jobs]['best'])
+        lines.append(line)
+        for phase, seconds in sorted(
+                result['phases'].items(), key=lambda item: -item[1]):
+            lines.append('    %s: %.3fs' % (phase, seconds))
+    return lines
+
+
+def main(argv):
+    """Creates the repository, runs the benchmark and prints the results."""
+    options = docopt.docopt(__doc__, argv=argv[1:])
+    arguments = {
+        'vcs': options['--vcs'] or 'git',
+        'files': int(options['--files'] or 100),
+        'lines': int(options['--lines'] or 200),
+        'commits': max(1, int(options['--commits'] or 10)),
+        'modified_lines': int(options['--modified-lines'] or 10),
+        'messages': int(options['--messages'] or 50),
+        'latency': float(options['--latency'] or 0.05),
+        'memory': float(options['--memory'] or 0),
+    }
+    if arguments['vcs'] not in ('git', 'hg'):
+        raise ValueError('Invalid vcs %s. Valid ones are: git, hg.' %
+                         arguments['vcs'])
+    jobs_list = [int(jobs) for jobs in (options['--jobs'] or '1,2,4,8').split(',')]
+    repeat = int(options['--repeat'] or 3)
+
+    original_cwd = os.getcwd()
+    directory = tempfile.mkdtemp(prefix='gitlint-benchmark')
+    try:
+        start = time.time()
+        create_repo(directory, arguments)
+        print('Created %s repository with %d files and %d commits in %.1fs' %
+              (arguments['vcs'], arguments['files'], arguments['commits'],
+               time.time() - start))
+        results = benchmark(jobs_list, repeat, options['--cache'],
+                            options['--engine'] or 'threads')
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(directory, True)
+
+    baseline = None
+    if options['--baseline']:
+        with io.open(options['--baseline'], encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+
+    print('\n'.join(format_results(results, baseline)))
+
+    if options['--output']:
+        with io.open(options['--output'], 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'parameters': arguments, 'results': results},
+                               ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,116 @@
+# Copyright 2013-2014 Sebastian Kreft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import functools
+import os
+import sys
+import unittest
+from concurrent import futures
+
+import mock
+
+import gitlint.asyncio_engine as asyncio_engine
+import gitlint.linters as linters
+import gitlint.utils as utils
+
+# pylint: disable=too-many-public-methods
+
+FAKE_LINTER = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir,
+    'scripts', 'custom_linters', 'fake_linter.py')
+
+FILTER = r'^{filename}:(?P<line>{lines}):(?P<column>\d+): (?P<message>.*)$'
+
+
+class AsyncioEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.executor = futures.ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(self.executor.shutdown)
+        self.engine = asyncio_engine.Engine(self.executor, 2)
+
+    def run_all(self, function, items):
+        return [result for _, result in self.engine.map(function, items)]
+
+    def test_map_keeps_order(self):
+        async def identity(item):
+            return item
+
+        self.assertEqual(list(range(20)), self.run_all(identity, range(20)))
+
+    def test_lint(self):
+        config = {
+            '.py': [
+                utils.Partial(linters.lint_command, 'fake', sys.executable,
+                              [FAKE_LINTER, '--messages=4'], FILTER, False),
+                utils.Partial(
+                    linters.lint_command,
+                    'fake-stdin',
+                    sys.executable, [FAKE_LINTER, '--messages=4'],
+                    FILTER,
+                    False,
+                    stdin_arguments=['--stdin-filename={filename}']),
+                utils.Partial(
+                    linters.lint_command,
+                    'fake-stream',
+                    sys.executable, [FAKE_LINTER, '--messages=4'],
+                    FILTER,
+                    False,
+                    stream=True),
+            ]
+        }
+        filenames = ['/repo/foo.py', '/repo/bar.txt']
+        expected = [
+            linters.lint(filename, [2, 3], config, content=b'import os')
+            for filename in filenames
+        ]
+
+        async def lint(filename):
+            return await self.engine.lint(
+                filename, [2, 3], config, content=b'import os')
+
+        self.assertEqual(expected, self.run_all(lint, filenames))
+        self.assertEqual(6, len(expected[0]['/repo/foo.py']['comments']))
+
+    def test_lint_command_timeout(self):
+        lint = functools.partial(
+            self.engine.lint_command,
+            'fake',
+            sys.executable, [FAKE_LINTER, '--delay=30'],
+            FILTER,
+            False,
+            lines=None,
+            limits=utils.Limits(0.5, None, None))
+        result = self.run_all(lint, ['/repo/foo.py'])[0]
+        self.assertIn('did not finish in 0.5 seconds',
+                      result['/repo/foo.py']['error'][0])
+
+    def test_lint_command_program_not_found(self):
+        lint = functools.partial(self.engine.lint_command, 'fake',
+                                 '/does/not/exist', [], FILTER, False,
+                                 lines=None)
+        result = self.run_all(lint, ['/repo/foo.py'])[0]
+        self.assertIn('Could not execute', result['/repo/foo.py']['error'][0])
+
+    def test_run_time_excludes_waiting(self):
+        engine = asyncio_engine.Engine(self.executor, 1)
+        run = functools.partial(engine.run, 'fake', sys.executable,
+                                [FAKE_LINTER, '--delay=0.5'], True)
+        with mock.patch('gitlint.utils.get_output_from_cache',
+                        return_value=None), \
+                mock.patch('gitlint.utils.save_output_in_cache'), \
+                mock.patch('gitlint.utils.save_run_time_in_cache') as save:
+            list(engine.map(run, ['/repo/foo.py', '/repo/bar.py']))
+        # With one job, the second program waits for the first one to end.
+        self.assertEqual(2, save.call_count)
+        for call in save.call_args_list:
+            self.assertLess(call[0][2], 0.9)
@@ -0,0 +1,178 @@
+# Copyright 2013-2014 Sebastian Kreft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import io
+import os
+
+import mock
+from pyfakefs import fake_filesystem_unittest
+
+import gitlint.cache as cache
+import gitlint.utils as utils
+
+# pylint: disable=too-many-public-methods
+
+
+class CacheTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.home = '/home/user'
+        expanduser_patch = mock.patch(
+            'os.path.expanduser', return_value=self.home)
+        expanduser_patch.start()
+        self.addCleanup(expanduser_patch.stop)
+
+    def create_entry(self, name, filename, size, mtime):
+        cache_filename = os.path.join(utils.get_cache_dir(), name, filename)
+        os.makedirs(os.path.dirname(cache_filename), exist_ok=True)
+        with io.open(cache_filename, 'w') as f:
+            f.write('x' * size)
+        os.utime(cache_filename, (mtime, mtime))
+        return cache_filename
+
+    def test_parse_size(self):
+        self.assertEqual(10, cache.parse_size('10'))
+        self.assertEqual(1536, cache.parse_size('1.5K'))
+        self.assertEqual(500 * 1024 * 1024, cache.parse_size('500MB'))
+        self.assertEqual(2 * 1024**3, cache.parse_size('2g'))
+        with self.assertRaises(ValueError):
+            cache.parse_size('10T')
+
+    def test_format_size(self):
+        self.assertEqual('10 B', cache.format_size(10))
+        self.assertEqual('1.5 KB', cache.format_size(1536))
+        self.assertEqual('2.0 GB', cache.format_size(2 * 1024**3))
+
+    def test_lookups(self):
+        self.assertEqual({}, cache.load_lookups())
+        cache.save_lookups({'pylint': {'hits': 1, 'misses': 2}})
+        cache.save_lookups({
+            'pylint': {
+                'hits': 3
+            },
+            'json': {
+                'misses': 1
+            }
+        })
+        self.assertEqual(
+            {
+                'pylint': {
+                    'hits': 4,
+                    'misses': 2
+                },
+                'json': {
+                    'hits': 0,
+                    'misses': 1
+                }
+            }, cache.load_lookups())
+
+    def test_get_stats(self):
+        self.create_entry('pylint', 'repo/a.py', 10, 100)
+        self.create_entry('pylint', 'repo/b.py', 5, 100)
+        self.create_entry('json', 'repo/c.json', 1, 100)
+        cache.save_lookups({'pylint': {'hits': 3, 'misses': 1}})
+
+        stats = cache.get_stats()
+        self.assertEqual({
+            'pylint': {
+                'entries': 2,
+                'size': 15,
+                'hits': 3,
+                'misses': 1
+            },
+            'json': {
+                'entries': 1,
+                'size': 1,
+                'hits': 0,
+                'misses': 0
+            },
+        }, stats)
+        lines = cache.format_stats(stats)
+        self.assertEqual(4, len(lines))
+        self.assertIn('75.0%', lines[2])
+        self.assertTrue(lines[3].startswith('Total'))
+
+    def test_get_stats_shared_timings(self):
+        utils.configure_cache(os.path.join(self.home, 'shared'), '/repo')
+        self.addCleanup(utils.configure_cache)
+        self.create_entry('pylint', 'a.py', 10, 100)
+        self.create_entry('.timings', 'pylint/a.py', 1, 100)
+        stats = cache.get_stats()
+        self.assertEqual(['(timings)', 'pylint'], sorted(stats))
+        self.assertEqual(1, stats['(timings)']['size'])
+
+    def test_get_stats_no_cache(self):
+        self.assertEqual({}, cache.get_stats())
+
+    def test_prune_max_age(self):
+        old = self.create_entry('pylint', 'repo/a.py', 10, 100)
+        new = self.create_entry('pylint', 'repo/b.py', 10, 1000)
+
+        self.assertEqual((1, 10), cache.prune(max_age=500, now=1100))
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(new))
+
+    def test_prune_max_size(self):
+        oldest = self.create_entry('pylint', 'repo/a.py', 10, 100)
+        older = self.create_entry('json', 'repo/b.json', 10, 200)
+        newest = self.create_entry('pylint', 'repo/c.py', 10, 300)
+
+        self.assertEqual((2, 20), cache.prune(max_size=15))
+        self.assertFalse(os.path.exists(oldest))
+        self.assertFalse(os.path.exists(older))
+        self.assertTrue(os.path.exists(newest))
+        self.assertFalse(
+            os.path.exists(os.path.join(utils.get_cache_dir(), 'json')))
+
+    def test_prune_state(self):
+        home = os.path.join(self.home, '.git-lint')
+        entries = {}
+        for name, filename, mtime in (('fixed', 'isort/key', 100),
+                                      ('manifests', 'repo/merge-base.json', 200),
+                                      ('timings', 'pylint/repo/a.py', 300)):
+            entries[name] = os.path.join(home, name, filename)
+            os.makedirs(os.path.dirname(entries[name]))
+            with io.open(entries[name], 'w') as f:
+                f.write('x' * 10)
+            os.utime(entries[name], (mtime, mtime))
+        linter_entry = self.create_entry('pylint', 'repo/a.py', 10, 400)
+
+        self.assertEqual({
+            '(fixed points)': 1,
+            '(manifests)': 1,
+            '(timings)': 1,
+            'pylint': 1
+        }, {name: data['entries']
+            for name, data in cache.get_stats().items()})
+        self.assertEqual((2, 20), cache.prune(max_size=25))
+        self.assertFalse(os.path.exists(entries['fixed']))
+        self.assertFalse(os.path.exists(entries['manifests']))
+        self.assertTrue(os.path.exists(entries['timings']))
+        self.assertTrue(os.path.exists(linter_entry))
+        self.assertFalse(os.path.exists(os.path.join(home, 'fixed', 'isort')))
+
+    def test_prune_nothing(self):
+        entry = self.create_entry('pylint', 'repo/a.py', 10, 100)
+        self.assertEqual((0, 0), cache.prune(max_size=100, max_age=500,
+                                             now=200))
+        self.assertTrue(os.path.exists(entry))
+
+    def test_warm(self):
+        with mock.patch('gitlint.linters.lint') as lint:
+            self.assertEqual(2, cache.warm(['/repo/a.py', '/repo/b.py'],
+                                           {'.py': []}, 2))
+        lint.assert_has_calls([
+            mock.call('/repo/a.py', None, {'.py': []}),
+            mock.call('/repo/b.py', None, {'.py': []}),
+        ],
+                              any_order=True)
@@ -0,0 +1,358 @@
+# Copyright 2013-2014 Sebastian Kreft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent import futures
+
+import mock
+from pyfakefs import fake_filesystem_unittest
+
+import gitlint.fixers as fixers
+import gitlint.utils as utils
+from gitlint.lineset import LineSet
+
+# pylint: disable=too-many-public-methods
+
+
+def _upper_fixer(filename, lines):
+    """Uppercases the given lines, or all of them if lines is None."""
+    with io.open(filename, 'rb') as f:
+        content = f.read().splitlines(True)
+    for index, line in enumerate(content):
+        if lines is None or index + 1 in lines:
+            content[index] = line.upper()
+    with io.open(filename, 'wb') as f:
+        f.write(b''.join(content))
+
+
+class FixersTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.fs.create_file('/repo/foo.py', contents='a\nb\nc\nd\n')
+        self.fs.create_file('/repo/bar.py', contents='a\nb\n')
+        self.executor = futures.ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(self.executor.shutdown)
+
+    def test_fix_files_remaps_lines(self):
+        fixer = mock.Mock(side_effect=_upper_fixer)
+        lines = LineSet.from_lines([2])
+        self.assertEqual({
+            '/repo/foo.py': LineSet.from_lines([2]),
+            '/repo/bar.py': None,
+        },
+                         fixers.fix_files([('/repo/foo.py', lines),
+                                           ('/repo/bar.py', None)],
+                                          {'.py': [fixer]}, self.executor))
+        self.assertEqual([
+            mock.call('/repo/foo.py', lines),
+            mock.call('/repo/bar.py', None)
+        ], fixer.call_args_list)
+        with open('/repo/foo.py') as f:
+            self.assertEqual('a\nB\nc\nd\n', f.read())
+
+    def test_fix_files_fix_all(self):
+        fixer = mock.Mock(side_effect=_upper_fixer)
+        self.assertEqual({
+            '/repo/foo.py': LineSet([(1, 4)])
+        },
+                         fixers.fix_files(
+                             [('/repo/foo.py', LineSet.from_lines([2]))],
+                             {'.py': [fixer]},
+                             self.executor,
+                             fix_all=True))
+        fixer.assert_called_once_with('/repo/foo.py', None)
+
+    def test_fix_files_unchanged(self):
+        lines = LineSet.from_lines([2])
+        self.assertIs(
+            lines,
+            fixers.fix_files([('/repo/foo.py', lines)],
+                             {'.py': [mock.Mock()]},
+                             self.executor)['/repo/foo.py'])
+
+    def test_fix_files_batches(self):
+        isort = self._command_fixer('isort', [], [])
+        yapf = self._command_fixer(
+            'yapf', ['-i'], ['--lines={MODIFIED_LINES_RANGE_REPEATED_ARG}'])
+        with mock.patch('subprocess.check_output') as check_output, \
+                mock.patch('gitlint.utils.run') as run:
+            fixers.fix_files([('/repo/foo.py', LineSet.from_lines([2, 3])),
+                              ('/repo/bar.py', None)],
+                             {'.py': [isort, yapf]}, self.executor)
+        # isort gets all the files at once, as does yapf for the new file.
+        self.assertEqual([
+            mock.call(['isort', '/repo/foo.py', '/repo/bar.py'],
+                      stderr=subprocess.STDOUT),
+            mock.call(['yapf', '-i', '/repo/bar.py'],
+                      stderr=subprocess.STDOUT),
+        ], check_output.call_args_list)
+        run.assert_called_once_with('yapf', 'yapf', ['-i', '--lines=2-3'],
+                                    False, '/repo/foo.py')
+
+    def test_fix_files_batch_size(self):
+        isort = self._command_fixer('isort', [], [])
+        files_lines = [('/repo/file%d.py' % i, None) for i in range(5)]
+        with mock.patch('subprocess.check_output') as check_output, \
+                mock.patch('gitlint.fixers.MAX_FILES_PER_BATCH', 2):
+            fixers.fix_files(files_lines, {'.py': [isort]}, self.executor)
+        self.assertEqual(
+            [['isort', '/repo/file0.py', '/repo/file1.py'],
+             ['isort', '/repo/file2.py', '/repo/file3.py'],
+             ['isort', '/repo/file4.py']],
+            sorted(call[0][0] for call in check_output.call_args_list))
+
+    def test_parse_yaml_config_in_process(self):
+        yaml_config = {
+            'isort': {
+                'extensions': ['.py'],
+                'command': 'isort',
+                'in_process': {
+                    'module': 'isort'
+                },
+                'installation': 'install',
+            },
+            'yapf': {
+                'extensions': ['.py'],
+                'command': 'yapf',
+                'arguments': ['--in-place'],
+                'in_process': {
+                    'module': 'yapf',
+                    'style': '{REPO_HOME}/style.yapf'
+                },
+                'installation': 'install',
+            },
+        }
+        with mock.patch('gitlint.utils.which', return_value=[]):
+            config = fixers.parse_yaml_config(yaml_config, '/repo', 2)
+        self.assertEqual([
+            utils.Partial(fixers.isort_fix, 'isort', 2),
+            utils.Partial(fixers.yapf_fix, 'yapf', '/repo/style.yapf', 2),
+        ], [fixer.function for fixer in config['.py']])
+        self.assertEqual(['isort', 'yapf'],
+                         [fixer.name for fixer in config['.py']])
+        self.assertEqual([False, True],
+                         [fixer.uses_lines for fixer in config['.py']])
+
+    def test_parse_yaml_config_in_process_fallback(self):
+        yaml_config = {
+            'yapf': {
+                'extensions': ['.py'],
+                'command': 'yapf',
+                'arguments': ['--in-place'],
+                'in_process': {
+                    'module': 'yapf'
+                },
+                'installation': 'install',
+            },
+        }
+        with mock.patch('gitlint.fixers.yapf_api', None), \
+                mock.patch('gitlint.utils.which', return_value=['yapf']):
+            config = fixers.parse_yaml_config(yaml_config, '/repo', None)
+        self.assertEqual([
+            utils.Partial(fixers.fix_command, 'yapf', 'yapf', ['--in-place'],
+                          [], None)
+        ], [fixer.function for fixer in config['.py']])
+        self.assertEqual([], config['.py'][0].dynamic_arguments)
+        self.assertFalse(config['.py'][0].uses_lines)
+
+    def test_yapf_fix(self):
+        with mock.patch('gitlint.fixers.yapf_api') as yapf_api:
+            fixers.yapf_fix('yapf', '/repo/style.yapf', 1, '/repo/foo.py',
+                            LineSet.from_lines([3, 10]))
+            fixers.yapf_fix('yapf', None, 1, '/repo/foo.py', None)
+            yapf_api.FormatFile.side_effect = fixers.yapf_errors.YapfError(
+                'syntax error')
+            fixers.yapf_fix('yapf', None, 1, '/repo/foo.py', None)
+        self.assertEqual([
+            mock.call(
+                '/repo/foo.py',
+                style_config='/repo/style.yapf',
+                lines=[(2, 4), (9, 11)],
+                in_place=True),
+            mock.call(
+                '/repo/foo.py', style_config=None, lines=None, in_place=True),
+            mock.call(
+                '/repo/foo.py', style_config=None, lines=None, in_place=True),
+        ], yapf_api.FormatFile.call_args_list)
+
+    def test_yapf_fix_unexpected_error(self):
+        with mock.patch('gitlint.fixers.yapf_api') as yapf_api:
+            yapf_api.FormatFile.side_effect = ValueError('bug')
+            with self.assertRaises(ValueError):
+                fixers.yapf_fix('yapf', None, 1, '/repo/foo.py', None)
+
+    def test_isort_fix(self):
+        fixers._get_isort_config.cache_clear()
+        self.addCleanup(fixers._get_isort_config.cache_clear)
+        with mock.patch('gitlint.fixers.isort') as isort:
+            isort.file.side_effect = (
+                fixers.isort_exceptions.ExistingSyntaxErrors('/repo/foo.py'))
+            fixers.isort_fix('isort', None, '/repo/foo.py',
+                             LineSet.from_lines([3]))
+        isort.file.assert_called_once_with(
+            '/repo/foo.py', config=isort.Config.return_value)
+
+    def test_isort_fix_unexpected_error(self):
+        fixers._get_isort_config.cache_clear()
+        self.addCleanup(fixers._get_isort_config.cache_clear)
+        with mock.patch('gitlint.fixers.isort') as isort:
+            isort.file.side_effect = ValueError('bug')
+            with self.assertRaises(ValueError):
+                fixers.isort_fix('isort', None, '/repo/foo.py', None)
+
+    def test_isort_fix_is_quiet(self):
+        fixers._get_isort_config.cache_clear()
+        self.addCleanup(fixers._get_isort_config.cache_clear)
+        # isort replaces the file in ways pyfakefs does not support.
+        self.pause()
+        self.addCleanup(self.resume)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'imports.py')
+        with io.open(filename, 'w') as f:
+            f.write(u'import sys\nimport os\n')
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            fixers.isort_fix('isort', None, filename, None)
+        self.assertEqual('', stdout.getvalue())
+        with io.open(filename) as f:
+            self.assertEqual('import os\nimport sys\n', f.read())
+
+    @staticmethod
+    def _command_fixer(name, arguments, dynamic_arguments):
+        return fixers.Fixer(
+            name,
+            utils.Partial(fixers.fix_command, name, name, arguments,
+                          dynamic_arguments, None), dynamic_arguments, None,
+            bool(dynamic_arguments), [])
+
+    @staticmethod
+    def _cached_fixer(side_effect):
+        return fixers.Fixer(
+            'fixer',
+            utils.Partial(mock.Mock(side_effect=side_effect), 'fixer'), [],
+            'key', True, [])
+
+    def test_fix_files_skips_fixed_points(self):
+        calls = []
+
+        def fixer_function(name, filename, lines):
+            calls.append((filename, lines))
+            if filename == '/repo/bar.py':
+                _upper_fixer(filename, lines)
+
+        fixer = self._cached_fixer(fixer_function)
+        files_lines = [('/repo/foo.py', LineSet.from_lines([2])),
+                       ('/repo/bar.py', None)]
+        fixed_points = set()
+        with mock.patch('gitlint.fixers.is_fixed_point',
+                        side_effect=lambda _, key: key in fixed_points), \
+                mock.patch('gitlint.fixers.save_fixed_point',
+                           side_effect=lambda _, key: fixed_points.add(key)):
+            for _ in range(2):
+                fixers.fix_files(files_lines, {'.py': [fixer]},
+                                 self.executor,
+                                 cache_enabled=True)
+            # Other lines are a different key.
+            fixers.fix_files([('/repo/foo.py', LineSet.from_lines([3]))],
+                             {'.py': [fixer]},
+                             self.executor,
+                             cache_enabled=True)
+        # foo.py was left unchanged, so it is not fixed again, while bar.py
+        # changed the first time and was checked once more.
+        self.assertEqual([('/repo/foo.py', LineSet.from_lines([2])),
+                          ('/repo/bar.py', None),
+                          ('/repo/bar.py', None),
+                          ('/repo/foo.py', LineSet.from_lines([3]))],
+                         sorted(calls[:2], reverse=True) +
+                         calls[2:])
+
+    def test_fix_files_without_cache(self):
+        fixer = self._cached_fixer(None)
+        with mock.patch('gitlint.fixers.save_fixed_point') as save:
+            for _ in range(2):
+                fixers.fix_files([('/repo/foo.py', None)], {'.py': [fixer]},
+                                 self.executor)
+        self.assertEqual(2, fixer.function.func.call_count)
+        save.assert_not_called()
+
+    def test_fix_files_keeps_mtime_if_unchanged(self):
+        def rewrite(name, filename, lines):
+            with open(filename) as f:
+                content = f.read()
+            with open(filename, 'w') as f:
+                f.write(content)
+
+        os.utime('/repo/foo.py', (1, 1))
+        fixers.fix_files([('/repo/foo.py', None)],
+                         {'.py': [self._cached_fixer(rewrite)]},
+                         self.executor)
+        self.assertEqual(1, os.path.getmtime('/repo/foo.py'))
+
+    def test_is_fixed_point_touches(self):
+        fixer = self._cached_fixer(None)
+        filename = fixers._get_fixed_point_filename(fixer, 'abc')
+        self.assertFalse(fixers.is_fixed_point(fixer, 'abc'))
+        self.fs.create_file(filename)
+        os.utime(filename, (1, 1))
+        self.assertTrue(fixers.is_fixed_point(fixer, 'abc'))
+        self.assertGreater(os.path.getmtime(filename), 1)
+
+    def test_fixed_points_shared(self):
+        utils.configure_cache('/shared', '/repo')
+        self.addCleanup(utils.configure_cache)
+        self.assertEqual(
+            '/shared/.fixed/fixer/abc',
+            fixers._get_fixed_point_filename(self._cached_fixer(None), 'abc'))
+
+    def test_get_fixer_key(self):
+        self.fs.create_file('/repo/style.yapf', contents='[style]')
+        data = {
+            'command': 'yapf',
+            'arguments': ['--style={REPO_HOME}/style.yapf'],
+        }
+        key = fixers.get_fixer_key('yapf', data, '/repo', None)
+        self.assertEqual(key, fixers.get_fixer_key('yapf', data, '/repo',
+                                                   None))
+        self.assertNotEqual(key,
+                            fixers.get_fixer_key('yapf', data, '/repo', 1))
+        with open('/repo/style.yapf', 'w') as f:
+            f.write('[style]\nbased_on_style = pep8')
+        self.assertNotEqual(key,
+                            fixers.get_fixer_key('yapf', data, '/repo',
+                                                 None))
+
+    def test_make_scratch_copies(self):
+        self.fs.create_file('/repo/sub/baz.py', contents='baz')
+        self.fs.create_file('/repo/setup.cfg', contents='[isort]')
+        fixer = mock.Mock()
+        fixer.config_files = ['/repo/setup.cfg', '/repo/.isort.cfg']
+        scratch_dir, copies = fixers.make_scratch_copies(
+            ['/repo/foo.py', '/repo/sub/baz.py'], '/repo', {'.py': [fixer]})
+        self.assertEqual({
+            '/repo/foo.py': os.path.join(scratch_dir, 'foo.py'),
+            '/repo/sub/baz.py': os.path.join(scratch_dir, 'sub', 'baz.py'),
+        }, copies)
+        with open(copies['/repo/sub/baz.py']) as f:
+            self.assertEqual('baz', f.read())
+        self.assertTrue(
+            os.path.isfile(os.path.join(scratch_dir, 'setup.cfg')))
+
+    def test_get_diff(self):
+        self.assertEqual('', fixers.get_diff('foo.py', b'a\n', b'a\n'))
+        self.assertEqual(
+            '--- a/foo.py\n+++ b/foo.py\n@@ -1,2 +1,2 @@\n a\n-b\n+B\n',
+            fixers.get_diff('foo.py', b'a\nb\n', b'a\nB\n'))
@@ -84,6 +84,18 @@ class GitTest(unittest.TestCase):
             '--ignore-submodules=all'
         ])
 
+    @mock.patch('subprocess.check_output', return_value=b'')
+    def test_modified_files_with_exclude(self, check_output):
+        self.assertEqual({},
+                         git.modified_files(
+                             '/home/user/repo',
+                             exclude=['*snapshots/*', 'vendor/*']))
+        check_output.assert_called_once_with([
+            'git', 'status', '--porcelain', '--untracked-files=all',
+            '--ignore-submodules=all', '--', ':(top,exclude)*snapshots/*',
+            ':(top,exclude)vendor/*'
+        ])
+
     @mock.patch('subprocess.check_output', return_value=b'')
     def test_modified_files_nothing_changed(self, check_output):
         self.assertEqual({}, git.modified_files('/home/user/repo'))
@@ -189,6 +201,92 @@ class GitTest(unittest.TestCase):
                              git.modified_lines('/home/user/repo/foo/bar.txt',
                                                 None)))
 
+    @mock.patch('subprocess.check_output')
+    def test_commits_in_range(self, check_output):
+        check_output.return_value = os.linesep.join(
+            ['0a' * 20, '0b' * 20, '']).encode('utf-8')
+        self.assertEqual(['0a' * 20, '0b' * 20],
+                         git.commits_in_range('master..HEAD'))
+        check_output.assert_called_once_with(
+            ['git', 'rev-list', '--reverse', 'master..HEAD'])
+
+    @mock.patch('subprocess.check_output', return_value=b'0a' * 20 + b'\n')
+    def test_commits_in_range_single_commit(self, check_output):
+        self.assertEqual(['0a' * 20], git.commits_in_range('HEAD'))
+        check_output.assert_called_once_with(
+            ['git', 'rev-parse', 'HEAD^{commit}'])
+
+    @mock.patch('subprocess.check_output')
+    def test_modified_files_in_commit(self, check_output):
+        check_output.return_value = os.linesep.join([
+            'M\tdata/file1.sh',
+            'D\tfile2.rb',
+            'A\tfile3.rb',
+            '',
+        ]).encode('utf-8')
+        commit = '0a' * 20
+
+        self.assertEqual({
+            '/home/user/repo/data/file1.sh': 'M ',
+            '/home/user/repo/file3.rb': 'A ',
+        }, git.modified_files_in_commit('/home/user/repo', commit))
+        check_output.assert_called_once_with([
+            'git', 'diff-tree', '-r', '--root', '--no-commit-id',
+            '--name-status', commit
+        ])
+
+    @mock.patch('subprocess.check_output')
+    def test_modified_lines_in_commit(self, check_output):
+        check_output.return_value = os.linesep.join([
+            'diff --git a/foo/bar.txt b/foo/bar.txt',
+            '@@ -2 +2 @@ def foo():',
+            '-a',
+            '+b',
+            '@@ -10,0 +11,3 @@',
+            '+c',
+            '@@ -20,2 +23,0 @@',
+        ]).encode('utf-8')
+        commit = '0a' * 20
+
+        self.assertEqual([2, 11, 12, 13],
+                         list(
+                             git.modified_lines_in_commit(
+                                 '/home/user/repo/foo/bar.txt', 'M ', commit)))
+        check_output.assert_called_once_with([
+            'git', 'diff', '--no-color', '--no-ext-diff', '-U0',
+            commit + '^', commit, '--', '/home/user/repo/foo/bar.txt'
+        ])
+
+    def test_modified_lines_in_commit_new_addition(self):
+        self.assertIsNone(
+            git.modified_lines_in_commit('/home/user/repo/foo/bar.txt', 'A ',
+                                         '0a' * 20))
+
+    @mock.patch('subprocess.check_output', return_value=b'content')
+    def test_file_content(self, check_output):
+        self.assertEqual(
+            b'content',
+            git.file_content('/home/user/repo', '/home/user/repo/foo/bar.txt',
+                             '0a' * 20))
+        check_output.assert_called_once_with(
+            ['git', 'cat-file', 'blob', '0a' * 20 + ':foo/bar.txt'])
+
+    @mock.patch(
+        'subprocess.check_output',
+        return_value=b'node_modules/\0build/out.o\0')
+    def test_ignored_files(self, check_output):
+        self.assertEqual(
+            set([
+                '/home/user/repo/node_modules', '/home/user/repo/build/out.o'
+            ]), git.ignored_files('/home/user/repo', ['/home/user/repo/src']))
+        check_output.assert_called_once_with(
+            [
+                'git', 'ls-files', '-z', '--others', '--ignored',
+                '--exclude-standard', '--directory', '--',
+                '/home/user/repo/src'
+            ],
+            cwd='/home/user/repo')
+
     @mock.patch('subprocess.check_output', return_value=b'0a' * 20 + b'\n')
     def test_last_commit(self, check_output):
         self.assertEqual('0a' * 20, git.last_commit())
@@ -92,7 +92,7 @@ class GitLintTest(fake_filesystem_unittest.TestCase):
         This method exists to avoid duplication.
         """
         self.git_modified_files.assert_called_once_with(
-            self.root, tracked_only=tracked_only, commit=commit)
+            self.root, tracked_only=tracked_only, commit=commit, exclude=mock.ANY)
         self.git_modified_lines.assert_called_once_with(
             self.filename, ' M', commit=commit)
         self.lint.assert_called_once_with(self.filename, [3, 14], mock.ANY)
@@ -102,13 +102,16 @@ class GitLintTest(fake_filesystem_unittest.TestCase):
         inexistent_file = os.path.join(self.root, 'inexistent_file')
         directory_in_repo = os.path.join(self.root, 'directory_in_repo')
         valid_file = os.path.join(self.root, 'valid')
+        glob_without_matches = os.path.join(self.root, '*.inexistent')
+        valid_glob = os.path.join(self.root, '*lid')
         filenames = [
-            file_outside_repo, inexistent_file, directory_in_repo, valid_file
+            file_outside_repo, inexistent_file, directory_in_repo, valid_file,
+            glob_without_matches, valid_glob
         ]
         expected = {
             file_outside_repo: 'does not belong to repository',
             inexistent_file: 'does not exist',
-            directory_in_repo: 'Directories are not yet supported',
+            glob_without_matches: 'No file matches',
         }
 
         self.fs.create_file(file_outside_repo)
@@ -123,17 +126,71 @@ class GitLintTest(fake_filesystem_unittest.TestCase):
             self.assertIn(filename, invalid_filenames[filename])
             self.assertIn(expected[filename], invalid_filenames[filename])
 
+    def test_expand_filenames(self):
+        for filename in ('a.py', 'dir/b.py', 'dir/sub/c.py', 'dir/d.txt',
+                         'dir/ignored/e.py', 'dir/snapshots/f.py',
+                         'other/g.py', 'other/h.py'):
+            self.fs.create_file(os.path.join(self.root, filename))
+        vcs = mock.Mock()
+        vcs.ignored_files.return_value = set(
+            [os.path.join(self.root, 'dir/ignored')])
+        matcher = gitlint.utils.IgnoreMatcher(['.*snapshots/.*'])
+
+        self.assertEqual([
+            os.path.join(self.root, filename)
+            for filename in ('dir/b.py', 'dir/d.txt', 'dir/sub/c.py',
+                             'other/g.py', 'other/h.py', 'a.py')
+        ],
+                         list(
+                             gitlint.expand_filenames(
+                                 ['dir', 'other/*.py', 'a.py', 'dir/b.py'],
+                                 vcs, self.root, matcher)))
+        vcs.ignored_files.assert_called_once_with(
+            self.root,
+            [os.path.join(self.root, 'dir'),
+             os.path.join(self.root, 'other')])
+
+    def test_expand_filenames_explicit_files(self):
+        self.fs.create_file(os.path.join(self.root, 'snapshots/a.py'))
+        self.fs.create_file(os.path.join(self.root, 'b.py'))
+        vcs = mock.Mock()
+        matcher = gitlint.utils.IgnoreMatcher(['.*snapshots/.*'])
+
+        self.assertEqual([os.path.join(self.root, 'b.py')],
+                         list(
+                             gitlint.expand_filenames(
+                                 ['snapshots/a.py', 'b.py'], vcs, self.root,
+                                 matcher)))
+        self.assertFalse(vcs.ignored_files.called)
+
+    def test_remove_ignored_files(self):
+        files = {'/repo/a.py': 'M ', '/repo/snapshots/b.py': 'M '}
+        self.assertEqual({'/repo/a.py': 'M '},
+                         gitlint.remove_ignored_files(
+                             files,
+                             gitlint.utils.IgnoreMatcher(['.*snapshots/.*'])))
+        self.assertEqual(files,
+                         gitlint.remove_ignored_files(
+                             files, gitlint.utils.IgnoreMatcher([])))
+
     def test_main_not_in_repo(self):
         self.git_repository_root.return_value = None
         self.assertEqual(128, gitlint.main(
             [], stdout=None, stderr=self.stderr))
         self.assertIn('Not a git repository', self.stderr.getvalue())
 
+    def test_main_diff_requires_fix(self):
+        self.assertEqual(
+            2, gitlint.main(['git-lint', '--diff'],
+                            stdout=None,
+                            stderr=self.stderr))
+        self.assertIn('--diff requires --fix', self.stderr.getvalue())
+
     def test_main_nothing_changed(self):
         self.git_modified_files.return_value = {}
         self.assertEqual(0, gitlint.main([], stdout=None, stderr=None))
         self.git_modified_files.assert_called_once_with(
-            self.root, tracked_only=False, commit=None)
+            self.root, tracked_only=False, commit=None, exclude=mock.ANY)
 
     def test_main_file_changed_and_still_valid(self):
         lint_response = {self.filename: {'comments': []}}
@@ -143,6 +200,41 @@ class GitLintTest(fake_filesystem_unittest.TestCase):
         self.assertIn('OK', self.stdout.getvalue())
         self.assert_mocked_calls()
 
+    def test_main_jobs(self):
+        self.lint.return_value = {self.filename: {'comments': []}}
+
+        with mock.patch('concurrent.futures.ThreadPoolExecutor',
+                        wraps=gitlint.futures.ThreadPoolExecutor) as executor:
+            self.assertEqual(0,
+                             gitlint.main(['git-lint', '--jobs=3'],
+                                          stdout=self.stdout,
+                                          stderr=None))
+        executor.assert_called_once_with(max_workers=3)
+
+        with self.assertRaises(ValueError):
+            gitlint.main(['git-lint', '--jobs=0'], stdout=self.stdout,
+                         stderr=None)
+
+    def test_main_invalid_format(self):
+        with self.assertRaises(ValueError):
+            gitlint.main(['git-lint', '--format=xml'], stdout=self.stdout,
+                         stderr=None)
+
+    def test_main_shard_by_time_requires_timings(self):
+        self.assertEqual(
+            2, gitlint.main(['git-lint', '--shard=1/2', '--shard-by=time'],
+                            stdout=self.stdout,
+                            stderr=self.stderr))
+        self.assertIn('--shard-by=time requires --timings',
+                      self.stderr.getvalue())
+
+    def test_main_cache_prune_requires_limit(self):
+        self.assertEqual(
+            2, gitlint.main(['git-lint', 'cache', 'prune'],
+                            stdout=self.stdout,
+                            stderr=self.stderr))
+        self.assertIn('--max-size or --max-age', self.stderr.getvalue())
+
     def test_main_file_changed_and_still_valid_with_commit(self):
         lint_response = {self.filename: {'comments': []}}
         self.lint.return_value = lint_response
@@ -280,6 +372,62 @@ class GitLintTest(fake_filesystem_unittest.TestCase):
                 ['git-lint', '--json'], stdout=self.stdout, stderr=None))
         self.assertEqual(expected_response, json.loads(self.stdout.getvalue()))
 
+    def test_main_file_jsonl(self):
+        self.git_modified_files.return_value = {
+            self.filename: ' M',
+            self.filename2: 'M ',
+        }
+        lint_responses = {
+            self.filename: {
+                'comments': [{
+                    'line': 3,
+                    'message': 'message1'
+                }]
+            },
+            self.filename2: {
+                'comments': []
+            },
+        }
+        self.lint.side_effect = lambda filename, *args, **kwargs: {
+            filename: lint_responses[filename]
+        }
+
+        self.assertEqual(
+            1,
+            gitlint.main(
+                ['git-lint', '--jsonl'], stdout=self.stdout, stderr=None))
+        records = [
+            json.loads(line) for line in self.stdout.getvalue().splitlines()
+        ]
+        self.assertEqual(3, len(records))
+        self.assertEqual(
+            {
+                self.filename: {
+                    'type': 'file',
+                    'filename': self.filename,
+                    'comments': [{
+                        'line': 3,
+                        'message': 'message1',
+                        'formatted_message': 'line 3: message1'
+                    }]
+                },
+                self.filename2: {
+                    'type': 'file',
+                    'filename': self.filename2,
+                    'comments': []
+                },
+            }, {record['filename']: record
+                for record in records[:2]})
+        self.assertEqual(
+            {
+                'type': 'summary',
+                'files': 2,
+                'files_with_problems': 1,
+                'comments': 1,
+                'linter_not_found': False,
+                'exit_code': 1,
+            }, records[2])
+
     def test_main_file_with_skipped_and_error(self):
         lint_response = {
             self.filename: {
@@ -315,7 +463,7 @@ class GitLintTest(fake_filesystem_unittest.TestCase):
         self.assertIn('line 3: error', self.stdout.getvalue())
 
         self.git_modified_files.assert_called_once_with(
-            self.root, tracked_only=False, commit=None)
+            self.root, tracked_only=False, commit=None, exclude=mock.ANY)
         self.lint.assert_called_once_with(self.filename, None, mock.ANY)
 
         self.reset_mock_calls()
@@ -327,7 +475,7 @@ class GitLintTest(fake_filesystem_unittest.TestCase):
         self.assertIn('line 3: error', self.stdout.getvalue())
 
         self.git_modified_files.assert_called_once_with(
-            self.root, tracked_only=False, commit=None)
+            self.root, tracked_only=False, commit=None, exclude=mock.ANY)
         self.lint.assert_called_once_with(self.filename, None, mock.ANY)
 
     def test_main_with_invalid_files(self):
@@ -365,7 +513,7 @@ class GitLintTest(fake_filesystem_unittest.TestCase):
                 os.path.basename(self.filename2), self.stdout.getvalue())
 
             self.git_modified_files.assert_called_once_with(
-                self.root, tracked_only=False, commit=None)
+                self.root, tracked_only=False, commit=None, exclude=mock.ANY)
             expected_calls = [
                 mock.call(self.filename, ' M', commit=None),
                 mock.call(self.filename2, None, commit=None),
@@ -400,7 +548,7 @@ class GitLintTest(fake_filesystem_unittest.TestCase):
             self.assertEqual('', self.stderr.getvalue())
 
             self.git_modified_files.assert_called_once_with(
-                self.root, tracked_only=False, commit=None)
+                self.root, tracked_only=False, commit=None, exclude=mock.ANY)
             expected_calls = [
                 mock.call(self.filename, ' M', commit=None),
                 mock.call(self.filename2, None, commit=None)
@@ -85,6 +85,14 @@ class HgTest(unittest.TestCase):
         check_output.assert_called_once_with(
             ['hg', 'status', '--change=%s' % commit])
 
+    @mock.patch('subprocess.check_output', return_value=b'')
+    def test_modified_files_with_exclude(self, check_output):
+        self.assertEqual({},
+                         hg.modified_files(
+                             '/home/user/repo', exclude=['*snapshots/*']))
+        check_output.assert_called_once_with(
+            ['hg', 'status', '-X', 're:.*snapshots/.*'])
+
     def test_modified_files_non_absolute_root(self):
         with self.assertRaises(AssertionError):
             hg.modified_files('foo/bar')
@@ -0,0 +1,97 @@
+# Copyright 2013-2014 Sebastian Kreft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+
+import gitlint.fixers as fixers
+from gitlint.lineset import LineSet, remap
+
+# pylint: disable=too-many-public-methods
+
+
+class LineSetTest(unittest.TestCase):
+    def test_ranges_are_merged(self):
+        self.assertEqual([(1, 5), (8, 8)],
+                         LineSet([(4, 5), (1, 2), (3, 3), (8, 8),
+                                  (2, 4)]).ranges())
+        self.assertEqual([], LineSet([(5, 4)]).ranges())
+
+    def test_from_lines(self):
+        line_set = LineSet.from_lines([7, 3, 1, 2, 3, 10])
+        self.assertEqual([(1, 3), (7, 7), (10, 10)], line_set.ranges())
+        self.assertIs(line_set, LineSet.from_lines(line_set))
+
+    def test_contains(self):
+        line_set = LineSet([(2, 4), (10, 20)])
+        self.assertEqual([2, 3, 4, 10, 20],
+                         [line for line in range(30) if line in line_set
+                          and line not in range(11, 20)])
+        self.assertNotIn(1, line_set)
+        self.assertNotIn(0, LineSet())
+
+    def test_iter_and_len(self):
+        line_set = LineSet([(2, 4), (10, 11)])
+        self.assertEqual([2, 3, 4, 10, 11], list(line_set))
+        self.assertEqual(5, len(line_set))
+        self.assertTrue(line_set)
+        self.assertFalse(LineSet())
+
+    def test_large_set_is_compact(self):
+        line_set = LineSet.from_lines(range(1, 20001))
+        self.assertEqual([(1, 20000)], line_set.ranges())
+        self.assertEqual(20000, len(line_set))
+
+    def test_expand(self):
+        self.assertEqual([(1, 5), (9, 13)],
+                         LineSet([(2, 3), (11, 11)]).expand(2).ranges())
+        self.assertEqual([(1, 10)], LineSet([(2, 3), (7, 8)]).expand(2)
+                         .ranges())
+
+    def test_equality(self):
+        self.assertEqual(LineSet([(1, 2)]), LineSet.from_lines([2, 1]))
+        self.assertNotEqual(LineSet([(1, 2)]), LineSet([(1, 3)]))
+        self.assertNotEqual(LineSet([(1, 2)]), [1, 2])
+
+    def test_get_modified_lines_range_tuples(self):
+        self.assertEqual([(1, 3), (9, 9)],
+                         fixers.get_modified_lines_range_tuples([1, 2, 3, 9],
+                                                                None))
+        self.assertEqual([(1, 4), (8, 10)],
+                         fixers.get_modified_lines_range_tuples(
+                             LineSet([(1, 3), (9, 9)]), 1))
+        self.assertEqual([], fixers.get_modified_lines_range_tuples([], 1))
+        with self.assertRaises(ValueError):
+            fixers.get_modified_lines_range_tuples([1], -1)
+
+    def test_intersection(self):
+        self.assertEqual(
+            LineSet([(3, 4), (10, 10), (12, 12)]),
+            LineSet([(1, 4), (10, 12)]).intersection(
+                LineSet([(3, 5), (8, 10), (12, 20)])))
+        self.assertEqual(LineSet(), LineSet([(1, 4)]).intersection([]))
+
+    def test_remap(self):
+        before = b'a\nb\nc\nd\ne\n'
+        lines = LineSet.from_lines([2, 5])
+        self.assertIs(lines, remap(lines, before, before))
+        self.assertIsNone(remap(None, before, b'x\n'))
+        # A line inserted at the top shifts the others.
+        self.assertEqual(
+            LineSet.from_lines([1, 3, 6]),
+            remap(lines, before, b'new\na\nb\nc\nd\ne\n'))
+        # A replaced line is modified, a removed one is gone.
+        self.assertEqual(
+            LineSet.from_lines([2, 3]), remap(lines, before,
+                                              b'a\nb\nC\nd\n'))
+        self.assertEqual(LineSet.from_lines([4]),
+                         remap(lines, before, b'a\nc\nd\ne\n'))
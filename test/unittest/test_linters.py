@@ -17,16 +17,22 @@ from __future__ import unicode_literals
 import functools
 import os
 import subprocess
+import sys
 import unittest
 
 import mock
 
 import gitlint
+import gitlint.lineset
 import gitlint.utils
 import gitlint.linters as linters
 
 # pylint: disable=too-many-public-methods,protected-access
 
+FAKE_LINTER = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir,
+    'scripts', 'custom_linters', 'fake_linter.py')
+
 
 class LintersTest(unittest.TestCase):
     def test_lint_command_success(self):
@@ -460,3 +466,199 @@ class LintersTest(unittest.TestCase):
                                                        variables['REPO_HOME'])
 
             self.assertEqual(config_with_vars, config_no_vars)
+
+    def test_parse_yaml_config_stdin(self):
+        yaml_config = {
+            'linter': {
+                'command': 'eslint',
+                'extensions': ['.js'],
+                'filter': '.*',
+                'installation': 'install',
+                'stdin': True,
+                'stdin_arguments': ['--stdin-filename={filename}'],
+            }
+        }
+        with mock.patch('gitlint.utils.which', return_value=['eslint']):
+            config = linters.parse_yaml_config(yaml_config, '', False)
+        self.assertEqual(['--stdin-filename={filename}'],
+                         config['.js'][0].keywords['stdin_arguments'])
+        self.assertFalse(config['.js'][0].keywords['stream'])
+
+    def test_parse_yaml_config_stream(self):
+        yaml_config = {
+            'linter': {
+                'command': 'pylint',
+                'extensions': ['.py'],
+                'filter': '.*',
+                'installation': 'install',
+                'stream': True,
+            }
+        }
+        with mock.patch('gitlint.utils.which', return_value=['pylint']):
+            config = linters.parse_yaml_config(yaml_config, '', False)
+        self.assertTrue(config['.py'][0].keywords['stream'])
+        self.assertIsNone(config['.py'][0].keywords['limits'])
+
+    def test_parse_yaml_config_limits(self):
+        yaml_config = {
+            'linter': {
+                'command': 'tslint',
+                'extensions': ['.ts'],
+                'filter': '.*',
+                'installation': 'install',
+                'timeout': 60,
+                'nice': 10,
+            }
+        }
+        with mock.patch('gitlint.utils.which', return_value=['tslint']):
+            config = linters.parse_yaml_config(yaml_config, '', False)
+        self.assertEqual(
+            gitlint.utils.Limits(timeout=60, max_memory=None, nice=10),
+            config['.ts'][0].keywords['limits'])
+
+    def test_lint_command_fake_linter(self):
+        command = functools.partial(
+            linters.lint_command, 'fake', sys.executable,
+            [FAKE_LINTER, '--messages=1000', '--lines=100'],
+            r'^{filename}:(?P<line>{lines}):(?P<column>\d+): '
+            r'(?P<message>.*)$', False)
+        result = command('/repo/foo.py', lines=[3, 50])
+        self.assertEqual(20, len(result['/repo/foo.py']['comments']))
+        self.assertEqual({
+            'line': 3,
+            'column': 1,
+            'message': 'fake message 3'
+        }, result['/repo/foo.py']['comments'][0])
+
+    def test_lint_command_fake_linter_stream(self):
+        command = functools.partial(
+            linters.lint_command, 'fake', sys.executable,
+            [FAKE_LINTER, '--messages=1000', '--lines=100'],
+            r'^{filename}:(?P<line>{lines}):(?P<column>\d+): '
+            r'(?P<message>.*)$', False)
+        self.assertEqual(
+            command('/repo/foo.py', lines=[3, 50]),
+            command('/repo/foo.py', lines=[3, 50], stream=True))
+
+    def test_lint_command_timeout(self):
+        for stream in (False, True):
+            self.assertEqual({
+                '/repo/foo.py': {
+                    'error': [
+                        'fake: fake_linter.py did not finish in 0.5 seconds '
+                        'and was killed'
+                    ]
+                }
+            },
+                             linters.lint_command(
+                                 'fake',
+                                 FAKE_LINTER, ['--delay=30'],
+                                 '.*',
+                                 False,
+                                 '/repo/foo.py', [1],
+                                 stream=stream,
+                                 limits=gitlint.utils.Limits(0.5, None,
+                                                             None)))
+
+    def test_get_region_arguments(self):
+        self.assertEqual((['-E'], None),
+                         linters.get_region_arguments(['-E'], None, [1, 2]))
+        self.assertEqual((['-E'], None),
+                         linters.get_region_arguments(
+                             ['-E'],
+                             ['--lines={MODIFIED_LINES_RANGE_REPEATED_ARG}'],
+                             None))
+        self.assertEqual((['-E', '--lines=1-3', '--lines=7-7'], [(1, 3),
+                                                                (7, 7)]),
+                         linters.get_region_arguments(
+                             ['-E'],
+                             ['--lines={MODIFIED_LINES_RANGE_REPEATED_ARG}'],
+                             [7, 2, 1, 3]))
+
+    def test_lint_command_region_arguments(self):
+        with mock.patch('gitlint.utils.run', return_value='') as run:
+            linters.lint_command(
+                'linter',
+                'wrapper', ['-E'],
+                '.*',
+                True,
+                '/repo/foo.py', [10, 11, 20],
+                region_arguments=[
+                    '--region={MODIFIED_LINES_RANGE_REPEATED_ARG}'
+                ])
+        run.assert_called_once_with(
+            'linter',
+            'wrapper', ['-E', '--region=10-11', '--region=20-20'],
+            True,
+            '/repo/foo.py',
+            stdin_arguments=None,
+            content=None,
+            limits=None,
+            regions=[(10, 11), (20, 20)],
+            cache_key=None)
+
+    def test_parse_yaml_config_region_arguments(self):
+        yaml_config = {
+            'linter': {
+                'command': 'wrapper',
+                'extensions': ['.py'],
+                'filter': '.*',
+                'installation': 'install',
+                'region_arguments': [
+                    '--region={MODIFIED_LINES_RANGE_REPEATED_ARG}'
+                ],
+            }
+        }
+        with mock.patch('gitlint.utils.which', return_value=['wrapper']):
+            config = linters.parse_yaml_config(yaml_config, '', False)
+        self.assertEqual(['--region={MODIFIED_LINES_RANGE_REPEATED_ARG}'],
+                         config['.py'][0].keywords['region_arguments'])
+
+    def test_get_cache_keys(self):
+        yaml_config = {
+            'linter': {
+                'command': 'linter',
+                'extensions': ['.py', '.pyi'],
+                'filter': '.*',
+                'installation': 'install',
+            },
+            'missing': {
+                'command': 'missing',
+                'extensions': ['.py'],
+                'filter': '.*',
+                'installation': 'install',
+            },
+        }
+
+        def which(program):
+            return ['/bin/linter'] if program == 'linter' else []
+
+        def get_cache_keys(version):
+            with mock.patch('gitlint.utils.which', side_effect=which), \
+                    mock.patch('gitlint.utils.get_program_version',
+                               return_value=version):
+                return linters.get_cache_keys(
+                    linters.parse_yaml_config(yaml_config, '/repo', True))
+
+        keys = get_cache_keys('/bin/linter@1')
+        self.assertEqual(['linter'], list(keys))
+        self.assertEqual(keys, get_cache_keys('/bin/linter@1'))
+        self.assertNotEqual(keys, get_cache_keys('/bin/linter@2'))
+
+    def test_filter_output_with_line_set(self):
+        output = ['foo.py:%d: message' % line for line in range(1, 100)]
+        line_set = gitlint.lineset.LineSet([(3, 5), (50, 50)])
+        filter_regex = r'^{filename}:(?P<line>{lines}): (?P<message>.*)$'
+        result = linters._filter_output(output, filter_regex, 'foo.py',
+                                        line_set)
+        self.assertEqual([3, 4, 5, 50],
+                         [comment['line']
+                          for comment in result['foo.py']['comments']])
+        # When {lines} is used elsewhere, the alternation is used instead.
+        filter_regex = (r'^{filename}:(?P<line>{lines}|9\d):'
+                        r' (?P<message>.*)$')
+        result = linters._filter_output(output, filter_regex, 'foo.py',
+                                        line_set)
+        self.assertEqual([3, 4, 5, 50] + list(range(90, 100)),
+                         [comment['line']
+                          for comment in result['foo.py']['comments']])
@@ -0,0 +1,129 @@
+# Copyright 2013-2014 Sebastian Kreft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import mock
+from pyfakefs import fake_filesystem_unittest
+
+import gitlint
+import gitlint.manifest as manifest
+import gitlint.utils as utils
+
+# pylint: disable=too-many-public-methods
+
+
+class ManifestTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.fs.create_file('/repo/foo.py', contents='hello\n')
+        expanduser_patch = mock.patch(
+            'os.path.expanduser', return_value='/home/user')
+        expanduser_patch.start()
+        self.addCleanup(expanduser_patch.stop)
+
+    def test_blob_hash(self):
+        # Same as: echo hello | git hash-object --stdin
+        self.assertEqual('ce013625030ba8dba906f756967f9e9ca394464a',
+                         manifest.blob_hash('/repo/foo.py'))
+        self.assertIsNone(manifest.blob_hash('/repo/deleted.py'))
+
+    def test_get_key(self):
+        key = manifest.get_key('abc', 'def', False, {'linters': {}})
+        self.assertEqual(key,
+                         manifest.get_key('abc', 'def', False, {'linters': {}}))
+        self.assertNotEqual(key,
+                            manifest.get_key('abc', 'def', True,
+                                             {'linters': {}}))
+        self.assertNotEqual(key,
+                            manifest.get_key('abc', 'xyz', False,
+                                             {'linters': {}}))
+        self.assertNotEqual(key,
+                            manifest.get_key('abc', 'def', False,
+                                             {'linters': {}}, {'l': 'key'}))
+
+    def test_lookup(self):
+        lint_manifest = manifest.Manifest('/manifest.json', 'key')
+        blob, result = lint_manifest.lookup('/repo/foo.py', ' M')
+        self.assertIsNone(result)
+
+        lint_manifest.record('/repo/foo.py', ' M', blob, {'comments': []})
+        self.assertEqual((blob, {
+            'comments': []
+        }), lint_manifest.lookup('/repo/foo.py', ' M'))
+        self.assertIsNone(lint_manifest.lookup('/repo/foo.py', 'MM')[1])
+
+        with open('/repo/foo.py', 'w') as f:
+            f.write('bye\n')
+        self.assertIsNone(lint_manifest.lookup('/repo/foo.py', ' M')[1])
+
+    def test_lookup_returns_a_copy(self):
+        lint_manifest = manifest.Manifest('/manifest.json', 'key')
+        blob, _ = lint_manifest.lookup('/repo/foo.py', ' M')
+        result = {'comments': [{'line': 1}]}
+        lint_manifest.record('/repo/foo.py', ' M', blob, result)
+        result['comments'][0]['formatted_message'] = 'foo'
+        lint_manifest.lookup('/repo/foo.py',
+                             ' M')[1]['comments'][0]['message'] = 'foo'
+        self.assertEqual({
+            'comments': [{
+                'line': 1
+            }]
+        }, lint_manifest.lookup('/repo/foo.py', ' M')[1])
+
+    def test_record_skips_errors(self):
+        lint_manifest = manifest.Manifest('/manifest.json', 'key')
+        blob, _ = lint_manifest.lookup('/repo/foo.py', ' M')
+        lint_manifest.record('/repo/foo.py', ' M', blob,
+                             {'error': ['not found']})
+        lint_manifest.record('/repo/foo.py', ' M', blob,
+                             {'skipped': ['not installed']})
+        self.assertEqual({}, lint_manifest.entries)
+
+    def test_get_filename_shared(self):
+        utils.configure_cache('/shared', '/repo')
+        self.addCleanup(utils.configure_cache)
+        self.assertTrue(
+            manifest.get_filename('/repo', 'local').startswith(
+                '/shared/.manifests/'))
+
+    def test_save_and_load(self):
+        lint_manifest = manifest.load('/repo', 'local', 'key')
+        self.assertEqual({}, lint_manifest.entries)
+        blob, _ = lint_manifest.lookup('/repo/foo.py', ' M')
+        lint_manifest.record('/repo/foo.py', ' M', blob, {'comments': []})
+        lint_manifest.save()
+
+        self.assertEqual(lint_manifest.entries,
+                         manifest.load('/repo', 'local', 'key').entries)
+        self.assertEqual({},
+                         manifest.load('/repo', 'merge-base', 'key').entries)
+        self.assertEqual({},
+                         manifest.load('/repo', 'local', 'other').entries)
+
+    def test_process_file_uses_manifest(self):
+        lint_manifest = manifest.Manifest('/manifest.json', 'key')
+        with mock.patch('gitlint.linters.lint',
+                        return_value={'/repo/foo.py': {
+                            'comments': []
+                        }}) as lint, \
+                mock.patch('gitlint.git.modified_lines', return_value=[1]):
+            for _ in range(2):
+                self.assertEqual(('/repo/foo.py', {
+                    'comments': []
+                }),
+                                 gitlint.process_file(
+                                     gitlint.git,
+                                     None,
+                                     False, {}, ('/repo/foo.py', ' M'),
+                                     lint_manifest=lint_manifest))
+        lint.assert_called_once_with('/repo/foo.py', [1], {}, content=None)
+        self.assertNotIn('lines', lint_manifest.entries['/repo/foo.py'])
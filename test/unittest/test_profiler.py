@@ -0,0 +1,133 @@
+# Copyright 2013-2014 Sebastian Kreft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+
+import mock
+
+import gitlint.profiler as profiler
+
+# pylint: disable=too-many-public-methods
+
+
+class ProfilerTest(unittest.TestCase):
+    def setUp(self):
+        profiler.enable()
+        self.addCleanup(profiler.disable)
+        self.addCleanup(profiler.reset)
+
+    def test_disabled(self):
+        profiler.disable()
+        with profiler.span('lint', 'pylint'):
+            pass
+        profiler.count('cache_hits')
+        self.assertEqual([], profiler.get_spans())
+        self.assertEqual({}, profiler.get_counters())
+
+    def test_span(self):
+        with mock.patch('time.time', side_effect=[10, 12.5]):
+            with profiler.file_context('/repo/foo.py'):
+                with profiler.span('lint', 'pylint'):
+                    pass
+        spans = profiler.get_spans()
+        self.assertEqual(1, len(spans))
+        self.assertEqual(('lint', 'pylint', '/repo/foo.py', 10, 2.5),
+                         (spans[0].category, spans[0].name, spans[0].filename,
+                          spans[0].start, spans[0].duration))
+
+    def test_span_records_exceptions(self):
+        with self.assertRaises(ValueError):
+            with profiler.span('vcs', 'blame'):
+                raise ValueError()
+        self.assertEqual(1, len(profiler.get_spans()))
+
+    def test_timed(self):
+        @profiler.timed('vcs', counter='vcs_queries')
+        def modified_lines(value):
+            return value
+
+        self.assertEqual(3, modified_lines(3))
+        self.assertEqual(3, modified_lines(3))
+        self.assertEqual(['modified_lines', 'modified_lines'],
+                         [span.name for span in profiler.get_spans()])
+        self.assertEqual(2, profiler.get_counters()['vcs_queries'])
+
+    def test_file_timings(self):
+        with mock.patch('time.time', side_effect=[0, 1, 1, 3, 3, 7]):
+            with profiler.file_context('/repo/foo.py'):
+                with profiler.span('lint', 'pylint'):
+                    pass
+                with profiler.span('lint', 'pylint'):
+                    pass
+            with profiler.span('vcs', 'modified_files'):
+                pass
+        self.assertEqual({
+            'lint:pylint': 3
+        }, profiler.file_timings('/repo/foo.py'))
+        self.assertEqual({}, profiler.file_timings('/repo/bar.py'))
+        profiler.reset()
+        self.assertEqual({}, profiler.file_timings('/repo/foo.py'))
+
+    def test_report(self):
+        with profiler.file_context('/repo/foo.py'):
+            with profiler.span('file', 'process'):
+                with profiler.span('lint', 'pylint'):
+                    pass
+        profiler.count('cache_hits', 3)
+        profiler.count('cache_misses')
+        profiler.count('program_runs')
+        report = '\n'.join(profiler.report())
+        self.assertIn('pylint:', report)
+        self.assertIn('foo.py:', report)
+        self.assertIn('3 hits, 1 misses (75% hit rate)', report)
+        self.assertIn('1 linter and fixer runs, 0 vcs queries', report)
+
+    def test_trace_events(self):
+        with mock.patch('time.time', side_effect=[1, 1, 1.5, 1.5, 2]):
+            profiler.enable()
+            with profiler.file_context('/repo/foo.py'):
+                with profiler.span('run', 'pylint'):
+                    pass
+            with profiler.span('vcs', 'modified_files'):
+                pass
+        with mock.patch('os.getpid', return_value=7):
+            events = profiler.trace_events()
+        self.assertEqual([{
+            'name': 'pylint',
+            'cat': 'run',
+            'ph': 'X',
+            'ts': 0,
+            'dur': 500000,
+            'pid': 7,
+            'tid': 1,
+            'args': {
+                'file': '/repo/foo.py'
+            },
+        }, {
+            'name': 'modified_files',
+            'cat': 'vcs',
+            'ph': 'X',
+            'ts': 500000,
+            'dur': 500000,
+            'pid': 7,
+            'tid': 1,
+            'args': {},
+        }, {
+            'name': 'thread_name',
+            'ph': 'M',
+            'pid': 7,
+            'tid': 1,
+            'args': {
+                'name': 'MainThread'
+            },
+        }], events)
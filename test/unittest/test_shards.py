@@ -0,0 +1,148 @@
+# Copyright 2013-2014 Sebastian Kreft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import io
+import json
+
+import mock
+from pyfakefs import fake_filesystem_unittest
+
+import gitlint
+import gitlint.shards as shards
+
+# pylint: disable=too-many-public-methods
+
+
+class ShardsTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+
+    def test_parse_shard(self):
+        self.assertEqual((1, 3), shards.parse_shard('1/3'))
+        self.assertEqual((3, 3), shards.parse_shard('3/3'))
+
+    def test_parse_shard_invalid(self):
+        for shard in ('0/3', '4/3', '1', 'a/b', '1/2/3'):
+            with self.assertRaises(ValueError):
+                shards.parse_shard(shard)
+
+    def test_select_shard(self):
+        weights = {'a': 10, 'b': 1, 'c': 5, 'd': 5, 'e': 1}
+        selected = [
+            shards.select_shard(weights.keys(), index, 2, weights)
+            for index in (1, 2)
+        ]
+        self.assertEqual([['a', 'b'], ['c', 'd', 'e']], selected)
+
+    def test_select_shard_is_a_partition(self):
+        filenames = ['file%d' % i for i in range(50)]
+        weights = dict((filename, i % 7) for i, filename in enumerate(filenames))
+        selected = []
+        for index in range(1, 5):
+            selected.extend(
+                shards.select_shard(
+                    list(reversed(filenames)), index, 4, weights))
+        self.assertEqual(sorted(filenames), sorted(selected))
+
+    def test_get_weights_size(self):
+        self.fs.create_file('/repo/a', contents='12345')
+        self.fs.create_file('/repo/b', contents='1')
+        self.assertEqual({
+            '/repo/a': 5,
+            '/repo/b': 1,
+            '/repo/deleted': 0
+        }, shards.get_weights(['/repo/a', '/repo/b', '/repo/deleted']))
+
+    def test_get_weights_time(self):
+        timings = {'/repo/a': 2.0, '/repo/c': 4.0, '/repo/other': 9.0}
+        self.assertEqual({
+            '/repo/a': 2.0,
+            '/repo/b': 3.0,
+            '/repo/c': 4.0
+        }, shards.get_weights(['/repo/a', '/repo/b', '/repo/c'], 'time',
+                              timings))
+
+    def test_get_weights_time_requires_timings(self):
+        # The cache may be updated by other shards, so it is never read.
+        with mock.patch('gitlint.utils.get_run_time_from_cache') as run_time:
+            with self.assertRaises(ValueError):
+                shards.get_weights(['/repo/a'], 'time')
+        run_time.assert_not_called()
+
+    def test_get_timings_round_trip(self):
+        with mock.patch(
+                'gitlint.utils.get_run_time_from_cache',
+                side_effect=[2.0, None]):
+            timings = shards.get_timings(['/repo/a', '/repo/dir/b'], '/repo')
+        self.assertEqual({'a': 2.0}, timings)
+
+        self.fs.create_file('/timings.json', contents=json.dumps(timings))
+        self.assertEqual({
+            '/other/repo/a': 2.0
+        }, shards.load_timings('/timings.json', '/other/repo'))
+
+    def test_get_weights_invalid(self):
+        with self.assertRaises(ValueError):
+            shards.get_weights([], 'lines')
+
+    def test_merge_results(self):
+        self.fs.create_file(
+            '/shard1.json',
+            contents=json.dumps({
+                '/repo/a': {
+                    'comments': []
+                }
+            }))
+        self.fs.create_file(
+            '/shard2.json',
+            contents=json.dumps({
+                '/repo/b': {
+                    'comments': [{
+                        'line': 1
+                    }]
+                }
+            }))
+        expected = {
+            '/repo/a': {
+                'comments': []
+            },
+            '/repo/b': {
+                'comments': [{
+                    'line': 1
+                }]
+            },
+        }
+        self.assertEqual(expected,
+                         shards.merge_results(['/shard1.json',
+                                               '/shard2.json']))
+
+        stdout = io.StringIO()
+        self.assertEqual(
+            1,
+            gitlint.main(
+                ['git-lint', 'merge-results', '/shard1.json', '/shard2.json'],
+                stdout=stdout))
+        self.assertEqual(expected, json.loads(stdout.getvalue()))
+
+    def test_merge_results_linter_not_found(self):
+        self.fs.create_file(
+            '/shard1.json',
+            contents=json.dumps({
+                '/repo/a': {
+                    'error': ['not found']
+                }
+            }))
+        self.assertEqual(
+            4,
+            gitlint.main(['git-lint', 'merge-results', '/shard1.json'],
+                         stdout=io.StringIO()))
@@ -11,9 +11,15 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import functools
 import os.path
+import shutil
+import subprocess
+import tempfile
+import time
 import unittest
 import sys
+from concurrent import futures
 
 import mock
 from pyfakefs import fake_filesystem_unittest
@@ -22,6 +28,10 @@ import gitlint.utils as utils
 
 # pylint: disable=protected-access
 
+FAKE_LINTER = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir,
+    'scripts', 'custom_linters', 'fake_linter.py')
+
 
 class UtilsTest(fake_filesystem_unittest.TestCase):
     def setUp(self):
@@ -78,15 +88,13 @@ class UtilsTest(fake_filesystem_unittest.TestCase):
                                  r'(?P<line>\d+): .*',
                                  groups=('line', 'debug'))))
 
-    @unittest.skipUnless(sys.version_info >= (3, 5),
-                         'pyfakefs does not support pathlib2. See'
-                         'https://github.com/jmcgeheeiv/pyfakefs/issues/408')
-    def test_open_for_write(self):
+    def test_write_file_atomically(self):
         filename = 'foo/bar/new_file'
-        with utils._open_for_write(filename) as f:
-            f.write('foo')
-        with open(filename) as f:
-            self.assertEqual('foo', f.read())
+        utils.write_file_atomically(filename, 'foo')
+        utils.write_file_atomically(filename, u'b\xe1r')
+        with open(filename, 'rb') as f:
+            self.assertEqual(u'b\xe1r'.encode('utf-8'), f.read())
+        self.assertEqual(['new_file'], os.listdir('foo/bar'))
 
     def test_get_cache_filename(self):
         self.fs.create_dir('/abspath')
@@ -104,9 +112,6 @@ class UtilsTest(fake_filesystem_unittest.TestCase):
                 '/home/user/.git-lint/cache/linter3/bar/file.txt',
                 utils._get_cache_filename('linter3', '/bar/file.txt'))
 
-    @unittest.skipUnless(sys.version_info >= (3, 5),
-                         'pyfakefs does not support pathlib2. See'
-                         'https://github.com/jmcgeheeiv/pyfakefs/issues/408')
     def test_save_output_in_cache(self):
         output = 'Some content'
         with mock.patch(
@@ -114,8 +119,10 @@ class UtilsTest(fake_filesystem_unittest.TestCase):
                 return_value='/cache/filename.txt'):
             utils.save_output_in_cache('linter', 'filename', output)
 
-            with open(utils._get_cache_filename('linter', 'filename')) as f:
-                self.assertEqual(output, f.read())
+            self.assertEqual(
+                output,
+                utils._read_cache_entry(
+                    utils._get_cache_filename('linter', 'filename')))
 
     def test_get_output_from_cache_no_cache(self):
         cache_filename = '/cache/filename.txt'
@@ -139,16 +146,442 @@ class UtilsTest(fake_filesystem_unittest.TestCase):
         cache_filename = '/cache/filename.txt'
         content = 'some_content'
         self.fs.create_file('filename')
-        self.fs.create_file(cache_filename, contents=content)
+        self.fs.create_file(
+            cache_filename, contents=utils._encode_cache_entry(content))
         with mock.patch(
                 'gitlint.utils._get_cache_filename',
                 return_value=cache_filename):
             self.assertEqual(content,
                              utils.get_output_from_cache('linter', 'filename'))
 
+    def test_get_output_from_cache_cache_is_corrupt(self):
+        cache_filename = '/cache/filename.txt'
+        entry = utils._encode_cache_entry('some_content')
+        self.fs.create_file('filename')
+        os.utime('filename', (0, 0))
+        with mock.patch(
+                'gitlint.utils._get_cache_filename',
+                return_value=cache_filename):
+            # Written by an older version, without header.
+            self.fs.create_file(cache_filename, contents='some_content')
+            self.assertIsNone(
+                utils.get_output_from_cache('linter', 'filename'))
+            self.assertFalse(utils._check_cache_entry(cache_filename))
+
+            # Truncated.
+            with open(cache_filename, 'wb') as f:
+                f.write(entry[:-1])
+            self.assertIsNone(
+                utils.get_output_from_cache('linter', 'filename'))
+            self.assertFalse(utils._check_cache_entry(cache_filename))
+
+            # Modified.
+            with open(cache_filename, 'wb') as f:
+                f.write(entry.replace(b'some', b'same'))
+            self.assertIsNone(
+                utils.get_output_from_cache('linter', 'filename'))
+            self.assertIsNone(
+                utils._get_valid_cache_filename('linter', 'filename'))
+
+            with open(cache_filename, 'wb') as f:
+                f.write(entry)
+            self.assertTrue(utils._check_cache_entry(cache_filename))
+            self.assertEqual(
+                cache_filename,
+                utils._get_valid_cache_filename('linter', 'filename'))
+
+    def test_get_output_from_cache_records_lookups(self):
+        cache_filename = '/cache/filename.txt'
+        self.fs.create_file('filename')
+        self.fs.create_file(
+            cache_filename, contents=utils._encode_cache_entry('some_content'))
+        os.utime(cache_filename, (0, 0))
+        os.utime('filename', (0, 0))
+        utils.pop_cache_lookups()
+        with mock.patch(
+                'gitlint.utils._get_cache_filename',
+                return_value=cache_filename):
+            self.assertIsNone(
+                utils.get_output_from_cache('linter', 'filename'))
+            os.utime('filename', (-1, -1))
+            utils.get_output_from_cache('linter', 'filename')
+        self.assertEqual({'linter': {
+            'hits': 1,
+            'misses': 1
+        }}, utils.pop_cache_lookups())
+        self.assertEqual({}, utils.pop_cache_lookups())
+        # The entry was used, so its modification time is now.
+        self.assertGreater(os.path.getmtime(cache_filename), 0)
+
+    def test_walk(self):
+        for filename in ('/repo/b', '/repo/a', '/repo/dir2/c', '/repo/dir1/d',
+                         '/repo/dir1/sub/e', '/repo/.git/HEAD',
+                         '/repo/ignored/f', '/repo/dir1/g.ignored'):
+            self.fs.create_file(filename)
+
+        def is_ignored(path, is_dir):
+            return path.endswith('.ignored') or (is_dir and
+                                                 path.endswith('ignored'))
+
+        self.assertEqual([
+            '/repo/a', '/repo/b', '/repo/dir1/d', '/repo/dir1/sub/e',
+            '/repo/dir2/c'
+        ], list(utils.walk(['/repo'], is_ignored=is_ignored, max_workers=2)))
+
+    def test_map_in_order(self):
+        consumed = []
+
+        def items():
+            for item in range(10):
+                consumed.append(item)
+                yield item
+
+        with futures.ThreadPoolExecutor(max_workers=2) as executor:
+            results = utils.map_in_order(
+                functools.partial(executor.submit, lambda item: item * 2),
+                items(), 3)
+            self.assertEqual((0, 0), next(results))
+            # Only a few items are consumed ahead of the results.
+            self.assertEqual([0, 1, 2], consumed)
+            self.assertEqual([(item, item * 2) for item in range(1, 10)],
+                             list(results))
+
+    def test_ignore_matcher(self):
+        matcher = utils.IgnoreMatcher(['.*snapshots/.*', '/repo/vendor/'])
+        self.assertTrue(matcher)
+        self.assertTrue(matcher.match('/repo/foo/snapshots/bar.py'))
+        self.assertTrue(matcher.match('/repo/vendor/lib.py'))
+        self.assertFalse(matcher.match('/repo/foo/bar.py'))
+        self.assertFalse(matcher.match('/other/vendor/lib.py'))
+
+    def test_ignore_matcher_empty(self):
+        matcher = utils.IgnoreMatcher([])
+        self.assertFalse(matcher)
+        self.assertFalse(matcher.match('/repo/foo.py'))
+        self.assertEqual([], matcher.exclude_globs('/repo'))
+
+    def test_ignore_matcher_exclude_globs(self):
+        matcher = utils.IgnoreMatcher([
+            '.*snapshots/.*', '.*\\.min\\.js', '/repo/vendor/.*',
+            '/other/.*', '.*(foo|bar)/.*', '.*\\d+\\.py', '.*a?'
+        ])
+        self.assertEqual(['*snapshots/*', '*.min.js*', 'vendor/*'],
+                         matcher.exclude_globs('/repo'))
+
     def test_which_absolute_path(self):
         filename = '/foo/bar.sh'
         self.fs.create_file(filename)
         os.chmod(filename, 0o755)
 
         self.assertEqual([filename], utils.which(filename))
+
+    def test_run_stdin(self):
+        self.fs.create_file('/repo/foo.js', contents='var a = 1;')
+        with mock.patch('subprocess.check_output',
+                        return_value=b'output') as check_output:
+            self.assertEqual(
+                'output',
+                utils.run('linter', 'eslint', ['--stdin'], False,
+                          '/repo/foo.js',
+                          stdin_arguments=['--stdin-filename={filename}']))
+            check_output.assert_called_once_with(
+                ['eslint', '--stdin', '--stdin-filename=/repo/foo.js'],
+                input=b'var a = 1;',
+                stderr=mock.ANY)
+
+    def test_run_stdin_with_content(self):
+        with mock.patch('subprocess.check_output',
+                        side_effect=subprocess.CalledProcessError(
+                            1, 'pycodestyle', b'error')) as check_output, \
+                mock.patch('gitlint.utils.save_output_in_cache') as save:
+            self.assertEqual(
+                'error',
+                utils.run('linter', 'pycodestyle', [], True, '/repo/foo.py',
+                          stdin_arguments=['-'], content=b'import os'))
+            self.assertEqual(b'import os',
+                             check_output.call_args[1]['input'])
+            save.assert_called_once_with('linter', '/repo/foo.py', 'error',
+                                         b'import os', None, None)
+
+    def test_run_content_without_stdin(self):
+        def check_output(call_arguments, **unused_kwargs):
+            with open(call_arguments[-1], 'rb') as f:
+                self.assertEqual(b'import os', f.read())
+            return ('%s:1: unused import' % call_arguments[-1]).encode('utf-8')
+
+        with mock.patch('subprocess.check_output', side_effect=check_output):
+            self.assertEqual(
+                '/repo/foo.py:1: unused import',
+                utils.run('linter', 'pylint', [], False, '/repo/foo.py',
+                          content=b'import os'))
+
+    def test_get_cache_filename_with_content(self):
+        with mock.patch('os.path.expanduser', return_value='/home/user'):
+            self.assertEqual(
+                '/home/user/.git-lint/cache/linter/bar/file.txt@'
+                '0beec7b5ea3f0fdbc95d0dd47f3c5bc275da8a33',
+                utils._get_cache_filename('linter', '/bar/file.txt', b'foo'))
+
+    def test_get_cache_filename_with_regions(self):
+        with mock.patch('os.path.expanduser', return_value='/home/user'):
+            filename = utils._get_cache_filename('linter', '/bar/file.txt',
+                                                 regions=[(1, 3), (7, 7)])
+            self.assertTrue(
+                filename.startswith(
+                    '/home/user/.git-lint/cache/linter/bar/file.txt#'))
+            self.assertNotEqual(
+                filename,
+                utils._get_cache_filename('linter', '/bar/file.txt',
+                                          regions=[(1, 3)]))
+
+    def test_get_cache_filename_shared(self):
+        self.fs.create_file('/repo/bar/file.txt', contents='foo')
+        self.fs.create_file('/other/repo/bar/file.txt', contents='foo')
+        utils.configure_cache('/shared', '/repo')
+        self.addCleanup(utils.configure_cache)
+        filename = utils._get_cache_filename('linter', '/repo/bar/file.txt')
+        self.assertEqual(
+            '/shared/linter/bar/file.txt@'
+            '0beec7b5ea3f0fdbc95d0dd47f3c5bc275da8a33', filename)
+        self.assertEqual('/shared', utils.get_cache_dir())
+
+        # The same file in another checkout has the same entry.
+        utils.configure_cache('/shared', '/other/repo')
+        self.assertEqual(
+            filename,
+            utils._get_cache_filename('linter', '/other/repo/bar/file.txt'))
+
+        # Unless the linter is configured or installed differently.
+        self.assertEqual(
+            filename + '%key',
+            utils._get_cache_filename('linter', '/other/repo/bar/file.txt',
+                                      cache_key='key'))
+
+    def test_run_time_shared(self):
+        utils.configure_cache('/shared', '/repo')
+        self.addCleanup(utils.configure_cache)
+        self.fs.create_file('/shared/.timings/linter/bar/file.txt',
+                            contents='1.5')
+        self.assertEqual('/shared/.timings', utils._get_timings_dir())
+        # The times are keyed on the path relative to the repository.
+        utils.configure_cache('/shared', '/other/repo')
+        self.assertEqual(
+            1.5, utils.get_run_time_from_cache('/other/repo/bar/file.txt'))
+
+    def test_run_time_ignores_unreadable_times(self):
+        utils.configure_cache('/shared', '/repo')
+        self.addCleanup(utils.configure_cache)
+        self.fs.create_file('/shared/.timings/linter/bar/file.txt',
+                            contents='1.5')
+        self.fs.create_file('/shared/.timings/other/bar/file.txt',
+                            contents='')
+        self.assertEqual(
+            1.5, utils.get_run_time_from_cache('/repo/bar/file.txt'))
+
+        utils.save_run_time_in_cache('other', '/repo/bar/file.txt', 0.5)
+        self.assertEqual(
+            2.0, utils.get_run_time_from_cache('/repo/bar/file.txt'))
+        self.assertEqual(['file.txt'],
+                         os.listdir('/shared/.timings/other/bar'))
+
+    def test_get_cache_filename_ignores_cache_key(self):
+        self.assertEqual(
+            utils._get_cache_filename('linter', '/bar/file.txt'),
+            utils._get_cache_filename('linter', '/bar/file.txt',
+                                      cache_key='key'))
+
+    def test_get_config_key(self):
+        self.fs.create_file('/repo/pylintrc', contents='[MASTER]')
+        data = {
+            'command': 'pylint',
+            'arguments': ['--rcfile={REPO_HOME}/pylintrc'],
+        }
+        key = utils.get_config_key('pylint', data, '/repo', 'pylint@1')
+        self.assertEqual(
+            key, utils.get_config_key('pylint', data, '/repo', 'pylint@1'))
+        self.assertNotEqual(
+            key, utils.get_config_key('pylint', data, '/repo', 'pylint@2'))
+        with open('/repo/pylintrc', 'w') as f:
+            f.write('[MASTER]\njobs=2')
+        self.assertNotEqual(
+            key, utils.get_config_key('pylint', data, '/repo', 'pylint@1'))
+
+    def test_open_temporary_for_write_mode(self):
+        with mock.patch('gitlint.utils._FILE_MODE', 0o644):
+            with utils._open_temporary_for_write('/cache/entry') as f:
+                f.write(u'output')
+        self.assertEqual(0o644, os.stat(f.name).st_mode & 0o777)
+
+    def test_get_output_from_cache_shared(self):
+        self.fs.create_file('/repo/file.txt', contents='foo')
+        utils.configure_cache('/shared', '/repo')
+        self.addCleanup(utils.configure_cache)
+        cache_filename = utils._get_cache_filename('linter', '/repo/file.txt')
+        self.fs.create_file(
+            cache_filename,
+            contents=utils._encode_cache_entry(
+                '{GIT_LINT_REPOSITORY_ROOT}/file.txt:1: error'))
+        # The entry is older than the file, but it is keyed on the content.
+        os.utime(cache_filename, (0, 0))
+
+        utils.configure_cache('/shared', '/checkout')
+        self.fs.create_file('/checkout/file.txt', contents='foo')
+        self.assertEqual(
+            '/checkout/file.txt:1: error',
+            utils.get_output_from_cache('linter', '/checkout/file.txt'))
+        self.assertEqual(['/checkout/file.txt:1: error'],
+                         list(utils._read_lines(cache_filename)))
+
+        with open('/checkout/file.txt', 'w') as f:
+            f.write('bar')
+        self.assertIsNone(
+            utils.get_output_from_cache('linter', '/checkout/file.txt'))
+
+    def test_output_to_cache_shared(self):
+        utils.configure_cache('/shared', '/repo')
+        self.addCleanup(utils.configure_cache)
+        self.assertEqual('{GIT_LINT_REPOSITORY_ROOT}/a.py /repo2/b.py',
+                         utils._output_to_cache('/repo/a.py /repo2/b.py'))
+
+    def test_get_output_from_cache_with_content(self):
+        cache_filename = '/cache/filename.txt@hash'
+        self.fs.create_file(
+            cache_filename, contents=utils._encode_cache_entry('some_content'))
+        with mock.patch(
+                'gitlint.utils._get_cache_filename',
+                return_value=cache_filename):
+            # The file does not exist on disk, but the entry is still valid.
+            self.assertEqual(
+                'some_content',
+                utils.get_output_from_cache('linter', 'filename', b'foo'))
+
+
+class RunFakeLinterTest(unittest.TestCase):
+    """Runs the fake linter for real, so the filesystem is not faked."""
+
+    def test_run(self):
+        output = utils.run('fake', sys.executable,
+                           [FAKE_LINTER, '--messages=3', '--lines=2'], False,
+                           '/repo/foo.py')
+        self.assertEqual([
+            '/repo/foo.py:1:1: fake message 1',
+            '/repo/foo.py:2:1: fake message 2',
+            '/repo/foo.py:1:2: fake message 3',
+        ], output.splitlines())
+
+    def test_run_invalid_lines(self):
+        output = utils.run('fake', sys.executable,
+                           [FAKE_LINTER, '--messages=3', '--lines=0'], False,
+                           '/repo/foo.py')
+        self.assertIn('--lines must be a positive integer', output)
+
+    def test_run_exit_code(self):
+        output = utils.run('fake', sys.executable,
+                           [FAKE_LINTER, '--messages=1', '--exit-code=2'],
+                           False, '/repo/foo.py')
+        self.assertEqual('/repo/foo.py:1:1: fake message 1',
+                         output.strip())
+
+    def test_run_stdin(self):
+        output = utils.run(
+            'fake',
+            sys.executable, [FAKE_LINTER, '--messages=1'],
+            False,
+            '/repo/foo.py',
+            stdin_arguments=['--stdin-filename={filename}'],
+            content=b'import os')
+        self.assertEqual('/repo/foo.py:1:1: fake message 1', output.strip())
+
+    def test_run_lines(self):
+        arguments = [FAKE_LINTER, '--messages=3', '--lines=2']
+        output = utils.run('fake', sys.executable, arguments, False,
+                           '/repo/foo.py')
+        self.assertEqual(
+            output.splitlines(),
+            list(utils.run_lines('fake', sys.executable, arguments, False,
+                                 '/repo/foo.py')))
+
+    def test_run_lines_stdin(self):
+        self.assertEqual(['/repo/foo.py:1:1: fake message 1'],
+                         list(
+                             utils.run_lines(
+                                 'fake',
+                                 sys.executable, [FAKE_LINTER, '--messages=1'],
+                                 False,
+                                 '/repo/foo.py',
+                                 stdin_arguments=['--stdin-filename={filename}'],
+                                 content=b'import os' * 100000)))
+
+    def test_run_lines_program_not_found(self):
+        output = utils.run_lines('fake', '/does/not/exist', [], False,
+                                 '/repo/foo.py')
+        self.assertIn('Could not execute', output['/repo/foo.py']['error'][0])
+
+    def test_run_lines_cache(self):
+        home = tempfile.mkdtemp(prefix='gitlint')
+        self.addCleanup(shutil.rmtree, home, True)
+        arguments = [FAKE_LINTER, '--messages=2']
+        with mock.patch('os.path.expanduser', return_value=home):
+            lines = list(
+                utils.run_lines('fake', sys.executable, arguments, True,
+                                '/repo/foo.py', content=b'import os'))
+            self.assertEqual(
+                '\n'.join(lines) + '\n',
+                utils.get_output_from_cache('fake', '/repo/foo.py',
+                                            b'import os'))
+            with mock.patch('subprocess.Popen') as popen:
+                self.assertEqual(
+                    lines,
+                    list(
+                        utils.run_lines('fake', sys.executable, arguments,
+                                        True, '/repo/foo.py',
+                                        content=b'import os')))
+            popen.assert_not_called()
+
+    def test_run_timeout_kills_process_group(self):
+        start = time.time()
+        with self.assertRaises(utils.LimitExceeded):
+            # The background sleep keeps stdout open unless the whole process
+            # group is killed.
+            utils.run('sh', 'sh', ['-c', 'sleep 30 & sleep 30', 'sh'], False,
+                      '/repo/foo.py', limits=utils.Limits(0.5, None, None))
+        self.assertLess(time.time() - start, 10)
+
+    def test_run_lines_timeout(self):
+        output = utils.run_lines(
+            'fake', sys.executable, [FAKE_LINTER, '--delay=30'], False,
+            '/repo/foo.py', limits=utils.Limits(0.5, None, None))
+        with self.assertRaises(utils.LimitExceeded):
+            list(output)
+
+    def test_run_with_limits(self):
+        self.assertEqual(
+            '/repo/foo.py:1:1: fake message 1',
+            utils.run('fake', sys.executable, [FAKE_LINTER, '--messages=1'],
+                      False, '/repo/foo.py',
+                      limits=utils.Limits(30, 1024, 5)).strip())
+
+    def test_run_batch(self):
+        self.assertEqual(
+            '/repo/foo.py:1:1: fake message 1',
+            utils.run_batch('fake', sys.executable,
+                            [FAKE_LINTER, '--messages=1'],
+                            ['/repo/foo.py']).strip())
+
+    def test_run_batch_program_not_found(self):
+        output = utils.run_batch('fake', '/does/not/exist', [],
+                                 ['/repo/foo.py', '/repo/bar.py'])
+        self.assertEqual(['/repo/bar.py', '/repo/foo.py'], sorted(output))
+        self.assertIn('Could not execute', output['/repo/foo.py']['error'][0])
+
+    def test_apply_limits(self):
+        with mock.patch('os.getpriority', return_value=1), \
+                mock.patch('os.setpriority') as setpriority, \
+                mock.patch('resource.prlimit') as prlimit:
+            utils._apply_limits(123, utils.Limits(None, 2, 10))
+        setpriority.assert_called_once_with(os.PRIO_PROCESS, 123, 11)
+        prlimit.assert_called_once_with(123, mock.ANY, (2097152, 2097152))
+
+    def test_apply_limits_process_exited(self):
+        with mock.patch('os.setpriority', side_effect=ProcessLookupError):
+            utils._apply_limits(123, utils.Limits(None, None, 10))
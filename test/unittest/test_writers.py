@@ -0,0 +1,218 @@
+# Copyright 2013-2014 Sebastian Kreft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import io
+import json
+import unittest
+import xml.etree.ElementTree
+
+import gitlint.writers as writers
+
+
+class JsonLinesWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.stdout = io.StringIO()
+        self.writer = writers.JsonLinesWriter(self.stdout, '/repo')
+
+    def get_records(self):
+        return [
+            json.loads(line) for line in self.stdout.getvalue().splitlines()
+        ]
+
+    def test_write_file(self):
+        self.writer.write_file('/foo.py', {'comments': [{'line': 1}]})
+        self.assertEqual([{
+            'type': 'file',
+            'filename': '/foo.py',
+            'comments': [{
+                'line': 1
+            }]
+        }], self.get_records())
+
+    def test_write_file_is_streamed(self):
+        self.writer.write_file('/foo.py', {'comments': []})
+        self.assertTrue(self.stdout.getvalue().endswith('\n'))
+        self.writer.write_file('/bar.py', {'comments': []})
+        self.assertEqual(['/foo.py', '/bar.py'],
+                         [record['filename'] for record in self.get_records()])
+
+    def test_write_file_with_commit(self):
+        self.writer.write_file('/foo.py', {'comments': []}, 'abc')
+        self.assertEqual('abc', self.get_records()[0]['commit'])
+
+    def test_write_file_unicode(self):
+        self.writer.write_file('/foo.py', {'comments': [{'message': u'\xf1'}]})
+        self.assertEqual(u'\xf1',
+                         self.get_records()[0]['comments'][0]['message'])
+
+    def test_finish(self):
+        self.writer.write_file('/foo.py', {
+            'comments': [{
+                'line': 1
+            }, {
+                'line': 2
+            }]
+        })
+        self.writer.write_file('/bar.py', {'skipped': ['no linter']})
+        self.writer.finish(1, False, 1)
+        self.assertEqual({
+            'type': 'summary',
+            'files': 2,
+            'files_with_problems': 1,
+            'comments': 2,
+            'linter_not_found': False,
+            'exit_code': 1,
+        },
+                         self.get_records()[-1])
+
+
+class GetLevelTest(unittest.TestCase):
+    def test_get_level(self):
+        self.assertEqual('error', writers.get_level({'severity': 'Error'}))
+        self.assertEqual('error', writers.get_level({'severity': 'E'}))
+        self.assertEqual('warning', writers.get_level({'severity': 'Warning'}))
+        self.assertEqual('warning', writers.get_level({}))
+        self.assertEqual('note', writers.get_level({'severity': 'Convention'}))
+
+
+class SarifWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.stdout = io.StringIO()
+        self.writer = writers.SarifWriter(self.stdout, '/repo')
+
+    def test_write(self):
+        self.writer.start()
+        self.writer.write_file(
+            '/repo/foo/bar.py', {
+                'comments': [{
+                    'line': 3,
+                    'column': 1,
+                    'severity': 'Error',
+                    'message_id': 'E1',
+                    'message': 'message1'
+                }, {
+                    'message': 'message2'
+                }]
+            })
+        self.writer.write_file('/repo/baz.py', {'error': ['not found']})
+        self.writer.finish(1, True, 1)
+
+        log = json.loads(self.stdout.getvalue())
+        self.assertEqual('2.1.0', log['version'])
+        run = log['runs'][0]
+        self.assertEqual('git-lint', run['tool']['driver']['name'])
+        self.assertEqual('file:///repo/',
+                         run['originalUriBaseIds']['SRCROOT']['uri'])
+        self.assertEqual([{
+            'level': 'error',
+            'ruleId': 'E1',
+            'message': {
+                'text': 'message1'
+            },
+            'locations': [{
+                'physicalLocation': {
+                    'artifactLocation': {
+                        'uri': 'foo/bar.py',
+                        'uriBaseId': 'SRCROOT'
+                    },
+                    'region': {
+                        'startLine': 3,
+                        'startColumn': 1
+                    }
+                }
+            }]
+        }, {
+            'level': 'warning',
+            'message': {
+                'text': 'message2'
+            },
+            'locations': [{
+                'physicalLocation': {
+                    'artifactLocation': {
+                        'uri': 'foo/bar.py',
+                        'uriBaseId': 'SRCROOT'
+                    }
+                }
+            }]
+        }], run['results'])
+        self.assertEqual([{
+            'executionSuccessful': False,
+            'exitCode': 1,
+            'toolExecutionNotifications': [{
+                'level': 'error',
+                'message': {
+                    'text': 'baz.py: not found'
+                }
+            }]
+        }], run['invocations'])
+
+    def test_write_column_zero(self):
+        self.writer.start()
+        self.writer.write_file('/repo/foo.py', {
+            'comments': [{
+                'line': 3,
+                'column': 0,
+                'message': 'message'
+            }]
+        })
+        self.writer.finish(1, False, 1)
+        log = json.loads(self.stdout.getvalue())
+        self.assertEqual({
+            'startLine': 3
+        }, log['runs'][0]['results'][0]['locations'][0]['physicalLocation']
+                         ['region'])
+
+    def test_write_no_results(self):
+        self.writer.start()
+        self.writer.write_file('/repo/foo.py', {'comments': []})
+        self.writer.finish(0, False, 0)
+        log = json.loads(self.stdout.getvalue())
+        self.assertEqual([], log['runs'][0]['results'])
+
+
+class CheckstyleWriterTest(unittest.TestCase):
+    def test_write(self):
+        stdout = io.StringIO()
+        writer = writers.CheckstyleWriter(stdout, '/repo')
+        writer.start()
+        writer.write_file(
+            '/repo/foo.py', {
+                'comments': [{
+                    'line': 3,
+                    'column': 1,
+                    'severity': 'Convention',
+                    'message_id': 'C1',
+                    'message': 'a < "b"\nc'
+                }]
+            })
+        writer.write_file('/repo/bar.py', {'error': ['not found']})
+        writer.finish(1, True, 1)
+
+        root = xml.etree.ElementTree.fromstring(
+            stdout.getvalue().encode('utf-8'))
+        self.assertEqual('checkstyle', root.tag)
+        files = root.findall('file')
+        self.assertEqual(['/repo/foo.py', '/repo/bar.py'],
+                         [f.get('name') for f in files])
+        self.assertEqual({
+            'line': '3',
+            'column': '1',
+            'severity': 'info',
+            'message': 'a < "b"\nc',
+            'source': 'C1',
+        }, files[0].find('error').attrib)
+        self.assertEqual({
+            'severity': 'error',
+            'message': 'not found',
+            'source': 'git-lint',
+        }, files[1].find('error').attrib)